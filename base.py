@@ -1,15 +1,33 @@
 """主程序入口"""
 import streamlit as st
-from streamlit_pdf_viewer import pdf_viewer
 from typing import List, Dict, Optional
-from services.file_service import FileService
+from services.cache_service import content_hash
+from services.document_service import Document, DocumentStore
+from services.translation_service import TranslationService
 from views.streamlit_ui import StreamlitUI
 from chat_manager import ChatManager
+from services.preload_service import PreloadService
 
-def conversation_mode(model_choice: Dict[str, str], pdf_text: str) -> None:
+def conversation_mode(model_choice: Dict[str, str], pdf_text: str,
+                      document: Optional[Document] = None) -> None:
     """学术文献解析对话模式"""
     ChatManager.initialize_state()
-    StreamlitUI.render_chat(ChatManager.get_chat_history())
+    request = ChatManager.pop_pending_request()
+    if request and request.get("compare_choices"):
+        # 对比模式：多个模型并发回答
+        StreamlitUI.render_chat(ChatManager.get_chat_history())
+        StreamlitUI.render_comparison(
+            ChatManager.get_compare_labels(request),
+            ChatManager.compare_responses(request)
+        )
+    else:
+        StreamlitUI.render_chat(
+            ChatManager.get_chat_history(),
+            ChatManager.stream_response(request) if request else None
+        )
+    StreamlitUI.render_prompt_usage(st.session_state.get("prompt_usage"))
+    if st.session_state.get("scope_notice"):
+        st.warning(st.session_state["scope_notice"])
     
     # 输入处理
     st.text_input("Message", 
@@ -20,30 +38,108 @@ def conversation_mode(model_choice: Dict[str, str], pdf_text: str) -> None:
                  on_change=lambda: ChatManager.handle_input(
                      st.session_state.user_input, 
                      model_choice, 
-                     pdf_text
+                     pdf_text,
+                     document
                  ))
 
+    # 整篇摘要：文档超出上下文窗口时自动走map-reduce
+    if pdf_text and st.button("📝 Summarize document"):
+        progress_bar = st.progress(0.0, text="Summarizing...")
+        ChatManager.summarize_document(
+            model_choice, pdf_text,
+            lambda stage, done, total: progress_bar.progress(done / total, text=f"{stage}: {done}/{total}")
+        )
+        st.rerun()
+
+    if pdf_text:
+        translation_mode(model_choice, pdf_text)
+
+def translation_mode(model_choice: Dict[str, str], pdf_text: str) -> None:
+    """整篇翻译：按句段查翻译记忆，未命中的片段在后台分批交给模型"""
+    with st.expander("🌐 Translate document", expanded=False):
+        target = st.selectbox("Target language", TranslationService.TARGETS, key="translation_target")
+        translation_key = content_hash(
+            pdf_text.encode("utf-8"), target, model_choice["model_frame"], model_choice["model_name"]
+        )
+        tracked = StreamlitUI.tracked_job("translate")
+        if st.button("Translate", key="translate_document") or \
+                (tracked is not None and tracked.id == f"translate:{translation_key}"):
+            job = StreamlitUI.track_job(
+                "translate", "translate", translation_key,
+                lambda job: TranslationService.translate(pdf_text, model_choice, target, progress=job.report),
+                f"Translating into {target}"
+            )
+            if job.status == "done":
+                untranslated = TranslationService.count_untranslated(job.result)
+                if untranslated:
+                    st.warning(f"{untranslated} segment(s) could not be translated and were kept in the "
+                               f"original language, marked with “{TranslationService.UNTRANSLATED_MARK.strip()}”.")
+                st.download_button(
+                    label="Download translation",
+                    data=job.result,
+                    file_name="translation.txt",
+                    mime="text/plain"
+                )
+                st.text_area("Translation", value=job.result, height=300)
+            else:
+                StreamlitUI.render_job(job)
+
+def open_document(uploaded_files: List, selected_file: str) -> Optional[Document]:
+    """从共享文档存储中取出所选文件
+
+    每个上传文件只在首次出现时读取并哈希一次，句柄保存在会话中；
+    文件被移除后丢弃句柄，共享条目的引用计数随之减少。
+    按本会话的文件名匹配：相同内容的文件可能以不同名称上传，共享条目只记录首次上传时的名称。
+    """
+    handles = st.session_state.setdefault("document_handles", {})
+    current = {}
+    for file in uploaded_files or []:
+        file_key = getattr(file, "file_id", None) or (file.name, file.size)
+        current[file_key] = handles.get(file_key) or DocumentStore.open(file)
+    st.session_state["document_handles"] = current
+    for handle in current.values():
+        if handle.name == selected_file:
+            return handle.document
+    return None
+
 def chat_mode(model_choice: Dict[str, str], uploaded_files: List,
-              selected_file: str, image_files: object) -> None:
+              selected_file: str, image_files: List) -> None:
     """聊天模式界面"""
     # 布局
     left_panel, right_panel = st.columns([1, 1])
+    document = open_document(uploaded_files, selected_file)
 
     # 左侧：PDF & 图像
     with left_panel:
-        StreamlitUI.render_pdf_view(uploaded_files, selected_file, image_files)
-
-    # 从PDF提取文本
-    pdf_text = ""
-    if selected_file and uploaded_files:
-        for file in uploaded_files:
-            if file.name == selected_file:
-                pdf_text = FileService.extract_pdf_text(file)
-                break
+        StreamlitUI.render_pdf_view(document, image_files)
 
     # 右侧：Chat
     with right_panel:
-        conversation_mode(model_choice, pdf_text)
+        # 文本由共享存储提取并缓存，所有会话共用同一份；首次提取在后台任务中进行
+        # 页数很多的文档不自动整篇提取：限定页码或章节的问题只解析相关页
+        pdf_text = ""
+        if document is not None:
+            extract_job_id = f"extract:{document.key}"
+            if document.loaded or document.load_cached():
+                pdf_text = document.text
+            elif document.page_count <= DocumentStore.EAGER_EXTRACT_PAGES or \
+                    getattr(StreamlitUI.tracked_job("extract"), "id", None) == extract_job_id:
+                StreamlitUI.render_job(StreamlitUI.track_job(
+                    "extract", "extract", document.key,
+                    lambda job: document.load(job.report),
+                    f"Extracting {selected_file}"
+                ))
+            else:
+                st.info(f"{selected_file} has {document.page_count} pages. Ask about specific pages or "
+                        "sections (e.g. “pages 40–55”, “section 3”) and only those pages will be parsed.")
+                if st.button("Extract full text", key=f"extract_{document.key}"):
+                    StreamlitUI.track_job(
+                        "extract", "extract", document.key,
+                        lambda job: document.load(job.report),
+                        f"Extracting {selected_file}"
+                    )
+                    st.rerun()
+        conversation_mode(model_choice, pdf_text, document)
 
 def main() -> None:
     """主程序入口"""
@@ -83,6 +179,12 @@ def main() -> None:
             elif mode == "LaTeX Mode":
                 StreamlitUI.render_latex()
 
+        # 首屏渲染完成后再在后台导入重量级依赖
+        PreloadService.start()
+
+        # 后台任务未完成时定时刷新进度
+        StreamlitUI.poll_jobs()
+
     except Exception as e:
         st.error(f"An error occurred: {str(e)}")
         st.info("Please try refreshing the page or contact support if the issue persists.")
@@ -0,0 +1,273 @@
+"""批处理命令行入口
+
+用法:
+    python batch.py papers/ --question "列出本文的主要贡献" -o results.jsonl
+    python batch.py jobs.jsonl -o results.jsonl --model-frame OpenAI --model-name gpt-4-turbo
+
+清单文件每行一个任务：{"pdf": "a.pdf", "question": "...", "prompt_type": "query"}，
+可选字段 model_frame / model_name 覆盖命令行默认模型（只给出model_frame时使用该厂商的第一个可用模型）。
+结果以JSONL逐条追加写入输出文件；重新运行时跳过已成功的任务，从断点继续。
+清单中无法解析或缺少必填字段的行记为失败任务（带行号），不影响其余任务。
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Set
+from models.CausalPromptFactory import AcademicReadingAssistant
+from models.ModelFactory import ModelFactory, create_async_http_client, get_available_models
+from models.TokenBudget import TokenBudget
+from services.extraction_service import PDFExtractionEngine
+from services.file_service import FileService
+from services.retrieval_service import RetrievalService
+from services.summary_service import SummaryService
+from services.translation_service import TranslationService
+
+# summary：超长文档走map-reduce分层摘要；translate：按句段翻译全文（可选字段target_language）
+PROMPT_TYPES = ["query", "context", "summary", "translate"]
+# 每条结果记录都带有的任务字段
+RECORD_FIELDS = ("id", "pdf", "question", "prompt_type", "model_frame", "model_name")
+
+
+def job_id(job: Dict) -> str:
+    """由PDF路径、问题、提示类型和模型生成稳定的任务ID"""
+    raw = "\0".join([
+        os.path.abspath(job["pdf"]), job.get("question", ""), job["prompt_type"],
+        job["model_frame"], job["model_name"]
+    ] + ([job["target_language"]] if job.get("target_language") else []))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def invalid_job(origin: str, raw_job: Dict, error: str) -> Dict:
+    """清单中无效的行：作为带错误信息的任务返回，由执行器直接记为失败"""
+    job = {key: raw_job.get(key) if isinstance(raw_job.get(key), str) else "" for key in RECORD_FIELDS}
+    job.update(id=hashlib.sha1(origin.encode("utf-8")).hexdigest(), source=origin, error=error)
+    return job
+
+
+def build_job(raw_job: Dict, defaults: Dict, args: argparse.Namespace, base_dir: str = "") -> Dict:
+    """合并默认值并校验一个任务，字段缺失或取值无效时抛出ValueError；相对路径的pdf相对于base_dir"""
+    if not isinstance(raw_job.get("pdf"), str) or not raw_job["pdf"]:
+        raise ValueError("missing \"pdf\"")
+    for key in ("question", "prompt_type", "model_frame", "model_name", "language", "target_language"):
+        if raw_job.get(key) is not None and not isinstance(raw_job[key], str):
+            raise ValueError(f"\"{key}\" must be a string")
+    job = {**defaults, **{key: value for key, value in raw_job.items() if value}}
+    job["pdf"] = os.path.join(base_dir, job["pdf"])
+    if "prompt_type" not in raw_job and raw_job.get("question"):
+        job["prompt_type"] = "query"
+    if job["prompt_type"] not in PROMPT_TYPES:
+        raise ValueError(f"Unknown prompt_type: {job['prompt_type']}")
+    if job["model_frame"] != args.model_frame and not raw_job.get("model_name"):
+        # 只覆盖了厂商时，命令行的默认模型名属于另一个厂商，改用该厂商的第一个可用模型
+        available = get_available_models(job["model_frame"])
+        if not available:
+            raise ValueError(f"No models configured for {job['model_frame']}")
+        job["model_name"] = available[0]
+    job["id"] = job_id(job)
+    return job
+
+
+def load_jobs(source: str, args: argparse.Namespace) -> List[Dict]:
+    """从目录或JSONL清单读取任务；清单中的无效行返回为带error字段的任务"""
+    defaults = {
+        "question": args.question or "",
+        "prompt_type": args.prompt_type or ("query" if args.question else "context"),
+        "model_frame": args.model_frame,
+        "model_name": args.model_name
+    }
+    if os.path.isdir(source):
+        return [
+            build_job({"pdf": os.path.join(source, name)}, defaults, args)
+            for name in sorted(os.listdir(source)) if name.lower().endswith(".pdf")
+        ]
+
+    base_dir = os.path.dirname(os.path.abspath(source))
+    jobs = []
+    with open(source, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            origin = f"{source}:{line_no}"
+            raw_job: Dict = {}
+            try:
+                raw_job = json.loads(line)
+                if not isinstance(raw_job, dict):
+                    raw_job = {}
+                    raise ValueError("expected a JSON object")
+                jobs.append(build_job(raw_job, defaults, args, base_dir))
+            except ValueError as e:
+                jobs.append(invalid_job(origin, raw_job, str(e)))
+    return jobs
+
+
+def load_checkpoint(output_path: str) -> Set[str]:
+    """读取输出文件中已成功完成的任务ID"""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # 崩溃时可能留下半行，忽略即可
+                continue
+            if not record.get("error"):
+                done.add(record["id"])
+    return done
+
+
+def _init_extraction_worker() -> None:
+    """批处理已按文档并行，子进程内逐页串行提取"""
+    PDFExtractionEngine.MAX_WORKERS = 1
+
+
+def extract_text(pdf_path: str) -> str:
+    """在子进程中提取PDF文本（复用FileService的内容哈希缓存）"""
+    with open(pdf_path, "rb") as f:
+        return FileService.extract_pdf_text(f.read())
+
+
+def build_prompt(job: Dict, pdf_text: str) -> str:
+    """按提示类型构建提示词"""
+    budget = TokenBudget.for_model(job)
+    if job["prompt_type"] == "context":
+        return AcademicReadingAssistant.build_context_prompt(pdf_text, job.get("language", "中文"), budget=budget)
+    passages = RetrievalService.retrieve(pdf_text, job["question"], document_order=False)
+    return AcademicReadingAssistant.build_query_prompt(
+        job["question"], passages, job.get("language", "中文"), budget=budget
+    )
+
+
+class BatchRunner:
+    """批处理执行器：进程池提取PDF，有界并发调用模型，结果流式写入JSONL"""
+
+    def __init__(self, output_path: str, extract_workers: int, concurrency: int, use_cache: bool = True):
+        self.output_path = output_path
+        self.extract_workers = extract_workers
+        self.concurrency = concurrency
+        self.use_cache = use_cache
+        self.completed = 0
+        self.failed = 0
+
+    def write(self, record: Dict) -> None:
+        """追加一条结果并立即落盘，作为断点"""
+        with open(self.output_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    async def run(self, jobs: List[Dict]) -> None:
+        """按PDF分组处理；同时在途的文档数有界，内存不随任务总数增长"""
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        groups: Dict[str, List[Dict]] = {}
+        for job in jobs:
+            if job.get("error"):
+                # 清单中的无效行不提取也不调用模型，直接记为失败
+                self.failed += 1
+                self.write({**{key: job[key] for key in RECORD_FIELDS},
+                            "source": job["source"], "error": job["error"], "elapsed": 0.0})
+                print(f"[{self.completed + self.failed}/{len(jobs)}] ERR {job['source']}: {job['error']}",
+                      file=sys.stderr)
+                continue
+            groups.setdefault(job["pdf"], []).append(job)
+        queue: asyncio.Queue = asyncio.Queue()
+        for pdf_path, group in groups.items():
+            queue.put_nowait((pdf_path, group))
+
+        with ProcessPoolExecutor(self.extract_workers, initializer=_init_extraction_worker) as pool:
+            async with create_async_http_client() as http_client:
+
+                async def run_job(job: Dict, pdf_text: str, error: Optional[str]) -> None:
+                    start = time.perf_counter()
+                    record = {key: job[key] for key in RECORD_FIELDS}
+                    try:
+                        if error:
+                            raise RuntimeError(error)
+                        model = ModelFactory.get_model(job)
+                        if job["prompt_type"] == "summary":
+                            # 共用同一信号量，所有任务合计的在途请求数不超过--concurrency
+                            response = await SummaryService.asummarize(
+                                pdf_text, job, job.get("language", "中文"), http_client=http_client,
+                                semaphore=semaphore, use_cache=self.use_cache
+                            )
+                        elif job["prompt_type"] == "translate":
+                            response = await TranslationService.atranslate(
+                                pdf_text, job, job.get("target_language", "中文"), http_client=http_client,
+                                semaphore=semaphore, use_cache=self.use_cache
+                            )
+                        else:
+                            # 检索索引构建是CPU密集操作，放到线程中避免阻塞事件循环
+                            prompt = await asyncio.to_thread(build_prompt, job, pdf_text)
+                            async with semaphore:
+                                response = await model.agenerate_response(prompt, http_client, self.use_cache)
+                        if not response or response == model.config.get('error_message'):
+                            raise RuntimeError(response or "empty response")
+                        record["response"] = response
+                        if job["prompt_type"] == "translate":
+                            record["untranslated"] = TranslationService.count_untranslated(response)
+                        self.completed += 1
+                    except Exception as e:
+                        record["error"] = str(e)
+                        self.failed += 1
+                    record["elapsed"] = round(time.perf_counter() - start, 3)
+                    self.write(record)
+                    print(f"[{self.completed + self.failed}/{len(jobs)}] "
+                          f"{'ok ' if 'error' not in record else 'ERR'} {os.path.basename(job['pdf'])}",
+                          file=sys.stderr)
+
+                async def worker() -> None:
+                    while not queue.empty():
+                        pdf_path, group = queue.get_nowait()
+                        pdf_text, error = "", None
+                        try:
+                            pdf_text = await loop.run_in_executor(pool, extract_text, pdf_path)
+                            if not pdf_text:
+                                error = "no text extracted"
+                        except Exception as e:
+                            error = f"extraction failed: {e}"
+                        await asyncio.gather(*(run_job(job, pdf_text, error) for job in group))
+
+                # 提取与模型调用重叠进行：在途文档数略多于提取进程数
+                worker_count = max(self.extract_workers, self.concurrency) * 2
+                await asyncio.gather(*(worker() for _ in range(min(worker_count, len(groups)))))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", help="PDF目录或JSONL任务清单")
+    parser.add_argument("-o", "--output", default="results.jsonl")
+    parser.add_argument("--question", help="目录模式下对每篇PDF提出的问题")
+    parser.add_argument("--prompt-type", choices=PROMPT_TYPES)
+    parser.add_argument("--model-frame", default="Ollama", choices=["Ollama", "OpenAI", "DeepSeek"])
+    parser.add_argument("--model-name")
+    parser.add_argument("--extract-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--concurrency", type=int, default=4, help="同时进行的模型请求数")
+    parser.add_argument("--no-cache", action="store_true", help="不读写回复缓存")
+    args = parser.parse_args(argv)
+
+    if not args.model_name:
+        available = get_available_models(args.model_frame)
+        if not available:
+            parser.error(f"No models configured for {args.model_frame}")
+        args.model_name = available[0]
+
+    jobs = load_jobs(args.source, args)
+    done = load_checkpoint(args.output)
+    pending = [job for job in jobs if job["id"] not in done]
+    print(f"{len(jobs)} jobs, {len(jobs) - len(pending)} already done, {len(pending)} to run", file=sys.stderr)
+
+    runner = BatchRunner(args.output, args.extract_workers, args.concurrency, not args.no_cache)
+    asyncio.run(runner.run(pending))
+    print(f"completed {runner.completed}, failed {runner.failed}", file=sys.stderr)
+    return 1 if runner.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,170 @@
+"""离线端到端基准：合成PDF + 本地模型服务替身
+
+不依赖真实模型和网络：启动 benchmarks.mock_server，把各厂商的接口地址指向它，
+以无界面方式驱动 FileService / ChatManager / ModelFactory，报告：
+    - PDF提取吞吐（页/秒，冷缓存与热缓存）
+    - 每个厂商的提示词token数、首token时间和端到端耗时（首问与追问）
+    - 并发请求数与吞吐的关系
+
+用法:
+    python -m benchmarks.bench_e2e                               # 打印结果
+    python -m benchmarks.bench_e2e --save e2e_baseline.json      # 保存基线
+    python -m benchmarks.bench_e2e --baseline e2e_baseline.json  # 与基线比较，退化时返回非零
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+# 亚毫秒级的耗时波动不视为退化
+MIN_REGRESSION_S = 0.001
+
+QUESTIONS = [
+    "What architecture does the paper propose?",
+    "How does it compare with the baseline in the ablation experiments?",
+]
+
+
+def configure(url: str) -> None:
+    """把所有厂商的接口地址指向替身服务"""
+    os.environ.setdefault("OPENAI_API_KEY", "mock")
+    os.environ.setdefault("DEEPSEEK_API_KEY", "mock")
+    os.environ["OPENAI_BASE_URL"] = f"{url}/v1"
+    from models.ModelFactory import ModelConfig
+    models = ModelConfig.get_config()['models']
+    models['deepseek']['api_url'] = f"{url}/v1/chat/completions"
+    models['ollama']['api_url'] = f"{url}/api/chat"
+
+
+def bench_extraction(page_counts: List[int]) -> Dict[str, float]:
+    """PDF提取吞吐：首次提取（冷缓存）与再次提取（命中内容哈希缓存）"""
+    from benchmarks.synthetic_pdf import make_pdf
+    from services.file_service import FileService
+    results = {}
+    for pages in page_counts:
+        pdf_bytes = make_pdf(pages)
+        start = time.perf_counter()
+        FileService.extract_pdf_text(pdf_bytes)
+        cold = time.perf_counter() - start
+        start = time.perf_counter()
+        FileService.extract_pdf_text(pdf_bytes)
+        warm = time.perf_counter() - start
+        results[f"extract_{pages}p_pages_per_s"] = pages / cold
+        results[f"extract_{pages}p_warm_s"] = warm
+    return results
+
+
+def bench_chat(frames: List[str], pages: int) -> Dict[str, float]:
+    """按界面的调用路径提问两轮：handle_input 构建提示，stream_response 流式生成"""
+    import streamlit as st
+    from benchmarks.synthetic_pdf import make_pdf
+    from chat_manager import ChatManager
+    from models.ModelFactory import get_available_models
+    from services.file_service import FileService
+
+    pdf_text = FileService.extract_pdf_text(make_pdf(pages))
+    results = {}
+    for frame in frames:
+        model_choice = {"model_frame": frame, "model_name": get_available_models(frame)[0], "api_key": None}
+        st.session_state.clear()
+        ChatManager.initialize_state()
+        st.session_state["bypass_cache"] = True
+        for turn, question in enumerate(QUESTIONS, 1):
+            start = time.perf_counter()
+            ChatManager.handle_input(question, model_choice, pdf_text)
+            request = ChatManager.pop_pending_request()
+            prompt_time = time.perf_counter() - start
+            first_token = None
+            for _ in ChatManager.stream_response(request):
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+            total = time.perf_counter() - start
+            name = f"chat_{frame.lower()}_turn{turn}"
+            results[f"{name}_prompt_tokens"] = st.session_state["prompt_usage"]["total"]
+            results[f"{name}_prompt_build_s"] = prompt_time
+            results[f"{name}_ttft_s"] = first_token if first_token is not None else total
+            results[f"{name}_e2e_s"] = total
+    return results
+
+
+def bench_concurrency(levels: List[int], requests_per_level: int) -> Dict[str, float]:
+    """固定请求总数，比较不同并发度下的吞吐"""
+    from models.ModelFactory import ModelFactory, create_async_http_client, get_available_models
+    model = ModelFactory.get_model({"model_frame": "DeepSeek", "model_name": get_available_models("DeepSeek")[0]})
+
+    async def run(concurrency: int) -> float:
+        semaphore = asyncio.Semaphore(concurrency)
+        async with create_async_http_client() as http_client:
+            async def one(i: int) -> None:
+                async with semaphore:
+                    await model.agenerate_response(f"question {i}", http_client, use_cache=False)
+            start = time.perf_counter()
+            await asyncio.gather(*(one(i) for i in range(requests_per_level)))
+            return time.perf_counter() - start
+
+    return {f"concurrency_{level}_req_per_s": requests_per_level / asyncio.run(run(level)) for level in levels}
+
+
+def compare(results: Dict[str, float], baseline: Dict[str, float], tolerance: float) -> int:
+    """与基线逐项比较：*_per_s越大越好，*_s越小越好，其余仅展示"""
+    status = 0
+    for name in sorted(results):
+        if name not in baseline:
+            continue
+        old, new = baseline[name], results[name]
+        change = (new - old) / old if old else 0.0
+        regressed = (name.endswith("_per_s") and change < -tolerance) or \
+                    (name.endswith("_s") and not name.endswith("_per_s") and change > tolerance
+                     and new - old > MIN_REGRESSION_S)
+        status |= regressed
+        print(f"{'REGRESSED' if regressed else '':>9} {name:<40} {old:>12.4f} -> {new:>12.4f} ({change:+.1%})")
+    return int(status)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[50, 500])
+    parser.add_argument("--chat-pages", type=int, default=20)
+    parser.add_argument("--frames", nargs="+", default=["Ollama", "DeepSeek", "OpenAI"])
+    parser.add_argument("--latency", type=float, default=0.2, help="替身服务的首token延迟（秒）")
+    parser.add_argument("--token-delay", type=float, default=0.005)
+    parser.add_argument("--tokens", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--requests", type=int, default=16, help="每个并发度下的请求总数")
+    parser.add_argument("--save")
+    parser.add_argument("--baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="允许的相对退化比例")
+    args = parser.parse_args()
+
+    # 使用独立的缓存目录，保证每次运行都从冷缓存开始；需在导入应用模块之前设置
+    os.environ["TRANS_CACHE_DIR"] = tempfile.mkdtemp(prefix="trans-bench-")
+    from benchmarks.mock_server import MockLLMServer
+
+    with MockLLMServer(latency=args.latency, token_delay=args.token_delay, tokens=args.tokens) as server:
+        configure(server.url)
+        results = {}
+        results.update(bench_extraction(args.pages))
+        results.update(bench_chat(args.frames, args.chat_pages))
+        results.update(bench_concurrency(args.concurrency, args.requests))
+
+    for name, value in sorted(results.items()):
+        print(f"{name:<40} {value:>12.4f}")
+
+    status = 0
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"\ncompared with {args.baseline} (tolerance {args.tolerance:.0%})")
+        status = compare(results, baseline["results"], args.tolerance)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
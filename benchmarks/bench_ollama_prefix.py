@@ -0,0 +1,47 @@
+"""Ollama前缀复用基准：同一文档连续两次提问的prompt评估耗时
+
+需要可访问的Ollama服务。第一次提问评估完整的系统提示+文档前缀，
+第二次提问前缀相同，服务端复用KV缓存，只评估新增的问题部分。
+
+用法: python -m benchmarks.bench_ollama_prefix [--model qwen2.5:latest] [--pages 8]
+"""
+import argparse
+from benchmarks.synthetic_pdf import make_pdf
+from models.CausalPromptFactory import CausalPromptFactory
+from models.ModelFactory import ModelConfig, chat_ollama
+from models.TokenBudget import TokenBudget
+from services.extraction_service import PDFExtractionEngine
+
+QUESTIONS = [
+    "What architecture does the document describe?",
+    "Which experiments are mentioned, and what do they evaluate?",
+]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=ModelConfig.get_model_config('ollama')['available_models'][0])
+    parser.add_argument("--pages", type=int, default=8)
+    args = parser.parse_args()
+
+    pdf_text = "\n".join(text for _, text in PDFExtractionEngine.iter_pages(make_pdf(args.pages), workers=1))
+    factory = CausalPromptFactory()
+    choice = {"model_frame": "Ollama", "model_name": args.model}
+
+    history = []
+    for turn, question in enumerate(QUESTIONS, 1):
+        budget = TokenBudget.for_model(choice)
+        if history:
+            prompt = factory.build_followup_prompt(question, [pdf_text], history, budget=budget)
+        else:
+            prompt = factory.build_query_prompt(question, [pdf_text], budget=budget)
+        result = chat_ollama(prompt, args.model)
+        eval_ms = result.get("prompt_eval_duration", 0) / 1e6
+        print(f"question {turn}: prompt_eval_count={result.get('prompt_eval_count', 0)} "
+              f"prompt_eval={eval_ms:.0f}ms total={result.get('total_duration', 0) / 1e6:.0f}ms")
+        history += [{"role": "user", "content": question},
+                    {"role": "assistant", "content": result["message"]["content"]}]
+
+
+if __name__ == "__main__":
+    main()
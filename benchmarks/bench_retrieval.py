@@ -0,0 +1,39 @@
+"""检索索引基准：分块与BM25建索引耗时
+
+用法: python -m benchmarks.bench_retrieval [--pages 500]
+"""
+import argparse
+import time
+from benchmarks.synthetic_pdf import make_pdf
+from services.extraction_service import PDFExtractionEngine
+from services.retrieval_service import BM25Index
+from services.text_service import TextService
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    pdf_text = "\n".join(text for _, text in PDFExtractionEngine.iter_pages(make_pdf(args.pages), workers=1))
+
+    start = time.perf_counter()
+    chunks = TextService.split_into_chunks(pdf_text)
+    split_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index = BM25Index(chunks)
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(args.queries):
+        index.search(f"attention gradient benchmark {i}", 5)
+    query_time = (time.perf_counter() - start) / args.queries
+
+    print(f"pages={args.pages} chars={len(pdf_text)} chunks={len(chunks)} terms={len(index.vocab)}")
+    print(f"split {split_time:.3f}s  build {build_time:.3f}s  query {query_time * 1000:.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""启动耗时基准：按模块统计导入时间（-X importtime）
+
+用法:
+    python -m benchmarks.bench_startup                      # 打印耗时最多的模块
+    python -m benchmarks.bench_startup --save baseline.json # 保存基线
+    python -m benchmarks.bench_startup --baseline baseline.json  # 与基线比较，退化时返回非零
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Dict
+
+# 这些依赖应当只在对应功能被使用时导入
+DEFERRED_MODULES = ["easyocr", "torch", "PyPDF2", "pdfkit", "langchain", "langchain_ollama", "openai"]
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(module: str, runs: int) -> Dict[str, int]:
+    """多次导入取每个模块累计耗时的最小值（微秒）"""
+    best: Dict[str, int] = {}
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=PROJECT_ROOT, capture_output=True, text=True,
+            env={**os.environ, "TRANS_PRELOAD": "off"}
+        )
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr)
+        for line in result.stderr.splitlines():
+            if not line.startswith("import time:") or "cumulative" in line:
+                continue
+            _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+            name = name.strip()
+            best[name] = min(best.get(name, int(cumulative)), int(cumulative))
+    return best
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="base")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--save")
+    parser.add_argument("--baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="允许的相对退化比例")
+    args = parser.parse_args()
+
+    timings = measure(args.module, args.runs)
+    total = timings.get(args.module, 0)
+    print(f"import {args.module}: {total / 1000:.1f} ms")
+    for name, micros in sorted(timings.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{micros / 1000:>10.1f} ms  {name}")
+
+    status = 0
+    eager = [name for name in DEFERRED_MODULES if name in timings]
+    if eager:
+        print(f"FAIL: imported at startup: {', '.join(eager)}")
+        status = 1
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"module": args.module, "total_us": total, "modules": timings}, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        limit = baseline["total_us"] * (1 + args.tolerance)
+        print(f"baseline {baseline['total_us'] / 1000:.1f} ms, limit {limit / 1000:.1f} ms")
+        if total > limit:
+            print("FAIL: startup import time regressed")
+            status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,204 @@
+"""本地模型服务替身：实现OpenAI/DeepSeek chat-completions与Ollama chat接口
+
+不调用真实模型，按配置的延迟逐token返回固定文本，供离线基准使用。
+
+用法: python -m benchmarks.mock_server [--port 8765] [--latency 0.2] [--token-delay 0.01] [--drop-after N]
+"""
+import argparse
+import json
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+_WORDS = "the proposed method improves accuracy over the baseline on all benchmarks".split()
+
+
+class _QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address) -> None:
+        # 客户端关闭keep-alive连接属于正常情况，不打印堆栈
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class MockLLMServer:
+    """模拟的模型服务
+
+    latency: 收到请求到第一个token的延迟（秒），模拟prompt评估
+    token_delay: 流式输出时相邻token的间隔（秒）
+    tokens: 每个回复的token数
+    drop_after: 流式输出该数量的token后直接断开连接，不发送结束标记，模拟中途断线
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.2,
+                 token_delay: float = 0.01, tokens: int = 64, drop_after: Optional[int] = None):
+        self.latency = latency
+        self.token_delay = token_delay
+        self.tokens = tokens
+        self.drop_after = drop_after
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = _QuietHTTPServer((host, port), self._handler_class())
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def reply_tokens(self) -> List[str]:
+        return [_WORDS[i % len(_WORDS)] + " " for i in range(self.tokens)]
+
+    def start(self) -> "MockLLMServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        self._server.serve_forever()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "MockLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args) -> None:
+                pass
+
+            def do_GET(self) -> None:
+                if self.path.rstrip("/") == "/api/tags":
+                    self._send_json({"models": [{"name": "mock"}]})
+                else:
+                    self.send_error(404)
+
+            def do_POST(self) -> None:
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                with server._lock:
+                    server.requests += 1
+                prompt_chars = sum(len(message.get("content", "")) for message in body.get("messages", []))
+                time.sleep(server.latency)
+                if self.path.rstrip("/").endswith("/chat/completions"):
+                    self._openai(body, prompt_chars)
+                elif self.path.rstrip("/") == "/api/chat":
+                    self._ollama(body, prompt_chars)
+                else:
+                    self.send_error(404)
+
+            def _openai(self, body: Dict, prompt_chars: int) -> None:
+                tokens = server.reply_tokens()
+                model = body.get("model", "mock")
+                if not body.get("stream"):
+                    time.sleep(server.token_delay * len(tokens))
+                    self._send_json({
+                        "id": "mock", "object": "chat.completion", "created": int(time.time()), "model": model,
+                        "choices": [{"index": 0, "finish_reason": "stop",
+                                     "message": {"role": "assistant", "content": "".join(tokens)}}],
+                        "usage": {"prompt_tokens": prompt_chars // 4, "completion_tokens": len(tokens),
+                                  "total_tokens": prompt_chars // 4 + len(tokens)}
+                    })
+                    return
+                self._start_stream("text/event-stream")
+
+                def chunk(delta: Dict, finish_reason: Optional[str]) -> str:
+                    return "data: " + json.dumps({
+                        "id": "mock", "object": "chat.completion.chunk", "created": int(time.time()),
+                        "model": model, "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+                    }) + "\n\n"
+
+                for position, token in enumerate(tokens):
+                    if position == server.drop_after:
+                        self._drop()
+                        return
+                    self._write_chunk(chunk({"content": token}, None))
+                    time.sleep(server.token_delay)
+                self._write_chunk(chunk({}, "stop"))
+                self._write_chunk("data: [DONE]\n\n")
+                self._write_chunk("")
+
+            def _ollama(self, body: Dict, prompt_chars: int) -> None:
+                tokens = server.reply_tokens()
+                final = {
+                    "model": body.get("model", "mock"), "done": True,
+                    "prompt_eval_count": prompt_chars // 4, "eval_count": len(tokens),
+                    "prompt_eval_duration": int(server.latency * 1e9),
+                    "eval_duration": int(server.token_delay * len(tokens) * 1e9)
+                }
+                if not body.get("stream", True):
+                    time.sleep(server.token_delay * len(tokens))
+                    self._send_json({**final, "message": {"role": "assistant", "content": "".join(tokens)}})
+                    return
+                self._start_stream("application/x-ndjson")
+                for position, token in enumerate(tokens):
+                    if position == server.drop_after:
+                        self._drop()
+                        return
+                    self._write_chunk(json.dumps({"message": {"role": "assistant", "content": token},
+                                                  "done": False}) + "\n")
+                    time.sleep(server.token_delay)
+                self._write_chunk(json.dumps({**final, "message": {"role": "assistant", "content": ""}}) + "\n")
+                self._write_chunk("")
+
+            def _send_json(self, payload: Dict) -> None:
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _start_stream(self, content_type: str) -> None:
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+            def _drop(self) -> None:
+                """不写结束分块直接关闭连接"""
+                self.close_connection = True
+                self.wfile.flush()
+                self.connection.shutdown(socket.SHUT_RDWR)
+
+            def _write_chunk(self, text: str) -> None:
+                """写出一个HTTP分块，空字符串表示结束"""
+                data = text.encode("utf-8")
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--token-delay", type=float, default=0.01)
+    parser.add_argument("--tokens", type=int, default=64)
+    parser.add_argument("--drop-after", type=int, default=None)
+    args = parser.parse_args()
+    server = MockLLMServer(port=args.port, latency=args.latency, token_delay=args.token_delay, tokens=args.tokens,
+                           drop_after=args.drop_after)
+    print(f"mock server listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""合成PDF生成模块（无第三方依赖）"""
+from typing import List
+
+_WORDS = (
+    "transformer attention encoder decoder gradient optimization dataset baseline "
+    "evaluation benchmark ablation convolution embedding latent representation "
+    "inference training regularization architecture performance experiment"
+).split()
+
+
+def _page_lines(page_no: int, lines_per_page: int) -> List[str]:
+    """生成确定性的页面文本行"""
+    lines = []
+    for line_no in range(lines_per_page):
+        seed = page_no * 131 + line_no * 17
+        words = [_WORDS[(seed + i * 7) % len(_WORDS)] for i in range(10)]
+        lines.append(f"{page_no}.{line_no} " + " ".join(words))
+    return lines
+
+
+def make_pdf(page_count: int, lines_per_page: int = 40) -> bytes:
+    """生成指定页数、每页含多行文本的PDF字节"""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>"]
+    kids = " ".join(f"{3 + 2 * i} 0 R" for i in range(page_count))
+    objects.append(
+        f"<< /Type /Pages /Kids [{kids}] /Count {page_count} "
+        "/Resources << /Font << /F1 << /Type /Font /Subtype /Type1 "
+        "/BaseFont /Helvetica >> >> >> >>"
+    )
+    for page_no in range(1, page_count + 1):
+        commands = ["BT /F1 10 Tf 14 TL 50 760 Td"]
+        commands += [f"({line}) '" for line in _page_lines(page_no, lines_per_page)]
+        commands.append("ET")
+        stream = "\n".join(commands)
+        content_ref = 4 + 2 * (page_no - 1)
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {content_ref} 0 R >>"
+        )
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref_offset = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    for offset in offsets:
+        output += f"{offset:010d} 00000 n \n".encode("latin-1")
+    output += (
+        f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\n"
+        f"startxref\n{xref_offset}\n%%EOF\n"
+    ).encode("latin-1")
+    return bytes(output)
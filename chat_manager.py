@@ -1,11 +1,21 @@
 """聊天管理模块"""
-from typing import Dict, List, Optional
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
 import streamlit as st
-from models.ModelFactory import ModelFactory
-from models.CausalPromptFactory import AcademicReadingAssistant
+from models.ModelFactory import IncompleteStreamError, ModelFactory
+from models.CausalPromptFactory import CausalPromptFactory
+from models.ConversationMemory import ConversationMemory
+from models.TokenBudget import TokenBudget
+from services.document_service import Document, parse_scope
+from services.retrieval_service import RetrievalService
+from services.summary_service import ProgressCallback, SummaryService
+from views.html_templates import ChatTemplates
 
 class ChatManager:
     """聊天管理类"""
+
+    _prompt_factory = CausalPromptFactory()
+    # 文档在剩余预算中占比不超过该值时整篇放入提示词前缀，否则按问题检索段落
+    FULL_DOCUMENT_RATIO = 0.6
     
     @classmethod
     def initialize_state(cls):
@@ -19,32 +29,61 @@ class ChatManager:
         if "user_input" not in st.session_state:
             st.session_state.user_input = ""
 
+        if "semantic_search" not in st.session_state:
+            st.session_state["semantic_search"] = False
+
+        if "bypass_cache" not in st.session_state:
+            st.session_state["bypass_cache"] = False
+
+        if "compare_models" not in st.session_state:
+            st.session_state["compare_models"] = []
+
+        if "conversation_memory" not in st.session_state:
+            st.session_state["conversation_memory"] = ConversationMemory.from_config()
+
     @classmethod
-    def handle_input(cls, user_input: str, model_choice: Dict[str, str], pdf_text: str) -> None:
-        """处理用户输入"""
+    def append_message(cls, role: str, content: str) -> None:
+        """追加一条消息，HTML只在此时渲染一次，之后每次重绘直接复用"""
+        st.session_state["chat_history"].append({
+            "role": role,
+            "content": content,
+            "html": ChatTemplates.message(role, content)
+        })
+
+    @classmethod
+    def handle_input(cls, user_input: str, model_choice: Dict[str, str], pdf_text: str,
+                     document: Optional[Document] = None) -> None:
+        """处理用户输入：记录问题并构建提示，回复在下一次渲染时流式生成"""
         if user_input:
             try:
+                st.session_state.pop("scope_notice", None)
                 # 添加用户消息
-                st.session_state["chat_history"].append({
-                    "role": "user",
-                    "content": user_input
-                })
+                cls.append_message("user", user_input)
                 
-                # 构建提示
-                prompt = AcademicReadingAssistant.build_query_prompt(
-                    user_input, 
-                    [pdf_text] if pdf_text else []
-                )
+                # 对比模式下同一提示词发给所有模型，按上下文窗口最小的模型分配预算
+                compare_choices = cls.get_compare_choices(model_choice)
+                budget = TokenBudget.for_models(compare_choices or [model_choice])
+                passages = cls.select_texts(user_input, pdf_text, budget, document)
+                history = st.session_state["chat_history"][:-1]
+                if history:
+                    # 追问：滚动摘要 + 最近几轮原文，占用固定的历史预算
+                    memory = st.session_state["conversation_memory"]
+                    summary, recent = memory.context(history, cls._history_summarizer(model_choice))
+                    prompt = cls._prompt_factory.build_followup_prompt(
+                        user_input, passages, recent, budget=budget,
+                        summary=summary, history_tokens=memory.history_tokens
+                    )
+                else:
+                    prompt = cls._prompt_factory.build_query_prompt(user_input, passages, budget=budget)
+                st.session_state["prompt_usage"] = budget.report()
                 
-                # 获取模型实例并生成响应
-                model = ModelFactory.get_model(model_choice)
-                response = model.generate_response(prompt)
-                
-                # 添加助手消息
-                st.session_state["chat_history"].append({
-                    "role": "assistant",
-                    "content": response
-                })
+                # 回调中无法逐步渲染，留给页面主体流式输出
+                st.session_state["pending_request"] = {
+                    "prompt": prompt,
+                    "model_choice": model_choice,
+                    "use_cache": not st.session_state.get("bypass_cache", False),
+                    "compare_choices": compare_choices
+                }
                 
                 # 清空输入
                 st.session_state.user_input = ""
@@ -52,6 +91,173 @@ class ChatManager:
             except Exception as e:
                 st.error(f"Error processing request: {str(e)}")
 
+    @classmethod
+    def select_texts(cls, user_input: str, pdf_text: str, budget: TokenBudget,
+                     document: Optional[Document] = None) -> List[str]:
+        """选择放入提示词的文本
+
+        问题限定了页码或章节时只取这些页（全文未提取时只解析这些页）；
+        文档放得下时整篇放入，提示词前缀在各轮之间保持不变；
+        否则检索相关段落，按相关度降序传入，预算不足时先舍弃最不相关的。
+        来自共享文档的文本带有页码标记，回答可以引用页码。
+        """
+        if document is not None:
+            scoped = cls.scoped_texts(user_input, document, budget)
+            if scoped is not None:
+                return scoped
+        limit = budget.remaining * cls.FULL_DOCUMENT_RATIO
+        # 每个token至多约对应数个字符，明显过长时无需逐字计数
+        if pdf_text and len(pdf_text) <= limit * 8 and budget.counter.count(pdf_text) <= limit:
+            if document is not None and document.loaded:
+                return [document.label(page_no, page_text)
+                        for page_no, page_text in document.page_texts(1, document.page_count) if page_text]
+            return [pdf_text]
+        passages = RetrievalService.retrieve(
+            pdf_text, user_input,
+            semantic=st.session_state.get("semantic_search", False),
+            document_order=False,
+            document=document
+        )
+        if document is not None and document.loaded:
+            passages = [document.label(document.page_of(max(pdf_text.find(passage), 0)), passage, " ")
+                        for passage in passages]
+        return passages
+
+    @classmethod
+    def scoped_texts(cls, user_input: str, document: Document, budget: TokenBudget) -> Optional[List[str]]:
+        """问题限定了页码或章节时返回这些页（带页码标记），否则返回None
+
+        逐页解析并计入预算，放不下时截短范围：界面上提示实际覆盖的页，
+        提示词末尾也注明，回答不会声称覆盖了整个范围。找不到章节时同样提示。
+        """
+        scope = parse_scope(user_input)
+        if scope is None:
+            return None
+        pages = document.resolve_scope(scope)
+        if pages is None:
+            kind, value = scope
+            if kind == "pages":
+                reason = f"pages {value[0]}–{value[1]} are beyond the end of this document ({document.page_count} pages)"
+            elif document.sections() or document.loaded:
+                reason = f"section {value} was not found in this document"
+            else:
+                reason = (f"this document has no bookmarks and the heading of section {value} was not found "
+                          f"in its first {document.MAX_HEADING_SCAN_PAGES} pages")
+            st.session_state["scope_notice"] = (
+                f"Could not answer for that range: {reason}. "
+                "Please ask by page range instead, e.g. “pages 40–55”."
+            )
+            return None
+
+        first, last = pages
+        limit = budget.remaining * cls.FULL_DOCUMENT_RATIO
+        texts: List[str] = []
+        used, covered = 0, first - 1
+        for page_no in range(first, min(last, first + document.MAX_SCOPED_PAGES - 1) + 1):
+            page_text = document.page_texts(page_no, page_no)[0][1]
+            if page_text:
+                labeled = document.label(page_no, page_text)
+                cost = budget.counter.count(labeled)
+                if texts and used + cost > limit:
+                    break
+                texts.append(labeled)
+                used += cost
+            covered = page_no
+        if covered < last:
+            note = f"Only pages {first}–{covered} of the requested {first}–{last} fit in the model's context."
+            st.session_state["scope_notice"] = f"{note} Ask about pages {covered + 1}–{last} separately."
+            texts.append(f"[Note: {note}]")
+        return texts
+
+    @classmethod
+    def _history_summarizer(cls, model_choice: Dict[str, str]):
+        """返回在后台线程中生成滚动摘要的函数"""
+        memory = st.session_state["conversation_memory"]
+
+        def summarize(summary: str, messages: List[Dict]) -> str:
+            model = ModelFactory.get_model(model_choice)
+            response = model.generate_response(
+                cls._prompt_factory.build_memory_summary_prompt(summary, messages, memory.summary_tokens)
+            )
+            if response == model.config.get('error_message'):
+                return ""
+            return response
+
+        return summarize
+
+    @classmethod
+    def get_compare_choices(cls, model_choice: Dict[str, str]) -> List[Dict[str, str]]:
+        """对比模式下参与回答的模型（当前模型 + 侧边栏额外选择的模型）"""
+        choices = [model_choice]
+        for label in st.session_state.get("compare_models", []):
+            frame, name = label.split(" / ", 1)
+            choice = {"model_frame": frame, "model_name": name, "api_key": None}
+            if (frame, name) != (model_choice['model_frame'], model_choice['model_name']):
+                choices.append(choice)
+        return choices if len(choices) > 1 else []
+
+    @classmethod
+    def pop_pending_request(cls) -> Optional[Dict]:
+        """取出待处理的请求"""
+        return st.session_state.pop("pending_request", None)
+
+    @classmethod
+    def stream_pending_response(cls) -> Optional[Iterator[str]]:
+        """取出待处理的请求，返回逐段产出回复的迭代器"""
+        request = cls.pop_pending_request()
+        return cls.stream_response(request) if request else None
+
+    @classmethod
+    def stream_response(cls, request: Dict) -> Iterator[str]:
+        """按请求流式生成回复"""
+        return cls._stream_and_record(request["prompt"], request["model_choice"],
+                                      request.get("use_cache", True))
+
+    @classmethod
+    def get_compare_labels(cls, request: Dict) -> List[str]:
+        """对比模式中各模型的显示名称"""
+        return [ModelFactory.label(choice) for choice in request["compare_choices"]]
+
+    @classmethod
+    async def compare_responses(cls, request: Dict) -> AsyncIterator[Tuple[str, str, float]]:
+        """对比模式：并发请求多个模型，按完成先后产出(模型名称, 回复, 耗时)并写入聊天历史"""
+        async for model_choice, response, elapsed in ModelFactory.fan_out(
+            request["prompt"], request["compare_choices"], request.get("use_cache", True)
+        ):
+            label = ModelFactory.label(model_choice)
+            cls.append_message("assistant", f"[{label}] {response}")
+            yield label, response, elapsed
+
+    @classmethod
+    def _stream_and_record(cls, prompt: str, model_choice: Dict[str, str],
+                           use_cache: bool = True) -> Iterator[str]:
+        """流式生成回复，结束（或被中断）时写入聊天历史"""
+        parts = []
+        try:
+            model = ModelFactory.get_model(model_choice)
+            for token in model.generate_stream(prompt, use_cache=use_cache):
+                parts.append(token)
+                yield token
+        except IncompleteStreamError:
+            # 错误详情已由模型层显示；加入同一请求的其他会话也会收到该异常
+            st.warning("The reply was interrupted and has not been cached.")
+        except Exception as e:
+            st.error(f"Error processing request: {str(e)}")
+        finally:
+            cls.append_message("assistant", "".join(parts).strip())
+
+    @classmethod
+    def summarize_document(cls, model_choice: Dict[str, str], pdf_text: str,
+                           progress: Optional[ProgressCallback] = None) -> None:
+        """对整篇文档做分层摘要并写入聊天历史"""
+        cls.append_message("user", "📝 Summarize document")
+        try:
+            summary = SummaryService.summarize(pdf_text, model_choice, progress=progress)
+        except Exception as e:
+            st.error(f"Error summarizing document: {str(e)}")
+            summary = ""
+        cls.append_message("assistant", summary)
+
     @classmethod
     def get_chat_history(cls) -> List[Dict]:
         """获取聊天历史"""
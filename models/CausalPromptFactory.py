@@ -1,6 +1,8 @@
 import os
 import yaml
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
+from models.TokenBudget import TokenBudget
+from services.metrics_service import Metrics
 
 class CausalPromptFactory:
     """提示词工厂类，用于构建不同场景的提示词"""
@@ -12,13 +14,16 @@ class CausalPromptFactory:
         with open(prompt_path, 'r', encoding='utf-8') as f:
             self.prompts = yaml.safe_load(f)['prompts']
     
-    def build_query_prompt(self, query: str, texts: List[str]) -> str:
+    @Metrics.timed("prompt_build")
+    def build_query_prompt(self, query: str, texts: List[str],
+                           budget: Optional[TokenBudget] = None) -> str:
         """
         构建查询提示词
         
         Args:
             query: 用户查询
-            texts: 相关文本列表
+            texts: 相关文本列表（按重要性降序）
+            budget: token预算，为空时不做限制
             
         Returns:
             str: 完整的提示词
@@ -26,26 +31,51 @@ class CausalPromptFactory:
         # 系统提示词
         system_prompt = self.prompts['system']
         
-        # 合并所有文本
-        text_content = "\n\n".join(texts) if texts else "没有提供文本内容。"
+        # 按优先级装入：系统提示 > 问题 > 文本
+        if budget is not None:
+            budget.reserve("system", system_prompt)
+            budget.reserve("template", TokenBudget.template_overhead(self.prompts['document'], "text"))
+            budget.reserve("template", TokenBudget.template_overhead(self.prompts['query'], "query"))
+            budget.reserve("question", query)
+            texts = budget.fit("documents", texts)
         
         # 查询提示词
-        query_prompt = self.prompts['query'].format(
-            text=text_content,
-            query=query
-        )
+        query_prompt = self.prompts['query'].format(query=query)
         
-        return f"{system_prompt}\n\n{query_prompt}"
+        return f"{self.build_prefix(texts)}\n{query_prompt}"
+
+    def build_prefix(self, texts: List[str]) -> str:
+        """构建提示词的固定前缀（系统提示 + 文本内容）
+
+        前缀中不含任何随问题变化的内容，本地模型可跨轮次复用其KV缓存。
+        """
+        text_content = "\n\n".join(texts) if texts else "没有提供文本内容。"
+        return f"{self.prompts['system']}\n\n{self.prompts['document'].format(text=text_content)}"
     
+    @staticmethod
+    def format_history(history: List[Dict[str, str]]) -> List[str]:
+        """将对话历史格式化为逐条的文本行"""
+        return [
+            f"{'用户' if msg['role'] == 'user' else '助手'}: {msg['content']}\n"
+            for msg in history
+        ]
+
+    @Metrics.timed("prompt_build")
     def build_followup_prompt(self, query: str, texts: List[str], 
-                            history: List[Dict[str, str]]) -> str:
+                            history: List[Dict[str, str]],
+                            budget: Optional[TokenBudget] = None,
+                            summary: str = "",
+                            history_tokens: Optional[int] = None) -> str:
         """
         构建后续对话提示词
         
         Args:
             query: 用户查询
-            texts: 相关文本列表
-            history: 对话历史
+            texts: 相关文本列表（按重要性降序）
+            history: 对话历史（原文保留的部分）
+            budget: token预算，为空时不做限制
+            summary: 更早对话的滚动摘要
+            history_tokens: 摘要与对话历史合计的token上限，为空时至多占剩余预算一半
             
         Returns:
             str: 完整的提示词
@@ -53,25 +83,42 @@ class CausalPromptFactory:
         # 系统提示词
         system_prompt = self.prompts['system']
         
-        # 合并所有文本
-        text_content = "\n\n".join(texts) if texts else "没有提供文本内容。"
-        
         # 格式化对话历史
-        history_text = ""
-        for msg in history:
-            if msg["role"] == "user":
-                history_text += f"用户: {msg['content']}\n"
-            else:
-                history_text += f"助手: {msg['content']}\n"
+        summary_lines = [f"此前对话摘要: {summary}\n"] if summary else []
+        history_lines = self.format_history(history)
+        
+        # 按优先级装入：系统提示 > 问题 > 摘要 > 最近的对话历史 > 文本
+        if budget is not None:
+            budget.reserve("system", system_prompt)
+            budget.reserve("template", TokenBudget.template_overhead(self.prompts['document'], "text"))
+            budget.reserve("template", TokenBudget.template_overhead(
+                self.prompts['followup'], "history", "query"))
+            budget.reserve("question", query)
+            if history_tokens is None:
+                history_tokens = budget.remaining // 2
+            summary_lines = budget.fit("summary", summary_lines, max_tokens=history_tokens)
+            history_lines = budget.fit("history", history_lines, newest_last=True,
+                                       max_tokens=history_tokens - budget.usage["summary"])
+            texts = budget.fit("documents", texts)
+        
+        history_text = "".join(summary_lines + history_lines)
         
         # 后续对话提示词
         followup_prompt = self.prompts['followup'].format(
-            text=text_content,
             history=history_text,
             query=query
         )
         
-        return f"{system_prompt}\n\n{followup_prompt}"
+        return f"{self.build_prefix(texts)}\n{followup_prompt}"
+
+    def build_memory_summary_prompt(self, summary: str, history: List[Dict[str, str]],
+                                    max_tokens: int) -> str:
+        """构建滚动摘要提示词：把新增的对话并入已有摘要"""
+        return self.prompts['memory_summary'].format(
+            summary=summary or "（无）",
+            history="".join(self.format_history(history)),
+            max_tokens=max_tokens
+        )
 
 class AcademicReadingAssistant:
     """学术文献分析系统"""
@@ -82,32 +129,99 @@ class AcademicReadingAssistant:
         _prompts = yaml.safe_load(f)['academic']
     
     @classmethod
-    def build_context_prompt(cls, pdf_content: str, language: str = "中文") -> str:
-        """构建上下文分析提示"""
+    @Metrics.timed("prompt_build")
+    def build_context_prompt(cls, pdf_content: str, language: str = "中文",
+                             budget: Optional[TokenBudget] = None) -> str:
+        """构建上下文分析提示，超出预算的文献内容被截断"""
         lang = "zh" if language == "中文" else "en"
-        return cls._prompts['context'][lang].format(content=pdf_content)
+        template = cls._prompts['context'][lang]
+        if budget is not None:
+            budget.reserve("template", TokenBudget.template_overhead(template, "content"))
+            pdf_content = "".join(budget.fit("documents", [pdf_content]))
+        return template.format(content=pdf_content)
     
     @classmethod
-    def build_query_prompt(cls, question: str, context_tags: list, language: str = "中文") -> str:
-        """构建问题分析提示"""
+    @Metrics.timed("prompt_build")
+    def build_query_prompt(cls, question: str, context_tags: list, language: str = "中文",
+                           budget: Optional[TokenBudget] = None) -> str:
+        """构建问题分析提示，context_tags按重要性降序，超出预算的部分被丢弃"""
         lang = "zh" if language == "中文" else "en"
-        context = ", ".join(context_tags)
-        return cls._prompts['query'][lang].format(
+        template = cls._prompts['query'][lang]
+        if budget is not None:
+            budget.reserve("template", TokenBudget.template_overhead(template, "context", "question"))
+            budget.reserve("question", question)
+            context_tags = budget.fit("documents", context_tags)
+        context = "\n\n".join(context_tags)
+        return template.format(
             context=context,
             question=question
         )
     
     @classmethod
-    def build_validation_prompt(cls, response: str, source_materials: str, language: str = "中文") -> str:
-        """构建验证提示"""
+    @Metrics.timed("prompt_build")
+    def build_validation_prompt(cls, response: str, source_materials: str, language: str = "中文",
+                                budget: Optional[TokenBudget] = None) -> str:
+        """构建验证提示，超出预算的原文被截断"""
         lang = "zh" if language == "中文" else "en"
-        return cls._prompts['validation'][lang].format(
+        template = cls._prompts['validation'][lang]
+        if budget is not None:
+            budget.reserve("template", TokenBudget.template_overhead(template, "source", "response"))
+            budget.reserve("response", response)
+            source_materials = "".join(budget.fit("documents", [source_materials]))
+        return template.format(
             source=source_materials,
             response=response
         )
     
     @classmethod
-    def build_followup_prompt(cls, history: str, language: str = "中文") -> str:
-        """构建追问提示"""
+    @Metrics.timed("prompt_build")
+    def build_summary_map_prompt(cls, content: str, index: int, total: int, language: str = "中文",
+                                 budget: Optional[TokenBudget] = None) -> str:
+        """构建分段摘要（map）提示"""
+        lang = "zh" if language == "中文" else "en"
+        template = cls._prompts['summary_map'][lang]
+        if budget is not None:
+            budget.reserve("template", TokenBudget.template_overhead(template, "content", "index", "total"))
+            content = "".join(budget.fit("documents", [content]))
+        return template.format(content=content, index=index, total=total)
+    
+    @classmethod
+    @Metrics.timed("prompt_build")
+    def build_summary_reduce_prompt(cls, summaries: List[str], language: str = "中文",
+                                    budget: Optional[TokenBudget] = None) -> str:
+        """构建摘要合并（reduce）提示"""
+        lang = "zh" if language == "中文" else "en"
+        template = cls._prompts['summary_reduce'][lang]
+        if budget is not None:
+            budget.reserve("template", TokenBudget.template_overhead(template, "summaries"))
+            summaries = budget.fit("summaries", summaries)
+        return template.format(summaries="\n\n".join(summaries))
+    
+    @classmethod
+    @Metrics.timed("prompt_build")
+    def build_translation_prompt(cls, segments: List[str], target: str = "中文",
+                                 references: Optional[List[Tuple[str, str]]] = None) -> str:
+        """构建批量翻译提示，片段按[1]、[2]……编号，译文需保留相同编号
+
+        references为翻译记忆中相近片段的(原文, 译文)，作为参考附在待译片段之前。
+        """
+        lang = "zh" if target == "中文" else "en"
+        template = cls._prompts['translate'][lang]
+        numbered = "\n".join(f"[{index}] {segment}" for index, segment in enumerate(segments, 1))
+        reference_text = ""
+        if references:
+            pairs = "\n".join(f"- {source}\n  → {translation}" for source, translation in references)
+            reference_text = cls._prompts['translate_references'][lang].format(pairs=pairs)
+        return template.format(segments=numbered, target=target, references=reference_text)
+    
+    @classmethod
+    @Metrics.timed("prompt_build")
+    def build_followup_prompt(cls, history: str, language: str = "中文",
+                              budget: Optional[TokenBudget] = None) -> str:
+        """构建追问提示，超出预算时保留最近的对话"""
         lang = "zh" if language == "中文" else "en"
-        return cls._prompts['followup'][lang].format(history=history)
\ No newline at end of file
+        template = cls._prompts['followup'][lang]
+        if budget is not None:
+            budget.reserve("template", TokenBudget.template_overhead(template, "history"))
+            history = "".join(budget.fit("history", history.splitlines(keepends=True), newest_last=True))
+        return template.format(history=history)
\ No newline at end of file
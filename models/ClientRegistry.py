@@ -0,0 +1,86 @@
+import hashlib
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class _ClientEntry:
+    """注册表中的客户端条目"""
+
+    def __init__(self, client: Any, idle_timeout: float, close: Optional[Callable[[Any], None]]):
+        self.client = client
+        self.idle_timeout = idle_timeout
+        self.close = close
+        self.last_used = time.monotonic()
+
+
+class ClientRegistry:
+    """进程级模型客户端注册表
+
+    按 (厂商, 模型, API Key哈希) 复用客户端实例及其keep-alive连接池，
+    空闲超过 idle_timeout 的客户端在下一次访问注册表时关闭。
+    """
+
+    # 两次空闲清理之间的最小间隔（秒）
+    SWEEP_INTERVAL = 30
+
+    _clients: Dict[Tuple[str, str, str], _ClientEntry] = {}
+    _lock = threading.Lock()
+    _last_sweep = 0.0
+
+    @staticmethod
+    def _key(provider: str, model_name: str, api_key: Optional[str]) -> Tuple[str, str, str]:
+        """注册表键中只保存API Key的哈希"""
+        key_hash = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:16]
+        return provider, model_name, key_hash
+
+    @classmethod
+    def get(cls, provider: str, model_name: str, api_key: Optional[str],
+            factory: Callable[[], Any], idle_timeout: float = 600,
+            close: Optional[Callable[[Any], None]] = None) -> Any:
+        """获取客户端，不存在时调用factory创建"""
+        cls.close_idle()
+        key = cls._key(provider, model_name, api_key)
+        with cls._lock:
+            entry = cls._clients.get(key)
+            if entry is None:
+                entry = _ClientEntry(factory(), idle_timeout, close)
+                cls._clients[key] = entry
+            entry.last_used = time.monotonic()
+            return entry.client
+
+    @classmethod
+    def close_idle(cls, force: bool = False) -> int:
+        """关闭空闲超时的客户端，返回关闭的数量"""
+        now = time.monotonic()
+        if not force and now - cls._last_sweep < cls.SWEEP_INTERVAL:
+            return 0
+        with cls._lock:
+            cls._last_sweep = now
+            expired = [
+                key for key, entry in cls._clients.items()
+                if now - entry.last_used > entry.idle_timeout
+            ]
+            entries = [cls._clients.pop(key) for key in expired]
+        for entry in entries:
+            cls._close_entry(entry)
+        return len(entries)
+
+    @classmethod
+    def close_all(cls) -> None:
+        """关闭全部客户端"""
+        with cls._lock:
+            entries = list(cls._clients.values())
+            cls._clients.clear()
+        for entry in entries:
+            cls._close_entry(entry)
+
+    @staticmethod
+    def _close_entry(entry: _ClientEntry) -> None:
+        try:
+            if entry.close is not None:
+                entry.close(entry.client)
+            elif hasattr(entry.client, "close"):
+                entry.client.close()
+        except Exception:
+            pass
@@ -0,0 +1,109 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+from models.ModelFactory import ModelConfig
+
+
+class ConversationMemory:
+    """有界对话记忆
+
+    最近recent_turns轮对话原文保留；更早的轮次由后台线程折叠进滚动摘要，
+    提示词中的对话历史因此始终在固定的token预算内，不随会话长度增长。
+    摘要尚未完成时，待折叠的消息仍以原文参与预算装入（最旧的先被舍弃）。
+    """
+
+    DEFAULT_RECENT_TURNS = 4
+    DEFAULT_HISTORY_TOKENS = 2048
+    DEFAULT_SUMMARY_TOKENS = 512
+
+    # 所有会话共用一个后台线程，摘要请求串行执行，不与前台回答争抢并发
+    _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="conversation-memory")
+
+    def __init__(self, recent_turns: int = DEFAULT_RECENT_TURNS,
+                 history_tokens: int = DEFAULT_HISTORY_TOKENS,
+                 summary_tokens: int = DEFAULT_SUMMARY_TOKENS):
+        self.recent_turns = recent_turns
+        self.history_tokens = history_tokens
+        self.summary_tokens = summary_tokens
+        self.summary = ""
+        # 已折叠进摘要的消息条数（聊天历史的前缀）
+        self.summarized = 0
+        self._generation = 0
+        self._future: Optional[Future] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls) -> "ConversationMemory":
+        """根据config.yaml中的conversation_memory配置创建"""
+        settings = ModelConfig.get_config().get('conversation_memory', {})
+        return cls(
+            recent_turns=settings.get('recent_turns', cls.DEFAULT_RECENT_TURNS),
+            history_tokens=settings.get('history_tokens', cls.DEFAULT_HISTORY_TOKENS),
+            summary_tokens=settings.get('summary_tokens', cls.DEFAULT_SUMMARY_TOKENS)
+        )
+
+    @staticmethod
+    def turn_start(history: List[Dict[str, str]], turns: int) -> int:
+        """最近turns轮对话（以用户消息为一轮的开始）在历史中的起始下标"""
+        if turns <= 0:
+            return len(history)
+        seen = 0
+        for index in range(len(history) - 1, -1, -1):
+            if history[index]["role"] == "user":
+                seen += 1
+                if seen == turns:
+                    return index
+        return 0
+
+    def reset(self) -> None:
+        """清空记忆；进行中的后台摘要完成后会被丢弃"""
+        with self._lock:
+            self.summary = ""
+            self.summarized = 0
+            self._generation += 1
+            self._future = None
+
+    def context(self, history: List[Dict[str, str]],
+                summarize: Optional[Callable[[str, List[Dict[str, str]]], str]] = None
+                ) -> Tuple[str, List[Dict[str, str]]]:
+        """返回(滚动摘要, 需原文保留的消息)
+
+        summarize(已有摘要, 新增消息)用于生成新摘要；传入时若有超出最近几轮的
+        消息尚未折叠，会在后台开始折叠，本次调用不等待其完成。
+        """
+        if len(history) < self.summarized:
+            # 聊天历史被清空或替换
+            self.reset()
+        with self._lock:
+            summary, summarized = self.summary, self.summarized
+            busy = self._future is not None
+        start = self.turn_start(history, self.recent_turns)
+        if summarize is not None and not busy and start > summarized:
+            self._fold(summarize, summary, list(history[summarized:start]), start)
+        return summary, history[summarized:]
+
+    def _fold(self, summarize: Callable[[str, List[Dict[str, str]]], str], summary: str,
+              messages: List[Dict[str, str]], upto: int) -> None:
+        """在后台把messages并入摘要，完成后推进已折叠的位置"""
+        generation = self._generation
+
+        def run() -> None:
+            try:
+                new_summary = summarize(summary, messages)
+            except Exception:
+                new_summary = ""
+            with self._lock:
+                if generation == self._generation:
+                    if new_summary:
+                        self.summary = new_summary
+                        self.summarized = upto
+                    self._future = None
+
+        with self._lock:
+            self._future = self._executor.submit(run)
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        """等待进行中的后台摘要完成（批处理和调试时使用）"""
+        future = self._future
+        if future is not None:
+            future.result(timeout)
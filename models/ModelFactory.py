@@ -1,11 +1,26 @@
 import streamlit as st
-from langchain_ollama import OllamaLLM
-from openai import OpenAI
+import asyncio
 import os
 import yaml
 import subprocess
+import json
+import time
 import requests
-from typing import Dict, List, Optional
+from requests.adapters import HTTPAdapter
+from typing import TYPE_CHECKING, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+from models.ClientRegistry import ClientRegistry
+from models.RequestScheduler import RequestScheduler, SchedulerRegistry, request_started
+from models.ResponseCache import ResponseCache, response_cache_key
+from models.SingleFlight import SingleFlight
+from services.metrics_service import Metrics
+
+# httpx / openai 导入较慢，仅在首次创建客户端时导入
+if TYPE_CHECKING:
+    import httpx
+    from openai import AsyncOpenAI, OpenAI
+
+class IncompleteStreamError(RuntimeError):
+    """流式回复在厂商报告结束（done / [DONE] / finish_reason）之前中断"""
 
 class ModelConfig:
     """模型配置管理类"""
@@ -30,30 +45,302 @@ class ModelConfig:
         """获取配置"""
         return cls._config
 
+    @classmethod
+    def get_pool_config(cls, model_type: str) -> Dict:
+        """获取连接池配置，厂商级配置覆盖全局默认值"""
+        pool_config = dict(cls._config.get('client_pool', {}))
+        pool_config.update(cls.get_model_config(model_type).get('client_pool', {}))
+        return pool_config
+
+    @classmethod
+    def get_scheduler_config(cls, model_type: str) -> Dict:
+        """获取请求调度配置，厂商级配置覆盖全局默认值"""
+        model_config = cls.get_model_config(model_type)
+        scheduler_config = dict(cls._config.get('scheduler', {}))
+        scheduler_config.setdefault('max_limit', model_config.get('max_concurrency', 4))
+        scheduler_config.update(model_config.get('scheduler', {}))
+        return scheduler_config
+
+_response_cache: Optional[ResponseCache] = None
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """获取进程级共享的回复缓存，配置中关闭时返回None"""
+    global _response_cache
+    settings = ModelConfig.get_config().get('response_cache', {})
+    if not settings.get('enabled', False):
+        return None
+    if _response_cache is None:
+        _response_cache = ResponseCache(
+            ttl_seconds=settings.get('ttl_seconds', 7 * 24 * 3600),
+            max_bytes=settings.get('max_bytes', 256 * 1024 * 1024),
+            memory_bytes=settings.get('memory_bytes', 32 * 1024 * 1024)
+        )
+    return _response_cache
+
+def get_scheduler(model_type: str) -> RequestScheduler:
+    """获取厂商的请求调度器（进程内共享）"""
+    return SchedulerRegistry.get(model_type, ModelConfig.get_scheduler_config(model_type))
+
+def get_openai_client(api_key: str, model_name: str) -> "OpenAI":
+    """获取复用的OpenAI客户端"""
+    pool = ModelConfig.get_pool_config('openai')
+
+    def create() -> "OpenAI":
+        import httpx
+        from openai import OpenAI
+        # 重试由RequestScheduler统一处理
+        return OpenAI(
+            api_key=api_key,
+            max_retries=0,
+            timeout=httpx.Timeout(pool.get('read_timeout', 300), connect=pool.get('connect_timeout', 10)),
+            http_client=httpx.Client(limits=httpx.Limits(
+                max_connections=pool.get('pool_size', 10),
+                max_keepalive_connections=pool.get('pool_size', 10),
+                keepalive_expiry=pool.get('idle_timeout', 600)
+            ))
+        )
+
+    return ClientRegistry.get("OpenAI", model_name, api_key, create, pool.get('idle_timeout', 600))
+
+def get_http_session(provider: str, model_name: str, api_key: Optional[str]) -> requests.Session:
+    """获取复用的HTTP会话（keep-alive连接池）"""
+    pool = ModelConfig.get_pool_config(provider.lower())
+
+    def create() -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool.get('pool_size', 10))
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    return ClientRegistry.get(provider, model_name, api_key, create, pool.get('idle_timeout', 600))
+
+def get_request_timeout(model_type: str) -> tuple:
+    """获取(连接超时, 读取超时)"""
+    pool = ModelConfig.get_pool_config(model_type)
+    return pool.get('connect_timeout', 10), pool.get('read_timeout', 300)
+
+def ollama_payload(prompt: str, model_name: str, stream: bool) -> Dict:
+    """构建Ollama chat接口的请求体
+
+    keep_alive让模型常驻内存；服务端按token前缀复用上一轮的KV缓存，
+    因此同一文档的连续提问只需评估前缀之后新增的部分。
+    """
+    config = ModelConfig.get_model_config('ollama')
+    num_ctx = config.get('context_windows', {}).get(model_name, config.get('default_context_window'))
+    return {
+        "model": model_name,
+        "messages": [
+            {"role": "system", "content": config['system_prompt']},
+            {"role": "user", "content": prompt}
+        ],
+        "stream": stream,
+        "keep_alive": config.get('keep_alive', "30m"),
+        # 服务端默认窗口较小，不指定num_ctx会截断长提示
+        "options": {"num_ctx": num_ctx}
+    }
+
+def chat_ollama(prompt: str, model_name: str) -> Dict:
+    """调用Ollama chat接口，返回完整响应（含prompt_eval_count等计时字段）"""
+    config = ModelConfig.get_model_config('ollama')
+    session = get_http_session("Ollama", model_name, None)
+
+    def request() -> Dict:
+        response = session.post(
+            config['api_url'],
+            json=ollama_payload(prompt, model_name, stream=False),
+            timeout=get_request_timeout('ollama')
+        )
+        response.raise_for_status()
+        return response.json()
+
+    return get_scheduler('ollama').call(request)
+
+def query_ollama(prompt: str, model_name: str) -> str:
+    """Query Ollama model"""
+    try:
+        return chat_ollama(prompt, model_name)["message"]["content"].strip()
+    except Exception as e:
+        st.error(ModelConfig.get_error('api_error', model='Ollama', error=str(e)))
+        return ""
+
+async def aquery_ollama(prompt: str, model_name: str, http_client: "httpx.AsyncClient") -> str:
+    """Query Ollama model asynchronously"""
+    try:
+        config = ModelConfig.get_model_config('ollama')
+
+        async def request() -> str:
+            response = await http_client.post(
+                config['api_url'], json=ollama_payload(prompt, model_name, stream=False)
+            )
+            response.raise_for_status()
+            return response.json()["message"]["content"].strip()
+
+        return await get_scheduler('ollama').acall(request)
+    except Exception as e:
+        st.error(ModelConfig.get_error('api_error', model='Ollama', error=str(e)))
+        return ""
+
+def iter_ndjson_deltas(lines: Iterator[str]) -> Iterator[str]:
+    """解析Ollama的NDJSON流，逐个产出增量文本"""
+    for line in lines:
+        if not line:
+            continue
+        chunk = json.loads(line)
+        if chunk.get("error"):
+            raise RuntimeError(chunk["error"])
+        content = chunk.get("message", {}).get("content")
+        if content:
+            yield content
+        if chunk.get("done"):
+            return
+    raise IncompleteStreamError("Ollama stream ended before done")
+
+def stream_ollama(prompt: str, model_name: str) -> Iterator[str]:
+    """Stream Ollama model output token by token"""
+    try:
+        config = ModelConfig.get_model_config('ollama')
+        session = get_http_session("Ollama", model_name, None)
+
+        def request() -> Iterator[str]:
+            with session.post(
+                config['api_url'],
+                json=ollama_payload(prompt, model_name, stream=True),
+                stream=True,
+                timeout=get_request_timeout('ollama')
+            ) as response:
+                response.raise_for_status()
+                yield from iter_ndjson_deltas(response.iter_lines(decode_unicode=True))
+
+        yield from get_scheduler('ollama').stream(request)
+    except Exception as e:
+        st.error(ModelConfig.get_error('api_error', model='Ollama', error=str(e)))
+        # 以异常结束，已收到的部分不会被当作完整回复写入缓存
+        raise IncompleteStreamError(str(e)) from e
+
+def create_async_http_client() -> "httpx.AsyncClient":
+    """创建异步HTTP客户端
+
+    异步连接池绑定在创建它的事件循环上，无法跨 asyncio.run 复用，
+    因此由每次并发调用自行创建并在结束时关闭。
+    """
+    import httpx
+    pool = dict(ModelConfig.get_config().get('client_pool', {}))
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(pool.get('read_timeout', 300), connect=pool.get('connect_timeout', 10)),
+        limits=httpx.Limits(
+            max_connections=pool.get('pool_size', 10),
+            max_keepalive_connections=pool.get('pool_size', 10)
+        )
+    )
+
 def query_deepseek(prompt: str, api_key: str, model_name: str) -> str:
     """Query DeepSeek model"""
     try:
         config = ModelConfig.get_model_config('deepseek')
-        response = requests.post(
-            config['api_url'],
-            headers={
-                "Authorization": f"Bearer {api_key}",
-                "Content-Type": "application/json"
-            },
-            json={
-                "model": model_name,
-                "messages": [
-                    {"role": "system", "content": config['system_prompt']},
-                    {"role": "user", "content": prompt}
-                ]
-            }
-        )
-        response.raise_for_status()
-        return response.json()["choices"][0]["message"]["content"].strip()
+        session = get_http_session("DeepSeek", model_name, api_key)
+
+        def request() -> str:
+            response = session.post(
+                config['api_url'],
+                headers={
+                    "Authorization": f"Bearer {api_key}",
+                    "Content-Type": "application/json"
+                },
+                json={
+                    "model": model_name,
+                    "messages": [
+                        {"role": "system", "content": config['system_prompt']},
+                        {"role": "user", "content": prompt}
+                    ]
+                },
+                timeout=get_request_timeout('deepseek')
+            )
+            response.raise_for_status()
+            return response.json()["choices"][0]["message"]["content"].strip()
+
+        return get_scheduler('deepseek').call(request)
     except Exception as e:
         st.error(ModelConfig.get_error('api_error', model='DeepSeek', error=str(e)))
         return ""
 
+async def aquery_deepseek(prompt: str, api_key: str, model_name: str,
+                          http_client: "httpx.AsyncClient") -> str:
+    """Query DeepSeek model asynchronously"""
+    try:
+        config = ModelConfig.get_model_config('deepseek')
+
+        async def request() -> str:
+            response = await http_client.post(
+                config['api_url'],
+                headers={
+                    "Authorization": f"Bearer {api_key}",
+                    "Content-Type": "application/json"
+                },
+                json={
+                    "model": model_name,
+                    "messages": [
+                        {"role": "system", "content": config['system_prompt']},
+                        {"role": "user", "content": prompt}
+                    ]
+                }
+            )
+            response.raise_for_status()
+            return response.json()["choices"][0]["message"]["content"].strip()
+
+        return await get_scheduler('deepseek').acall(request)
+    except Exception as e:
+        st.error(ModelConfig.get_error('api_error', model='DeepSeek', error=str(e)))
+        return ""
+
+def iter_sse_deltas(lines: Iterator[str]) -> Iterator[str]:
+    """解析OpenAI兼容的SSE流，逐个产出增量文本"""
+    for line in lines:
+        if not line or not line.startswith("data:"):
+            continue
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            return
+        choices = json.loads(data).get("choices") or []
+        if choices:
+            content = choices[0].get("delta", {}).get("content")
+            if content:
+                yield content
+    raise IncompleteStreamError("stream ended before [DONE]")
+
+def stream_deepseek(prompt: str, api_key: str, model_name: str) -> Iterator[str]:
+    """Stream DeepSeek model output token by token"""
+    try:
+        config = ModelConfig.get_model_config('deepseek')
+        session = get_http_session("DeepSeek", model_name, api_key)
+
+        def request() -> Iterator[str]:
+            with session.post(
+                config['api_url'],
+                headers={
+                    "Authorization": f"Bearer {api_key}",
+                    "Content-Type": "application/json"
+                },
+                json={
+                    "model": model_name,
+                    "messages": [
+                        {"role": "system", "content": config['system_prompt']},
+                        {"role": "user", "content": prompt}
+                    ],
+                    "stream": True
+                },
+                stream=True,
+                timeout=get_request_timeout('deepseek')
+            ) as response:
+                response.raise_for_status()
+                yield from iter_sse_deltas(response.iter_lines(decode_unicode=True))
+
+        yield from get_scheduler('deepseek').stream(request)
+    except Exception as e:
+        st.error(ModelConfig.get_error('api_error', model='DeepSeek', error=str(e)))
+        # 以异常结束，已收到的部分不会被当作完整回复写入缓存
+        raise IncompleteStreamError(str(e)) from e
+
 def list_ollama_models() -> List[str]:
     """获取可用的Ollama模型列表"""
     try:
@@ -90,68 +377,307 @@ def query_gpt4(prompt: str, api_key: str, model_name: str) -> str:
     """Query GPT-4 model from OpenAI"""
     try:
         config = ModelConfig.get_model_config('openai')
-        client = OpenAI(api_key=api_key)
-        response = client.chat.completions.create(
-            model=model_name,
-            messages=[
-                {"role": "system", "content": config['system_prompt']},
-                {"role": "user", "content": prompt}
-            ]
+        client = get_openai_client(api_key, model_name)
+
+        def request() -> str:
+            response = client.chat.completions.create(
+                model=model_name,
+                messages=[
+                    {"role": "system", "content": config['system_prompt']},
+                    {"role": "user", "content": prompt}
+                ]
+            )
+            return response.choices[0].message.content.strip()
+
+        return get_scheduler('openai').call(request)
+    except Exception as e:
+        st.error(ModelConfig.get_error('api_error', model='GPT-4', error=str(e)))
+        return ""
+
+def get_async_openai_client(api_key: str, http_client: "httpx.AsyncClient") -> "AsyncOpenAI":
+    """获取建立在调用方异步HTTP客户端上的AsyncOpenAI实例
+
+    同一次并发调用中的请求共用一个实例及其连接池；实例挂在该HTTP客户端上，随之回收。
+    超时需显式传入，否则SDK的默认超时会覆盖连接池配置。
+    """
+    clients = getattr(http_client, "_openai_clients", None)
+    if clients is None:
+        clients = {}
+        http_client._openai_clients = clients
+    if api_key not in clients:
+        import httpx
+        from openai import AsyncOpenAI
+        pool = ModelConfig.get_pool_config('openai')
+        # 重试由RequestScheduler统一处理
+        clients[api_key] = AsyncOpenAI(
+            api_key=api_key,
+            max_retries=0,
+            timeout=httpx.Timeout(pool.get('read_timeout', 300), connect=pool.get('connect_timeout', 10)),
+            http_client=http_client
         )
-        return response.choices[0].message.content.strip()
+    return clients[api_key]
+
+async def aquery_gpt4(prompt: str, api_key: str, model_name: str,
+                     http_client: "httpx.AsyncClient") -> str:
+    """Query GPT-4 model from OpenAI asynchronously"""
+    try:
+        config = ModelConfig.get_model_config('openai')
+        client = get_async_openai_client(api_key, http_client)
+
+        async def request() -> str:
+            response = await client.chat.completions.create(
+                model=model_name,
+                messages=[
+                    {"role": "system", "content": config['system_prompt']},
+                    {"role": "user", "content": prompt}
+                ]
+            )
+            return response.choices[0].message.content.strip()
+
+        return await get_scheduler('openai').acall(request)
     except Exception as e:
         st.error(ModelConfig.get_error('api_error', model='GPT-4', error=str(e)))
         return ""
 
+def stream_gpt4(prompt: str, api_key: str, model_name: str) -> Iterator[str]:
+    """Stream GPT-4 output token by token"""
+    try:
+        config = ModelConfig.get_model_config('openai')
+        client = get_openai_client(api_key, model_name)
+
+        def request() -> Iterator[str]:
+            stream = client.chat.completions.create(
+                model=model_name,
+                messages=[
+                    {"role": "system", "content": config['system_prompt']},
+                    {"role": "user", "content": prompt}
+                ],
+                stream=True
+            )
+            finished = False
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+                if chunk.choices and chunk.choices[0].finish_reason:
+                    finished = True
+            if not finished:
+                raise IncompleteStreamError("stream ended without finish_reason")
+
+        yield from get_scheduler('openai').stream(request)
+    except Exception as e:
+        st.error(ModelConfig.get_error('api_error', model='GPT-4', error=str(e)))
+        # 以异常结束，已收到的部分不会被当作完整回复写入缓存
+        raise IncompleteStreamError(str(e)) from e
+
 class ModelFactory:
     """模型工厂类"""
     
-    @staticmethod
-    def get_model(model_choice: Dict[str, str]) -> 'BaseModel':
-        """获取模型实例"""
+    _instances: Dict[tuple, 'BaseModel'] = {}
+
+    @classmethod
+    def get_model(cls, model_choice: Dict[str, str]) -> 'BaseModel':
+        """获取模型实例（按厂商和模型名复用）"""
         model_map = {
             "OpenAI": OpenAIModel,
             "Ollama": OllamaModel,
             "DeepSeek": DeepSeekModel
         }
-        model_class = model_map.get(model_choice['model_frame'], BaseModel)
-        return model_class(model_choice['model_name'])
+        key = (model_choice['model_frame'], model_choice['model_name'])
+        if key not in cls._instances:
+            model_class = model_map.get(model_choice['model_frame'], BaseModel)
+            cls._instances[key] = model_class(model_choice['model_name'])
+        return cls._instances[key]
+
+    @staticmethod
+    def label(model_choice: Dict[str, str]) -> str:
+        """模型的显示名称"""
+        return f"{model_choice['model_frame']} / {model_choice['model_name']}"
+
+    @classmethod
+    async def fan_out(cls, prompt: str, model_choices: List[Dict[str, str]],
+                      use_cache: bool = True) -> AsyncIterator[Tuple[Dict[str, str], str, float]]:
+        """将同一提示并发发送给多个模型，按完成先后产出(模型, 回复, 耗时)
+
+        总耗时取决于最慢的模型；同一厂商的在途请求数由其RequestScheduler限制。
+        耗时从拿到并发名额开始计算，不含排队等待（命中缓存时从调用开始计算）。
+        """
+        async with create_async_http_client() as http_client:
+
+            async def run(model_choice: Dict[str, str]) -> Tuple[Dict[str, str], str, float]:
+                model = cls.get_model(model_choice)
+                # 每个任务有独立的上下文，调度器在此写入本次请求的开始时间
+                request_started.set(None)
+                start = time.monotonic()
+                response = await model.agenerate_response(prompt, http_client, use_cache)
+                return model_choice, response, time.monotonic() - (request_started.get() or start)
+
+            tasks = [asyncio.ensure_future(run(model_choice)) for model_choice in model_choices]
+            try:
+                for next_done in asyncio.as_completed(tasks):
+                    yield await next_done
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+_single_flight = SingleFlight()
 
 class BaseModel:
-    """基础模型类"""
-    def generate_response(self, prompt: str) -> str:
+    """基础模型类
+
+    子类实现 _generate_response / _generate_stream 完成实际调用，
+    generate_response / generate_stream 在其外层统一处理回复缓存和相同请求的合并。
+    """
+    provider = ""
+    model_type = ""
+
+    def __init__(self, model_name: str = ""):
+        self.model_name = model_name
+        self.config = ModelConfig.get_model_config(self.model_type)
+
+    def generate_response(self, prompt: str, use_cache: bool = True) -> str:
+        """生成完整回复，use_cache为False时绕过回复缓存"""
+        cache = get_response_cache() if use_cache else None
+        key = self._cache_key(prompt)
+        if cache is not None:
+            cached = cache.get(key)
+            if cached is not None:
+                return cached
+        # 相同请求正在进行时共享其结果，不重复请求厂商
+        return _single_flight.do(key, lambda: self._fetch_response(prompt, key, cache))
+
+    def _fetch_response(self, prompt: str, key: str, cache: Optional[ResponseCache]) -> str:
+        start = time.perf_counter()
+        response = self._generate_response(prompt)
+        if Metrics.enabled:
+            self._record_metrics(prompt, response, time.perf_counter() - start)
+        if cache is not None and self._is_cacheable(response):
+            cache.put(key, self.provider, self.model_name, response)
+        return response
+
+    def generate_stream(self, prompt: str, use_cache: bool = True) -> Iterator[str]:
+        """逐段产出回复；命中缓存时一次性产出，完整结束的流写入缓存
+
+        相同的流式请求正在进行时加入其中：先回放已收到的部分，再跟随后续输出。
+        厂商未报告正常结束的流抛出IncompleteStreamError，不写入缓存。
+        """
+        cache = get_response_cache() if use_cache else None
+        key = self._cache_key(prompt)
+        if cache is not None:
+            cached = cache.get(key)
+            if cached is not None:
+                yield cached
+                return
+
+        def on_complete(response: str, seconds: float, ttft: Optional[float]) -> None:
+            if Metrics.enabled:
+                self._record_metrics(prompt, response, seconds, ttft)
+            if cache is not None and self._is_cacheable(response):
+                cache.put(key, self.provider, self.model_name, response)
+
+        yield from _single_flight.stream(key, lambda: self._generate_stream(prompt), on_complete)
+
+    async def agenerate_response(self, prompt: str, http_client: "httpx.AsyncClient",
+                                 use_cache: bool = True) -> str:
+        """异步生成完整回复，http_client由调用方在当前事件循环中创建"""
+        cache = get_response_cache() if use_cache else None
+        key = self._cache_key(prompt)
+        if cache is not None:
+            cached = cache.get(key)
+            if cached is not None:
+                return cached
+        start = time.perf_counter()
+        response = await self._agenerate_response(prompt, http_client)
+        if Metrics.enabled:
+            self._record_metrics(prompt, response, time.perf_counter() - start)
+        if cache is not None and self._is_cacheable(response):
+            cache.put(key, self.provider, self.model_name, response)
+        return response
+
+    def _cache_key(self, prompt: str) -> str:
+        return response_cache_key(self.provider, self.model_name, self.config.get('system_prompt', ""), prompt)
+
+    def _record_metrics(self, prompt: str, response: str, seconds: float,
+                        ttft: Optional[float] = None) -> None:
+        """记录一次模型调用的耗时、token数和首token时间"""
+        from models.TokenBudget import TokenCounter
+        counter = TokenCounter(self.model_type, self.model_name)
+        Metrics.record(
+            "generate", seconds, self.provider,
+            model=self.model_name,
+            prompt_tokens=counter.count(prompt),
+            completion_tokens=counter.count(response) if self._is_cacheable(response) else 0,
+            ttft=ttft
+        )
+
+    def _is_cacheable(self, response: str) -> bool:
+        """空回复和错误提示不写入缓存"""
+        return bool(response and response.strip()) and response != self.config.get('error_message')
+
+    def _generate_response(self, prompt: str) -> str:
         return ModelConfig.get_error('base')
 
+    def _generate_stream(self, prompt: str) -> Iterator[str]:
+        """默认退化为一次性返回完整回复"""
+        yield self._generate_response(prompt)
+
+    async def _agenerate_response(self, prompt: str, http_client: "httpx.AsyncClient") -> str:
+        """默认在线程池中执行同步调用"""
+        return await asyncio.to_thread(self._generate_response, prompt)
+
 class OpenAIModel(BaseModel):
     """OpenAI模型类"""
-    def __init__(self, model_name: str):
-        self.model_name = model_name
-        self.config = ModelConfig.get_model_config('openai')
+    provider = "OpenAI"
+    model_type = "openai"
 
-    def generate_response(self, prompt: str) -> str:
+    def _generate_response(self, prompt: str) -> str:
         api_key = get_api_key("OpenAI")
         return query_gpt4(prompt, api_key, self.model_name) if api_key else self.config['error_message']
 
+    def _generate_stream(self, prompt: str) -> Iterator[str]:
+        api_key = get_api_key("OpenAI")
+        if not api_key:
+            yield self.config['error_message']
+            return
+        yield from stream_gpt4(prompt, api_key, self.model_name)
+
+    async def _agenerate_response(self, prompt: str, http_client: "httpx.AsyncClient") -> str:
+        api_key = get_api_key("OpenAI")
+        if not api_key:
+            return self.config['error_message']
+        return await aquery_gpt4(prompt, api_key, self.model_name, http_client)
+
 class OllamaModel(BaseModel):
     """Ollama模型类"""
-    def __init__(self, model_name: str):
-        self.model_name = model_name
-        self.config = ModelConfig.get_model_config('ollama')
-
-    def generate_response(self, prompt: str) -> str:
-        try:
-            llm = OllamaLLM(model=self.model_name)
-            return llm.invoke(prompt)
-        except Exception as e:
-            st.error(ModelConfig.get_error('api_error', model='Ollama', error=str(e)))
-            return self.config['error_message']
+    provider = "Ollama"
+    model_type = "ollama"
+
+    def _generate_response(self, prompt: str) -> str:
+        return query_ollama(prompt, self.model_name) or self.config['error_message']
+
+    def _generate_stream(self, prompt: str) -> Iterator[str]:
+        yield from stream_ollama(prompt, self.model_name)
+
+    async def _agenerate_response(self, prompt: str, http_client: "httpx.AsyncClient") -> str:
+        return await aquery_ollama(prompt, self.model_name, http_client) or self.config['error_message']
 
 class DeepSeekModel(BaseModel):
     """DeepSeek模型类"""
-    def __init__(self, model_name: str):
-        self.model_name = model_name
-        self.config = ModelConfig.get_model_config('deepseek')
+    provider = "DeepSeek"
+    model_type = "deepseek"
 
-    def generate_response(self, prompt: str) -> str:
+    def _generate_response(self, prompt: str) -> str:
         api_key = get_api_key("DeepSeek")
         return query_deepseek(prompt, api_key, self.model_name) if api_key else self.config['error_message']
+
+    def _generate_stream(self, prompt: str) -> Iterator[str]:
+        api_key = get_api_key("DeepSeek")
+        if not api_key:
+            yield self.config['error_message']
+            return
+        yield from stream_deepseek(prompt, api_key, self.model_name)
+
+    async def _agenerate_response(self, prompt: str, http_client: "httpx.AsyncClient") -> str:
+        api_key = get_api_key("DeepSeek")
+        if not api_key:
+            return self.config['error_message']
+        return await aquery_deepseek(prompt, api_key, self.model_name, http_client)
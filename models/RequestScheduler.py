@@ -0,0 +1,283 @@
+import asyncio
+import contextvars
+import email.utils
+import random
+import sys
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+# 值得重试的HTTP状态码：限流、超时和服务端错误
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+
+# 当前任务中最近一次请求首次拿到并发名额的时间（time.monotonic），用于扣除排队等待
+request_started: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("request_started", default=None)
+
+
+class CircuitOpenError(RuntimeError):
+    """熔断期间直接失败，不再请求厂商接口"""
+
+
+class AIMDLimiter:
+    """加性增、乘性减的并发上限
+
+    每次成功把上限增加1/limit（约每轮满并发加1）；遇到限流或超时时上限减半；
+    单次耗时明显高于平滑耗时时小幅下调，避免把排队时间推给厂商。
+    同步与异步调用共用同一组计数，跨线程、跨事件循环都有效。
+    """
+
+    def __init__(self, initial: float = 4, min_limit: float = 1, max_limit: float = 16,
+                 backoff_ratio: float = 0.5, latency_tolerance: float = 2.0):
+        self.min_limit = float(min_limit)
+        self.max_limit = float(max(max_limit, min_limit))
+        self.limit = min(max(float(initial), self.min_limit), self.max_limit)
+        self.backoff_ratio = backoff_ratio
+        self.latency_tolerance = latency_tolerance
+        self.in_flight = 0
+        self.smoothed_latency: Optional[float] = None
+        self._condition = threading.Condition()
+
+    def try_acquire(self) -> bool:
+        with self._condition:
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return True
+            return False
+
+    def acquire(self) -> None:
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    async def acquire_async(self) -> None:
+        """异步等待名额；不占用线程，轮询间隔逐步拉长"""
+        delay = 0.005
+        while not self.try_acquire():
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.1)
+
+    def release(self) -> None:
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify()
+
+    def on_success(self, latency: float) -> None:
+        with self._condition:
+            if self.smoothed_latency is not None and latency > self.smoothed_latency * self.latency_tolerance:
+                self.limit = max(self.min_limit, self.limit * 0.9)
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self.smoothed_latency = latency if self.smoothed_latency is None else \
+                0.8 * self.smoothed_latency + 0.2 * latency
+            self._condition.notify_all()
+
+    def on_overload(self) -> None:
+        with self._condition:
+            self.limit = max(self.min_limit, self.limit * self.backoff_ratio)
+
+
+class CircuitBreaker:
+    """连续失败达到阈值后熔断，reset_timeout秒后放行一个探测请求"""
+
+    def __init__(self, name: str = "", failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.reset_timeout else "open"
+
+    def allow(self) -> None:
+        """熔断中抛出CircuitOpenError；半开状态只放行一个探测请求"""
+        with self._lock:
+            if self.opened_at is None:
+                return
+            remaining = self.reset_timeout - (time.monotonic() - self.opened_at)
+            if remaining > 0 or self._probing:
+                raise CircuitOpenError(f"{self.name or 'provider'} unavailable, retry in {max(remaining, 1):.0f}s")
+            self._probing = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+    def release_probe(self) -> None:
+        """请求被厂商拒绝（如400、401）：既不能证明厂商已恢复，也不算故障，只归还探测名额"""
+        with self._lock:
+            self._probing = False
+
+
+def error_details(error: BaseException) -> Dict[str, Any]:
+    """从requests / httpx / openai的异常中取出状态码和Retry-After（秒）"""
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    retry_after = None
+    headers = getattr(response, "headers", None)
+    if headers is not None and headers.get("Retry-After"):
+        value = headers.get("Retry-After")
+        try:
+            retry_after = float(value)
+        except ValueError:
+            parsed = email.utils.parsedate_to_datetime(value)
+            retry_after = max(parsed.timestamp() - time.time(), 0.0) if parsed else None
+    return {"status": status, "retry_after": retry_after}
+
+
+def is_transient(error: BaseException) -> bool:
+    """连接失败、超时等网络层错误（按已加载的客户端库判断，不额外导入）"""
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    requests = sys.modules.get("requests")
+    if requests is not None and isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    httpx = sys.modules.get("httpx")
+    if httpx is not None and isinstance(error, httpx.TransportError):
+        return True
+    openai = sys.modules.get("openai")
+    return openai is not None and isinstance(error, openai.APIConnectionError)
+
+
+class RequestScheduler:
+    """单个厂商的请求调度：并发上限 + 重试退避 + 熔断"""
+
+    def __init__(self, provider: str, settings: Dict):
+        self.provider = provider
+        self.max_attempts = settings.get('max_attempts', 4)
+        self.base_delay = settings.get('base_delay', 0.5)
+        self.max_delay = settings.get('max_delay', 30.0)
+        self.limiter = AIMDLimiter(
+            initial=settings.get('initial_limit', 4),
+            min_limit=settings.get('min_limit', 1),
+            max_limit=settings.get('max_limit', 16)
+        )
+        self.breaker = CircuitBreaker(
+            provider,
+            failure_threshold=settings.get('failure_threshold', 5),
+            reset_timeout=settings.get('reset_timeout', 30.0)
+        )
+
+    def backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        """带抖动的指数退避；厂商给出Retry-After时至少等待该时长"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+    def _on_error(self, error: BaseException, attempt: int) -> Optional[float]:
+        """记录失败；可重试时返回等待秒数，否则返回None"""
+        details = error_details(error)
+        status = details["status"]
+        overloaded = status == 429 or is_transient(error)
+        retryable = overloaded or status in RETRYABLE_STATUS
+        if overloaded:
+            self.limiter.on_overload()
+        if retryable or (status is not None and status >= 500):
+            self.breaker.record_failure()
+        else:
+            # 其余错误（如401、400）是请求本身的问题，不改变熔断状态
+            self.breaker.release_probe()
+        if not retryable or attempt + 1 >= self.max_attempts:
+            return None
+        return self.backoff(attempt, details["retry_after"])
+
+    def call(self, func: Callable[[], T]) -> T:
+        """同步执行一次请求，失败时按策略重试"""
+        for attempt in range(self.max_attempts):
+            self.breaker.allow()
+            self.limiter.acquire()
+            start = time.monotonic()
+            try:
+                result = func()
+            except Exception as e:
+                delay = self._on_error(e, attempt)
+                if delay is None:
+                    raise
+            else:
+                self.limiter.on_success(time.monotonic() - start)
+                self.breaker.record_success()
+                return result
+            finally:
+                self.limiter.release()
+            time.sleep(delay)
+        raise RuntimeError("unreachable")
+
+    async def acall(self, func: Callable[[], Awaitable[T]]) -> T:
+        """异步执行一次请求，失败时按策略重试"""
+        for attempt in range(self.max_attempts):
+            self.breaker.allow()
+            await self.limiter.acquire_async()
+            start = time.monotonic()
+            if attempt == 0:
+                request_started.set(start)
+            try:
+                result = await func()
+            except Exception as e:
+                delay = self._on_error(e, attempt)
+                if delay is None:
+                    raise
+            else:
+                self.limiter.on_success(time.monotonic() - start)
+                self.breaker.record_success()
+                return result
+            finally:
+                self.limiter.release()
+            await asyncio.sleep(delay)
+        raise RuntimeError("unreachable")
+
+    def stream(self, func: Callable[[], Iterator[T]]) -> Iterator[T]:
+        """流式请求：在收到第一段输出之前可以重试，之后的中断直接抛出"""
+        for attempt in range(self.max_attempts):
+            self.breaker.allow()
+            self.limiter.acquire()
+            start = time.monotonic()
+            started = False
+            try:
+                for item in func():
+                    if not started:
+                        started = True
+                        self.limiter.on_success(time.monotonic() - start)
+                        self.breaker.record_success()
+                    yield item
+                if not started:
+                    self.breaker.record_success()
+                return
+            except Exception as e:
+                delay = None if started else self._on_error(e, attempt)
+                if delay is None:
+                    raise
+            finally:
+                self.limiter.release()
+            time.sleep(delay)
+
+
+class SchedulerRegistry:
+    """进程级共享的厂商调度器"""
+
+    _schedulers: Dict[str, RequestScheduler] = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls, provider: str, settings: Dict) -> RequestScheduler:
+        with cls._lock:
+            if provider not in cls._schedulers:
+                cls._schedulers[provider] = RequestScheduler(provider, settings)
+            return cls._schedulers[provider]
@@ -0,0 +1,126 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+from services.cache_service import CACHE_ROOT, LRUCache
+
+
+def normalize_prompt(prompt: str) -> str:
+    """规范化提示词：去掉首尾空白并合并连续空白"""
+    return re.sub(r"\s+", " ", prompt).strip()
+
+
+def response_cache_key(provider: str, model_name: str, system_prompt: str, prompt: str) -> str:
+    """由厂商、模型、系统提示和规范化后的提示词生成缓存键"""
+    prompt_hash = hashlib.sha256(normalize_prompt(prompt).encode("utf-8")).hexdigest()
+    raw = "\0".join([provider, model_name or "", system_prompt or "", prompt_hash])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """模型回复缓存：内存LRU + SQLite持久化
+
+    条目超过ttl_seconds即视为过期；持久层总大小超过max_bytes时
+    按最近访问时间淘汰；每个条目记录命中次数。
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl_seconds: float = 7 * 24 * 3600,
+                 max_bytes: int = 256 * 1024 * 1024, memory_bytes: int = 32 * 1024 * 1024):
+        self.path = path or os.path.join(CACHE_ROOT, "responses.sqlite3")
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.memory = LRUCache(memory_bytes, sizeof=lambda entry: len(entry[0]) * 2 + 64)
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        # WAL模式下每次命中计数的提交无需整库fsync
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, provider TEXT, model TEXT, response TEXT,"
+            " size INTEGER, created REAL, last_access REAL, hits INTEGER DEFAULT 0)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON responses(last_access)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        """读取未过期的回复并记录命中"""
+        now = time.time()
+        entry = self.memory.get(key)
+        with self._lock:
+            if entry is None:
+                row = self._conn.execute(
+                    "SELECT response, created FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                entry = (row[0], row[1])
+            if now - entry[1] > self.ttl_seconds:
+                self.memory.pop(key)
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute(
+                "UPDATE responses SET hits = hits + 1, last_access = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+        self.memory.put(key, entry)
+        return entry[0]
+
+    def put(self, key: str, provider: str, model_name: str, response: str) -> None:
+        """写入回复并按需淘汰"""
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, provider, model, response, size, created, last_access, hits)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, 0)",
+                (key, provider, model_name, response, size, now, now)
+            )
+            self._evict(now)
+            self._conn.commit()
+        self.memory.put(key, (response, now))
+
+    def _evict(self, now: float) -> None:
+        """删除过期条目，并在超出容量时淘汰最久未访问的条目"""
+        self._conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl_seconds,))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM responses ORDER BY last_access"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self.memory.pop(key)
+            total -= size
+
+    def stats(self) -> Dict[str, int]:
+        """返回缓存整体统计"""
+        with self._lock:
+            entries, total_bytes, hits = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(hits), 0) FROM responses"
+            ).fetchone()
+        return {"entries": entries, "bytes": total_bytes, "hits": hits}
+
+    def top_entries(self, limit: int = 10) -> List[Dict]:
+        """返回命中次数最多的条目"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT provider, model, hits, size, created, last_access FROM responses"
+                " ORDER BY hits DESC LIMIT ?", (limit,)
+            ).fetchall()
+        columns = ["provider", "model", "hits", "size", "created", "last_access"]
+        return [dict(zip(columns, row)) for row in rows]
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+        self.memory.clear()
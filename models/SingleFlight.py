@@ -0,0 +1,167 @@
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class _Call:
+    """一次进行中的完整调用"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class SharedStream:
+    """多个读者共享的一次流式调用
+
+    没有固定的“领头者”：读者读完缓冲区后，由恰好空闲的那个读者去上游取下一段，
+    其余读者等待；任何读者中途离开都不影响其他人。新读者从头回放已收到的内容，
+    因此每个用户看到的回复完全一致。
+    """
+
+    def __init__(self, upstream: Iterator[str],
+                 on_complete: Optional[Callable[[str, float, Optional[float]], None]] = None,
+                 on_finish: Optional[Callable[[], None]] = None):
+        self._upstream = upstream
+        self._on_complete = on_complete
+        self._on_finish = on_finish
+        self._condition = threading.Condition()
+        self._pumping = False
+        self._readers = 0
+        self.parts: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.start = time.perf_counter()
+        self.ttft: Optional[float] = None
+
+    def attach(self) -> bool:
+        """登记一个新读者；调用已结束时返回False"""
+        with self._condition:
+            if self.done:
+                return False
+            self._readers += 1
+            return True
+
+    def __iter__(self) -> Iterator[str]:
+        position = 0
+        try:
+            while True:
+                with self._condition:
+                    while position >= len(self.parts) and not self.done and self._pumping:
+                        self._condition.wait()
+                    if position < len(self.parts):
+                        token = self.parts[position]
+                        position += 1
+                    elif self.done:
+                        if self.error is not None:
+                            raise self.error
+                        return
+                    else:
+                        self._pumping = True
+                        token = None
+                if token is not None:
+                    yield token
+                    continue
+                self._pump()
+        finally:
+            self._detach()
+
+    def _pump(self) -> None:
+        """由当前读者从上游取下一段（同一时刻只有一个读者在取）"""
+        finished, error, token = False, None, None
+        try:
+            token = next(self._upstream)
+        except StopIteration:
+            finished = True
+        except Exception as e:
+            finished, error = True, e
+        with self._condition:
+            if token is not None:
+                if self.ttft is None:
+                    self.ttft = time.perf_counter() - self.start
+                self.parts.append(token)
+            if finished:
+                self.done = True
+                self.error = error
+            self._pumping = False
+            self._condition.notify_all()
+        if finished:
+            if self._on_finish is not None:
+                self._on_finish()
+            if error is None and self._on_complete is not None:
+                self._on_complete("".join(self.parts), time.perf_counter() - self.start, self.ttft)
+
+    def _detach(self) -> None:
+        """读者离开；最后一个读者离开且上游未结束时关闭上游"""
+        with self._condition:
+            self._readers -= 1
+            abandoned = self._readers == 0 and not self.done
+            if abandoned:
+                self.done = True
+                self.error = RuntimeError("stream abandoned")
+        if abandoned:
+            if self._on_finish is not None:
+                self._on_finish()
+            close = getattr(self._upstream, "close", None)
+            if close is not None:
+                close()
+
+
+class SingleFlight:
+    """进程级的请求合并
+
+    同一键（厂商、模型、系统提示、提示词）的并发请求只向上游发送一次，
+    结果分发给所有等待者；调用结束后立即移除，之后的请求重新发起（或命中回复缓存）。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self._streams: Dict[str, SharedStream] = {}
+
+    def do(self, key: str, func: Callable[[], T]) -> T:
+        """执行func，或等待进行中的相同调用并共享其结果"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = func()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.result
+
+    def stream(self, key: str, factory: Callable[[], Iterator[str]],
+               on_complete: Optional[Callable[[str, float, Optional[float]], None]] = None) -> Iterator[str]:
+        """加入进行中的相同流式调用，或用factory新建一个"""
+        with self._lock:
+            shared = self._streams.get(key)
+            if shared is None or not shared.attach():
+                shared = SharedStream(factory(), on_complete, lambda: self._forget(key, shared))
+                shared.attach()
+                self._streams[key] = shared
+        return iter(shared)
+
+    def _forget(self, key: str, shared: SharedStream) -> None:
+        with self._lock:
+            if self._streams.get(key) is shared:
+                del self._streams[key]
+
+    @property
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls) + len(self._streams)
@@ -0,0 +1,145 @@
+import math
+import re
+from typing import Dict, List, Optional
+from models.ModelFactory import ModelConfig
+
+_CJK_PATTERN = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uff00-\uffef]")
+
+
+class TokenCounter:
+    """Token计数器
+
+    OpenAI模型在安装了tiktoken时使用其精确编码；
+    其余情况按经验估算：中日韩字符每字约1个token，其他字符约4个字符1个token。
+    """
+
+    _encodings: Dict[str, object] = {}
+
+    def __init__(self, model_type: str = "", model_name: str = ""):
+        self.encoding = self._load_encoding(model_name) if model_type == "openai" else None
+
+    @classmethod
+    def _load_encoding(cls, model_name: str):
+        if model_name not in cls._encodings:
+            try:
+                import tiktoken
+                cls._encodings[model_name] = tiktoken.encoding_for_model(model_name)
+            except Exception:
+                cls._encodings[model_name] = None
+        return cls._encodings[model_name]
+
+    def count(self, text: str) -> int:
+        """计算文本的token数"""
+        if not text:
+            return 0
+        if self.encoding is not None:
+            return len(self.encoding.encode(text))
+        cjk = len(_CJK_PATTERN.findall(text))
+        return cjk + math.ceil((len(text) - cjk) / 4)
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """截断文本使其不超过max_tokens"""
+        if max_tokens <= 0:
+            return ""
+        if self.count(text) <= max_tokens:
+            return text
+        if self.encoding is not None:
+            return self.encoding.decode(self.encoding.encode(text)[:max_tokens])
+        low, high = 0, len(text)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.count(text[:middle]) <= max_tokens:
+                low = middle
+            else:
+                high = middle - 1
+        return text[:low]
+
+
+class TokenBudget:
+    """按模型上下文窗口为提示词分配token预算
+
+    各部分按传入顺序（即优先级从高到低）装入，放不下的低优先级内容被丢弃，
+    最后一段放不下时截断；每部分实际使用的token数记录在usage中。
+    """
+
+    DEFAULT_CONTEXT_WINDOW = 8192
+    DEFAULT_RESERVED_OUTPUT = 1024
+    # 剩余预算少于该值时不再截断装入，避免塞入无意义的残片
+    MIN_PARTIAL_TOKENS = 64
+
+    def __init__(self, context_window: int, reserved_output: int, counter: Optional[TokenCounter] = None):
+        self.context_window = context_window
+        self.reserved_output = reserved_output
+        self.limit = max(context_window - reserved_output, 0)
+        self.counter = counter or TokenCounter()
+        self.usage: Dict[str, int] = {}
+
+    @classmethod
+    def for_model(cls, model_choice: Dict[str, str]) -> "TokenBudget":
+        """根据config.yaml中的上下文窗口配置创建预算"""
+        model_type = (model_choice.get('model_frame') or "").lower()
+        model_name = model_choice.get('model_name') or ""
+        config = ModelConfig.get_model_config(model_type)
+        context_window = config.get('context_windows', {}).get(
+            model_name, config.get('default_context_window', cls.DEFAULT_CONTEXT_WINDOW)
+        )
+        reserved_output = config.get('reserved_output_tokens', cls.DEFAULT_RESERVED_OUTPUT)
+        budget = cls(context_window, reserved_output, TokenCounter(model_type, model_name))
+        # 厂商接口额外附带的系统提示同样占用上下文
+        budget.reserve("provider_system", config.get('system_prompt', ""))
+        return budget
+
+    @classmethod
+    def for_models(cls, model_choices: List[Dict[str, str]]) -> "TokenBudget":
+        """多个模型共用同一提示词时，取剩余预算最小（上下文窗口最小）的那个"""
+        return min((cls.for_model(model_choice) for model_choice in model_choices),
+                   key=lambda budget: budget.remaining)
+
+    @property
+    def used(self) -> int:
+        return sum(self.usage.values())
+
+    @property
+    def remaining(self) -> int:
+        return max(self.limit - self.used, 0)
+
+    def reserve(self, name: str, text: str) -> str:
+        """为必须完整保留的内容（系统提示、模板、问题）记账"""
+        self.usage[name] = self.usage.get(name, 0) + self.counter.count(text)
+        return text
+
+    def fit(self, name: str, items: List[str], newest_last: bool = False,
+            max_tokens: Optional[int] = None) -> List[str]:
+        """在剩余预算内尽量装入items
+
+        newest_last为True时（如对话历史）优先保留列表末尾的条目，
+        返回结果保持原有顺序；max_tokens可进一步限制该部分的用量。
+        """
+        ordered = list(reversed(items)) if newest_last else list(items)
+        allowance = self.remaining if max_tokens is None else min(self.remaining, max_tokens)
+        kept: List[str] = []
+        spent = 0
+        for item in ordered:
+            cost = self.counter.count(item)
+            available = allowance - spent
+            if cost <= available:
+                kept.append(item)
+                spent += cost
+                continue
+            if available >= self.MIN_PARTIAL_TOKENS:
+                partial = self.counter.truncate(item, available)
+                kept.append(partial)
+                spent += self.counter.count(partial)
+            break
+        self.usage[name] = self.usage.get(name, 0) + spent
+        return list(reversed(kept)) if newest_last else kept
+
+    def report(self) -> Dict[str, int]:
+        """返回各部分用量及总计"""
+        return {**self.usage, "total": self.used, "limit": self.limit}
+
+    @staticmethod
+    def template_overhead(template: str, *fields: str) -> str:
+        """模板去掉变量后的固定文本"""
+        return template.format(**{field: "" for field in fields})
+
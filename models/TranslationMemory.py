@@ -0,0 +1,218 @@
+import hashlib
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, FrozenSet, List, Optional, Sequence, Tuple
+from models.ModelFactory import ModelConfig
+from services.cache_service import CACHE_ROOT
+
+_NUMBER_PATTERN = re.compile(r"\d+(?:[.,]\d+)*")
+
+
+def normalize_segment(text: str) -> str:
+    """规范化片段：合并连续空白并去掉首尾空白"""
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def segment_key(source: str, target: str) -> str:
+    """由规范化后的原文和目标语言生成记忆键"""
+    raw = f"{target}\0{normalize_segment(source)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def char_ngrams(text: str, n: int) -> FrozenSet[str]:
+    """小写化后的字符n-gram集合（对中英文都适用）"""
+    text = normalize_segment(text).lower()
+    if len(text) <= n:
+        return frozenset([text]) if text else frozenset()
+    return frozenset(text[i:i + n] for i in range(len(text) - n + 1))
+
+
+class _FuzzyIndex:
+    """单个目标语言的n-gram倒排索引
+
+    以Dice系数衡量相似度。阈值为t时，候选片段至少要与查询共享
+    ceil(t * |A| / (2 - t)) 个n-gram，因此只需探查查询中最稀有的
+    |A| - 该下限 + 1 个n-gram就不会漏掉候选（前缀过滤），常见n-gram的长倒排表无需遍历。
+    """
+
+    def __init__(self, n: int):
+        self.n = n
+        self.entries: List[Tuple[FrozenSet[str], Tuple[str, ...], str, str]] = []
+        self.postings: Dict[str, List[int]] = defaultdict(list)
+        self.sources: Dict[str, int] = {}
+
+    def add(self, source: str, translation: str) -> None:
+        source = normalize_segment(source)
+        if source in self.sources:
+            position = self.sources[source]
+            grams, numbers, _, _ = self.entries[position]
+            self.entries[position] = (grams, numbers, source, translation)
+            return
+        grams = char_ngrams(source, self.n)
+        position = len(self.entries)
+        self.entries.append((grams, tuple(_NUMBER_PATTERN.findall(source)), source, translation))
+        self.sources[source] = position
+        for gram in grams:
+            self.postings[gram].append(position)
+
+    def search(self, source: str, threshold: float) -> Optional[Tuple[str, float, str]]:
+        """返回相似度不低于阈值的最佳(译文, 相似度, 记忆中的原文)"""
+        grams = char_ngrams(source, self.n)
+        if not grams:
+            return None
+        numbers = tuple(_NUMBER_PATTERN.findall(normalize_segment(source)))
+        min_overlap = math.ceil(threshold * len(grams) / (2 - threshold))
+        probes = sorted(grams, key=lambda gram: len(self.postings.get(gram, ())))
+        candidates = set()
+        for gram in probes[:max(len(grams) - min_overlap + 1, 1)]:
+            candidates.update(self.postings.get(gram, ()))
+
+        best: Optional[Tuple[str, float, str]] = None
+        for position in candidates:
+            other, other_numbers, other_source, translation = self.entries[position]
+            # 数字不同（如Figure 3与Figure 4、不同年份的引用）的译文不能直接复用
+            if other_numbers != numbers:
+                continue
+            score = 2 * len(grams & other) / (len(grams) + len(other))
+            if score >= threshold and (best is None or score > best[1]):
+                best = (translation, score, other_source)
+        return best
+
+
+class TranslationMemory:
+    """持久化翻译记忆：SQLite存储 + 内存n-gram模糊索引
+
+    先按规范化原文的哈希精确匹配；未命中且片段足够长时，
+    在同一目标语言的记忆中做n-gram模糊匹配，返回相似度达到阈值的相近译文。
+    字符相似度无法区分否定、对象替换等语义差异（“improves accuracy”与
+    “does not improve accuracy”相似度可达0.93），因此只有精确命中的译文可以直接复用，
+    模糊命中只作为翻译提示中的参考。
+    记忆与模型无关：任何模型产出的译文都可以被后续翻译复用。
+    """
+
+    DEFAULT_THRESHOLD = 0.95
+    DEFAULT_NGRAM = 3
+    # 短片段（编号、单词）只做精确匹配，模糊匹配容易张冠李戴
+    DEFAULT_MIN_FUZZY_CHARS = 24
+    # 每个目标语言加载进模糊索引的最近条目数
+    DEFAULT_MAX_FUZZY_ENTRIES = 200000
+    _QUERY_CHUNK = 500
+
+    def __init__(self, path: Optional[str] = None, threshold: float = DEFAULT_THRESHOLD,
+                 ngram: int = DEFAULT_NGRAM, min_fuzzy_chars: int = DEFAULT_MIN_FUZZY_CHARS,
+                 max_fuzzy_entries: int = DEFAULT_MAX_FUZZY_ENTRIES):
+        self.path = path or os.path.join(CACHE_ROOT, "translation_memory.sqlite3")
+        self.threshold = threshold
+        self.ngram = ngram
+        self.min_fuzzy_chars = min_fuzzy_chars
+        self.max_fuzzy_entries = max_fuzzy_entries
+        self._fuzzy: Dict[str, _FuzzyIndex] = {}
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS segments ("
+            " key TEXT PRIMARY KEY, target TEXT, source TEXT, translation TEXT,"
+            " provider TEXT, model TEXT, created REAL, hits INTEGER DEFAULT 0)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_segments_target ON segments(target, created)")
+        self._conn.commit()
+
+    @classmethod
+    def from_config(cls) -> "TranslationMemory":
+        """根据config.yaml中的translation_memory配置创建"""
+        settings = ModelConfig.get_config().get('translation_memory', {})
+        return cls(
+            threshold=settings.get('fuzzy_threshold', cls.DEFAULT_THRESHOLD),
+            ngram=settings.get('ngram', cls.DEFAULT_NGRAM),
+            min_fuzzy_chars=settings.get('min_fuzzy_chars', cls.DEFAULT_MIN_FUZZY_CHARS),
+            max_fuzzy_entries=settings.get('max_fuzzy_entries', cls.DEFAULT_MAX_FUZZY_ENTRIES)
+        )
+
+    def _fuzzy_index(self, target: str) -> _FuzzyIndex:
+        """按需从数据库加载目标语言的模糊索引（调用方持有锁）"""
+        index = self._fuzzy.get(target)
+        if index is None:
+            index = self._fuzzy[target] = _FuzzyIndex(self.ngram)
+            rows = self._conn.execute(
+                "SELECT source, translation FROM segments WHERE target = ? ORDER BY created DESC LIMIT ?",
+                (target, self.max_fuzzy_entries)
+            ).fetchall()
+            for source, translation in reversed(rows):
+                if len(source) >= self.min_fuzzy_chars:
+                    index.add(source, translation)
+        return index
+
+    def lookup(self, sources: Sequence[str], target: str,
+               fuzzy: bool = True) -> List[Optional[Tuple[str, float, str]]]:
+        """批量查询，返回与输入顺序一致的(译文, 相似度, 记忆中的原文)；精确命中的相似度为1.0"""
+        keys = [segment_key(source, target) for source in sources]
+        found: Dict[str, str] = {}
+        with self._lock:
+            unique = list(dict.fromkeys(keys))
+            for start in range(0, len(unique), self._QUERY_CHUNK):
+                chunk = unique[start:start + self._QUERY_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                found.update(self._conn.execute(
+                    f"SELECT key, translation FROM segments WHERE key IN ({placeholders})", chunk
+                ).fetchall())
+            if found:
+                self._conn.executemany(
+                    "UPDATE segments SET hits = hits + 1 WHERE key = ?", [(key,) for key in found]
+                )
+                self._conn.commit()
+
+            results: List[Optional[Tuple[str, float, str]]] = []
+            index = None
+            for source, key in zip(sources, keys):
+                if key in found:
+                    results.append((found[key], 1.0, normalize_segment(source)))
+                elif fuzzy and len(normalize_segment(source)) >= self.min_fuzzy_chars:
+                    index = index or self._fuzzy_index(target)
+                    results.append(index.search(source, self.threshold))
+                else:
+                    results.append(None)
+        return results
+
+    def put(self, pairs: Sequence[Tuple[str, str]], target: str,
+            provider: str = "", model_name: str = "") -> None:
+        """写入(原文, 译文)对"""
+        now = time.time()
+        rows = [
+            (segment_key(source, target), target, normalize_segment(source), translation,
+             provider, model_name, now)
+            for source, translation in pairs
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO segments (key, target, source, translation, provider, model, created, hits)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, 0)", rows
+            )
+            self._conn.commit()
+            index = self._fuzzy.get(target)
+            if index is not None:
+                for _, _, source, translation, _, _, _ in rows:
+                    if len(source) >= self.min_fuzzy_chars:
+                        index.add(source, translation)
+
+    def stats(self) -> Dict[str, int]:
+        """返回记忆整体统计"""
+        with self._lock:
+            entries, hits = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(hits), 0) FROM segments"
+            ).fetchone()
+        return {"entries": entries, "hits": hits}
+
+    def clear(self) -> None:
+        """清空翻译记忆"""
+        with self._lock:
+            self._conn.execute("DELETE FROM segments")
+            self._conn.commit()
+            self._fuzzy.clear()
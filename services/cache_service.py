@@ -0,0 +1,203 @@
+"""缓存服务模块"""
+import hashlib
+import os
+import pickle
+import sys
+import threading
+from collections import OrderedDict
+from tempfile import NamedTemporaryFile
+from typing import Any, Callable, Optional
+
+CACHE_ROOT = os.getenv(
+    "TRANS_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "trans")
+)
+
+
+def content_hash(data: bytes, *salt: str) -> str:
+    """计算内容哈希，salt用于区分提取器版本等"""
+    digest = hashlib.sha256()
+    for item in salt:
+        digest.update(item.encode("utf-8"))
+        digest.update(b"\0")
+    digest.update(data)
+    return digest.hexdigest()
+
+
+class LRUCache:
+    """带内存上限的线程安全LRU缓存"""
+
+    def __init__(self, max_bytes: int, sizeof: Callable[[Any], int] = sys.getsizeof):
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof
+        self._items: "OrderedDict[str, Any]" = OrderedDict()
+        self._sizes = {}
+        self._current_bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """读取缓存并标记为最近使用"""
+        with self._lock:
+            if key not in self._items:
+                return default
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def put(self, key: str, value: Any) -> None:
+        """写入缓存，超出上限时淘汰最久未使用的条目"""
+        size = self._sizeof(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._items:
+                self._current_bytes -= self._sizes.pop(key)
+                del self._items[key]
+            self._items[key] = value
+            self._sizes[key] = size
+            self._current_bytes += size
+            while self._current_bytes > self.max_bytes:
+                old_key, _ = self._items.popitem(last=False)
+                self._current_bytes -= self._sizes.pop(old_key)
+
+    def pop(self, key: str, default: Any = None) -> Any:
+        """移除条目"""
+        with self._lock:
+            if key not in self._items:
+                return default
+            self._current_bytes -= self._sizes.pop(key)
+            return self._items.pop(key)
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._items.clear()
+            self._sizes.clear()
+            self._current_bytes = 0
+
+    @property
+    def current_bytes(self) -> int:
+        return self._current_bytes
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._items
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class DiskCache:
+    """基于文件的持久化缓存，每个键对应一个文件"""
+
+    def __init__(self, directory: str, max_bytes: Optional[int] = None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pkl")
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """读取缓存，文件损坏时视为未命中"""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+            os.utime(path)
+            return value
+        except FileNotFoundError:
+            return default
+        except Exception:
+            self.pop(key)
+            return default
+
+    def put(self, key: str, value: Any) -> None:
+        """原子写入缓存文件"""
+        with NamedTemporaryFile(dir=self.directory, delete=False, suffix=".tmp") as temp_file:
+            pickle.dump(value, temp_file, protocol=pickle.HIGHEST_PROTOCOL)
+            temp_path = temp_file.name
+        os.replace(temp_path, self._path(key))
+        if self.max_bytes is not None:
+            self._prune()
+
+    def pop(self, key: str) -> None:
+        """删除缓存文件"""
+        try:
+            os.unlink(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def __contains__(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def _prune(self) -> None:
+        """按最近访问时间淘汰，直到总大小不超过上限"""
+        with self._lock:
+            entries = []
+            total = 0
+            for entry in os.scandir(self.directory):
+                if entry.is_file() and entry.name.endswith(".pkl"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.unlink(path)
+                    total -= size
+                except FileNotFoundError:
+                    pass
+
+
+class TieredCache:
+    """内存LRU + 磁盘两级缓存"""
+
+    def __init__(self, namespace: str, max_memory_bytes: int,
+                 max_disk_bytes: Optional[int] = None, directory: Optional[str] = None,
+                 sizeof: Callable[[Any], int] = sys.getsizeof):
+        self.memory = LRUCache(max_memory_bytes, sizeof=sizeof)
+        self.disk: Optional[DiskCache] = None
+        try:
+            self.disk = DiskCache(directory or os.path.join(CACHE_ROOT, namespace), max_disk_bytes)
+        except OSError:
+            # 磁盘不可写时退化为纯内存缓存
+            self.disk = None
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """先查内存，再查磁盘并回填内存"""
+        value = self.memory.get(key)
+        if value is not None:
+            return value
+        if self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.memory.put(key, value)
+                return value
+        return default
+
+    def put(self, key: str, value: Any) -> None:
+        """同时写入两级缓存"""
+        self.memory.put(key, value)
+        if self.disk is not None:
+            try:
+                self.disk.put(key, value)
+            except OSError:
+                pass
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any]) -> Any:
+        """命中则返回缓存，否则计算并写入"""
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            if value is not None:
+                self.put(key, value)
+        return value
+
+    def pop(self, key: str) -> None:
+        """从两级缓存中移除"""
+        self.memory.pop(key)
+        if self.disk is not None:
+            self.disk.pop(key)
@@ -0,0 +1,571 @@
+"""共享文档存储服务模块"""
+import bisect
+import os
+import re
+import sys
+import threading
+import weakref
+from collections import OrderedDict
+from io import BytesIO
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import streamlit as st
+from services.cache_service import CACHE_ROOT, DiskCache, LRUCache, content_hash
+from services.file_service import FileService, PdfPayload, ProgressCallback
+from services.metrics_service import Metrics
+
+
+# 问题中的页码范围与章节：pages 40-55 / p. 12 / first 10 pages / 第40-55页 / 前10页 / section 3 / 第3章
+# 中文页码必须带“第”：“共300页”“10页左右”是页数而不是页码
+_PAGE_RANGE = re.compile(r"\b(?:pages?|pp?\.)\s*(\d+)\s*(?:[-–—~]|to|through)\s*(\d+)", re.IGNORECASE)
+_PAGE_SINGLE = re.compile(r"\b(?:page|p\.)\s*(\d+)\b", re.IGNORECASE)
+_PAGE_FIRST = re.compile(r"\bfirst\s+(\d+)\s+pages\b", re.IGNORECASE)
+_PAGE_ZH = re.compile(r"第\s*(\d+)\s*(?:页\s*)?(?:[-–—~至到]\s*(?:第\s*)?(\d+)\s*)?页")
+_PAGE_FIRST_ZH = re.compile(r"前\s*(\d+)\s*页")
+_SECTION = re.compile(r"(?:\b(?:section|chapter|sec\.|ch\.)|§)\s*(\d+(?:\.\d+)*)", re.IGNORECASE)
+_SECTION_ZH = re.compile(r"第\s*(\d+(?:\.\d+)*)\s*[章节]")
+# 书签标题开头的章节编号：3 / 3.2 / Chapter 3 / Section 3 / 第3章
+_TITLE_NUMBER = re.compile(r"^\s*(?:chapter|section|第)?\s*(\d+(?:\.\d+)*)", re.IGNORECASE)
+
+
+def parse_scope(question: str) -> Optional[Tuple[str, Any]]:
+    """识别问题限定的范围：("pages", (起始页, 结束页)) 或 ("section", "3.2")"""
+    match = _PAGE_RANGE.search(question)
+    if match:
+        first, last = int(match.group(1)), int(match.group(2))
+        return "pages", (min(first, last), max(first, last))
+    match = _PAGE_ZH.search(question)
+    if match:
+        first = int(match.group(1))
+        last = int(match.group(2)) if match.group(2) else first
+        return "pages", (min(first, last), max(first, last))
+    match = _PAGE_FIRST.search(question) or _PAGE_FIRST_ZH.search(question)
+    if match:
+        return "pages", (1, int(match.group(1)))
+    match = _SECTION_ZH.search(question)
+    if match:
+        return "section", match.group(1)
+    match = _PAGE_SINGLE.search(question)
+    if match:
+        return "pages", (int(match.group(1)), int(match.group(1)))
+    match = _SECTION.search(question)
+    if match:
+        return "section", match.group(1)
+    return None
+
+
+class Document:
+    """一份已上传PDF的共享条目
+
+    同一内容的PDF在进程内只有一个Document：文本、页偏移和派生索引只解析/构建一次，
+    由所有会话共享。内存紧张时文本与索引会被换出，再次访问时从磁盘读回或重新构建。
+    全文尚未提取时也可以按页访问：只解析所需的页，每页结果单独缓存。
+    """
+
+    # 答案引用页码所依据的标记，放在每页（或每个检索片段）文本之前
+    PAGE_LABEL = "[p. {page}]"
+    # 单个问题限定范围时最多解析的页数（实际发送的页数还受模型上下文限制）
+    MAX_SCOPED_PAGES = 60
+    # 没有书签时，全文未提取的文档最多解析这么多页来寻找章节标题，超出则请用户改用页码范围
+    MAX_HEADING_SCAN_PAGES = 100
+
+    def __init__(self, key: str, name: str, path: str, size: int):
+        self.key = key
+        self.name = name
+        self.path = path
+        self.size = size
+        self.refcount = 0
+        self._page_count: Optional[int] = None
+        self._text: Optional[str] = None
+        # 每页在全文中的起始偏移：(页码, 偏移)，空白页不占位置
+        self._page_offsets: List[Tuple[int, int]] = []
+        self._derived: Dict[str, Any] = {}
+        # 全文未加载时按需提取的单页文本
+        self._pages: Dict[int, str] = {}
+        self._pages_bytes = 0
+        self._reader = None
+        # 上次计入存储内存总量的大小，由DocumentStore维护
+        self._accounted = 0
+        self._sections: Optional[List[Tuple[str, int, int]]] = None
+        # 章节编号 -> 页码范围（找不到时为None），页码不随换出变化，可一直保留
+        self._section_ranges: Dict[str, Optional[Tuple[int, int]]] = {}
+        self._lock = threading.Lock()
+        self._reader_lock = threading.Lock()
+
+    @property
+    def text(self) -> str:
+        """全文（按需提取或从磁盘读回）"""
+        text = self._text
+        if text is None:
+            text = self.load()
+        DocumentStore.touch(self)
+        return text
+
+    @property
+    def loaded(self) -> bool:
+        """全文是否已在内存中"""
+        return self._text is not None
+
+    @property
+    def page_offsets(self) -> List[Tuple[int, int]]:
+        if self._text is None:
+            self.load()
+        return self._page_offsets
+
+    @property
+    def pdf_bytes(self) -> bytes:
+        """PDF原始字节"""
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    @property
+    def page_count(self) -> int:
+        """总页数（只解析交叉引用表，不提取文本）"""
+        if self._page_count is None:
+            from PyPDF2 import PdfReader
+            self._page_count = len(PdfReader(self.path).pages)
+        return self._page_count
+
+    def page_of(self, offset: int) -> int:
+        """全文中某个字符偏移所在的页码"""
+        offsets = self.page_offsets
+        if not offsets:
+            return 0
+        position = bisect.bisect_right([start for _, start in offsets], offset) - 1
+        return offsets[max(position, 0)][0]
+
+    def _get_reader(self):
+        """按需打开的PdfReader（调用方持有_reader_lock）"""
+        if self._reader is None:
+            from PyPDF2 import PdfReader
+            self._reader = PdfReader(self.path)
+        return self._reader
+
+    def page_texts(self, first: int, last: int) -> List[Tuple[int, str]]:
+        """第first至last页（从1开始，含两端）的文本
+
+        全文已加载时按页偏移切片；否则只解析这些页，每页结果缓存在内存和磁盘中。
+        """
+        first, last = max(first, 1), min(last, self.page_count)
+        text = self._text
+        if text is not None:
+            spans = {}
+            offsets = self._page_offsets
+            for position, (page_no, start) in enumerate(offsets):
+                end = offsets[position + 1][1] - 1 if position + 1 < len(offsets) else len(text)
+                spans[page_no] = (start, end)
+            return [(page_no, text[slice(*spans[page_no])] if page_no in spans else "")
+                    for page_no in range(first, last + 1)]
+
+        missing, added = [], False
+        for page_no in range(first, last + 1):
+            if page_no not in self._pages:
+                cached = DocumentStore.load_page(self.key, page_no)
+                if cached is None:
+                    missing.append(page_no)
+                else:
+                    self._add_page(page_no, cached)
+                    added = True
+        if missing:
+            with Metrics.span("pdf_extract_pages"), self._reader_lock:
+                reader = self._get_reader()
+                for page_no in missing:
+                    page_text = reader.pages[page_no - 1].extract_text() or ""
+                    self._add_page(page_no, page_text)
+                    DocumentStore.save_page(self.key, page_no, page_text)
+        pages = [(page_no, self._pages.get(page_no, "")) for page_no in range(first, last + 1)]
+        if added or missing:
+            DocumentStore.resize(self)
+        else:
+            DocumentStore.touch(self)
+        return pages
+
+    def _add_page(self, page_no: int, page_text: str) -> None:
+        if page_no not in self._pages:
+            self._pages_bytes += sys.getsizeof(page_text)
+        self._pages[page_no] = page_text
+
+    def sections(self) -> List[Tuple[str, int, int]]:
+        """PDF书签中的章节：(标题, 起始页, 结束页)，只读书签，不提取文本"""
+        if self._sections is None:
+            entries: List[Tuple[int, str, int]] = []
+            with self._reader_lock:
+                reader = self._get_reader()
+
+                def walk(items: List, depth: int) -> None:
+                    for item in items:
+                        if isinstance(item, list):
+                            walk(item, depth + 1)
+                            continue
+                        try:
+                            entries.append((depth, str(item.title), reader.get_destination_page_number(item) + 1))
+                        except Exception:
+                            continue
+
+                try:
+                    walk(reader.outline, 0)
+                except Exception:
+                    entries = []
+            sections = []
+            for position, (depth, title, start) in enumerate(entries):
+                # 到下一个同级或更高级书签之前结束
+                following = [page for level, _, page in entries[position + 1:] if level <= depth]
+                end = following[0] - 1 if following else self.page_count
+                sections.append((title, start, max(end, start)))
+            self._sections = sections
+            DocumentStore.resize(self)
+        return self._sections
+
+    def iter_pages(self) -> Iterator[Tuple[int, str]]:
+        """逐页产出文本：全文已加载时切片，否则逐页按需提取，调用方找到所需内容后即可停止"""
+        if self._text is not None:
+            yield from self.page_texts(1, self.page_count)
+            return
+        for page_no in range(1, self.page_count + 1):
+            yield from self.page_texts(page_no, page_no)
+
+    def find_section(self, number: str) -> Optional[Tuple[int, int]]:
+        """按章节编号查找页码范围：优先使用书签，没有书签时逐页匹配标题行"""
+        if number not in self._section_ranges:
+            self._section_ranges[number] = self._find_section(number)
+        return self._section_ranges[number]
+
+    def _find_section(self, number: str) -> Optional[Tuple[int, int]]:
+        for title, start, end in self.sections():
+            match = _TITLE_NUMBER.match(title)
+            if match and match.group(1) == number:
+                return start, end
+        parts = number.split(".")
+        following = ".".join(parts[:-1] + [str(int(parts[-1]) + 1)])
+
+        def heading(value: str) -> re.Pattern:
+            return re.compile(
+                rf"^\s*(?:chapter\s+|section\s+|第)?{re.escape(value)}\.?\s*[章节]?\s+[A-Z\u4e00-\u9fff]",
+                re.IGNORECASE | re.MULTILINE
+            )
+
+        this_heading, next_heading = heading(number), heading(following)
+        # 全文未提取时标题只在前MAX_HEADING_SCAN_PAGES页中寻找；找到后最多再解析MAX_SCOPED_PAGES页
+        # 寻找下一节标题（更多的页也不会发送），已解析的页缓存供后续问题使用
+        scan_limit = self.page_count if self._text is not None else self.MAX_HEADING_SCAN_PAGES
+        start = end = None
+        for page_no, page_text in self.iter_pages():
+            if start is None:
+                if page_no > scan_limit:
+                    break
+                if this_heading.search(page_text):
+                    start = page_no
+            elif next_heading.search(page_text):
+                end = page_no
+                break
+            elif page_no >= start + self.MAX_SCOPED_PAGES - 1:
+                break
+        if start is None:
+            return None
+        return start, end or self.page_count
+
+    def resolve_scope(self, scope: Tuple[str, Any]) -> Optional[Tuple[int, int]]:
+        """parse_scope识别出的范围对应的页码（截到文档页数以内）；页码越界或找不到章节时返回None"""
+        kind, value = scope
+        pages = value if kind == "pages" else self.find_section(value)
+        if pages is None or pages[0] > self.page_count:
+            return None
+        return max(pages[0], 1), min(pages[1], self.page_count)
+
+    @classmethod
+    def label(cls, page_no: int, text: str, separator: str = "\n") -> str:
+        """在文本前加上页码标记"""
+        return f"{cls.PAGE_LABEL.format(page=page_no)}{separator}{text}"
+
+    def derived(self, name: str, build: Callable[[str], Any]) -> Any:
+        """获取（必要时构建）派生数据，如BM25索引；build接收全文"""
+        value = self._derived.get(name)
+        if value is None:
+            text = self.text
+            with self._lock:
+                value = self._derived.get(name)
+                if value is None:
+                    value = self._derived[name] = build(text)
+            DocumentStore.resize(self)
+        return value
+
+    @property
+    def nbytes(self) -> int:
+        """常驻内存部分的估计大小"""
+        size = sys.getsizeof(self._text) if self._text is not None else 0
+        size += 64 * len(self._page_offsets)
+        size += self._pages_bytes
+        if self._reader is not None:
+            # PdfReader在内存中持有整份PDF
+            size += self.size
+        for value in list(self._derived.values()):
+            size += getattr(value, "nbytes", None) or sys.getsizeof(value)
+        return size
+
+    def load_cached(self) -> bool:
+        """仅从磁盘读回已提取的文本，不解析PDF；成功时返回True"""
+        if self._text is None:
+            payload = FileService.load_pdf_payload(self.key)
+            if payload is None:
+                return False
+            with self._lock:
+                if self._text is None:
+                    self._text, self._page_offsets = payload
+            self._drop_pages()
+        DocumentStore.resize(self)
+        return True
+
+    def load(self, progress: Optional[ProgressCallback] = None) -> str:
+        """加载全文：先查磁盘，未命中时解析PDF；多个会话同时打开时只解析一次
+
+        progress按页汇报提取进度，可在后台任务中调用。
+        """
+        with self._lock:
+            if self._text is not None:
+                return self._text
+            payload = FileService.load_pdf_payload(self.key)
+            if payload is None:
+                payload = self._extract(progress)
+                if payload is None:
+                    return ""
+                FileService.save_pdf_payload(self.key, payload)
+            self._text, self._page_offsets = payload
+            text = self._text
+        self._drop_pages()
+        DocumentStore.resize(self)
+        return text
+
+    def _drop_pages(self) -> None:
+        """全文到位后单页缓存与阅读器不再需要"""
+        with self._reader_lock:
+            self._pages.clear()
+            self._pages_bytes = 0
+            self._reader = None
+
+    @Metrics.timed("pdf_extract")
+    def _extract(self, progress: Optional[ProgressCallback] = None) -> Optional[PdfPayload]:
+        """逐页提取文本并记录每页的起始偏移
+
+        带progress时（后台任务）异常直接抛出，由任务记录；否则在界面上提示。
+        """
+        try:
+            return FileService.extract_pdf_payload(self.pdf_bytes, progress, self.page_count if progress else 0)
+        except Exception as e:
+            if progress:
+                raise
+            st.error(f"Error extracting text from PDF: {str(e)}")
+            return None
+
+    def spill(self) -> None:
+        """释放常驻内存的文本和派生数据（文本已在磁盘上）"""
+        with self._lock:
+            self._text = None
+            self._page_offsets = []
+            self._derived.clear()
+        self._drop_pages()
+
+
+class DocumentHandle:
+    """会话持有的文档引用
+
+    存放在session_state中；会话结束、文件被移除时句柄被回收，引用计数随之减一。
+    name是该会话上传时的文件名：同一内容可能以不同文件名上传，共享条目的name只记录首次上传时的文件名。
+    """
+
+    def __init__(self, document: Document, name: str = ""):
+        self.document = document
+        self.name = name or document.name
+        DocumentStore.acquire(document.key)
+        weakref.finalize(self, DocumentStore.release, document.key)
+
+
+class DocumentStore:
+    """进程级共享的文档存储
+
+    以PDF内容哈希为键去重：40个会话打开同一篇论文时只保存一份PDF、解析一次文本、
+    建一次索引。所有常驻文本与索引共用一个内存上限，超出时按最近最少使用的顺序处理：
+    没有会话引用的文档整体移出存储，仍被引用的文档把文本和索引换出到磁盘，下次访问时再读回。
+    常驻总量随加载、换出增量维护，访问文本时不必遍历所有文档。
+    """
+
+    MEMORY_BYTES = 1024 * 1024 * 1024
+    # 页数不超过该值的文档打开后自动在后台提取全文，更长的文档按问题涉及的页按需提取
+    EAGER_EXTRACT_PAGES = 300
+    DISK_BYTES = 4 * 1024 * 1024 * 1024
+    DIRECTORY = os.path.join(CACHE_ROOT, "documents")
+
+    _documents: "OrderedDict[str, Document]" = OrderedDict()
+    _memory_total = 0
+    _lock = threading.RLock()
+    # 全文的磁盘缓存由FileService持有（与批处理共用），这里只缓存按需提取的单页
+    _page_cache: Optional[DiskCache] = None
+    # 预览用的PDF字节：(文档键, 起始页, 结束页) -> bytes，所有会话与重绘共用
+    VIEW_CACHE_BYTES = 256 * 1024 * 1024
+    _views = LRUCache(VIEW_CACHE_BYTES, sizeof=len)
+
+    @classmethod
+    def _pages(cls) -> Optional[DiskCache]:
+        if cls._page_cache is None:
+            try:
+                cls._page_cache = DiskCache(os.path.join(cls.DIRECTORY, "pages"), cls.DISK_BYTES)
+            except OSError:
+                return None
+        return cls._page_cache
+
+    @classmethod
+    def _page_key(cls, key: str, page_no: int) -> str:
+        return f"{key}-{FileService.PDF_EXTRACTOR_VERSION}-p{page_no}"
+
+    @classmethod
+    def load_page(cls, key: str, page_no: int) -> Optional[str]:
+        """从磁盘读取单独提取过的一页"""
+        cache = cls._pages()
+        return cache.get(cls._page_key(key, page_no)) if cache is not None else None
+
+    @classmethod
+    def save_page(cls, key: str, page_no: int, page_text: str) -> None:
+        cache = cls._pages()
+        if cache is not None:
+            try:
+                cache.put(cls._page_key(key, page_no), page_text)
+            except OSError:
+                pass
+
+    @classmethod
+    def open(cls, pdf_file, name: str = "") -> DocumentHandle:
+        """登记一份PDF并返回句柄；相同内容的PDF共享同一个条目"""
+        pdf_bytes = FileService.read_bytes(pdf_file)
+        key = content_hash(pdf_bytes)
+        with cls._lock:
+            document = cls._documents.get(key)
+            if document is None:
+                path = os.path.join(cls.DIRECTORY, "pdf", f"{key}.pdf")
+                if not os.path.exists(path):
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                    with open(temp_path, "wb") as f:
+                        f.write(pdf_bytes)
+                    os.replace(temp_path, path)
+                document = Document(key, name or getattr(pdf_file, "name", ""), path, len(pdf_bytes))
+                cls._documents[key] = document
+            return DocumentHandle(document, name or getattr(pdf_file, "name", ""))
+
+    @classmethod
+    def view_bytes(cls, document: Document, first: int, last: int) -> bytes:
+        """第first至last页（从1开始，含两端）组成的PDF字节，用于按需预览
+
+        整份文档直接读取存储中的文件；页段则切出只含这些页的小PDF，
+        浏览器只需接收和渲染当前可见的页面。结果按内容哈希缓存在内存中，
+        之后的重绘不再读盘或复制。
+        """
+        cache_key = f"{document.key}:{first}-{last}"
+        data = cls._views.get(cache_key)
+        if data is None:
+            if first <= 1 and last >= document.page_count:
+                data = document.pdf_bytes
+            else:
+                from PyPDF2 import PdfReader, PdfWriter
+                reader = PdfReader(document.path)
+                writer = PdfWriter()
+                for index in range(max(first, 1) - 1, min(last, len(reader.pages))):
+                    writer.add_page(reader.pages[index])
+                buffer = BytesIO()
+                writer.write(buffer)
+                data = buffer.getvalue()
+            cls._views.put(cache_key, data)
+        return data
+
+    @classmethod
+    def get(cls, key: str) -> Optional[Document]:
+        with cls._lock:
+            return cls._documents.get(key)
+
+    @classmethod
+    def acquire(cls, key: str) -> None:
+        with cls._lock:
+            cls._documents[key].refcount += 1
+
+    @classmethod
+    def release(cls, key: str) -> None:
+        """引用计数减一；没有会话引用且文本不在内存中的文档只占磁盘，直接移除"""
+        with cls._lock:
+            document = cls._documents.get(key)
+            if document is not None:
+                document.refcount -= 1
+                if document.refcount <= 0 and document._text is None:
+                    cls._remove(document)
+
+    @classmethod
+    def touch(cls, document: Document) -> None:
+        """标记为最近使用"""
+        with cls._lock:
+            if cls._documents.get(document.key) is document:
+                cls._documents.move_to_end(document.key)
+
+    @classmethod
+    def resize(cls, document: Document) -> None:
+        """常驻内容变化（加载、按页提取、构建索引）后调用：标记为最近使用并更新内存总量，超出上限时淘汰"""
+        with cls._lock:
+            if cls._documents.get(document.key) is not document:
+                return
+            cls._documents.move_to_end(document.key)
+            cls._account(document)
+        cls.enforce_limit()
+
+    @classmethod
+    def _account(cls, document: Document) -> None:
+        """按文档当前大小修正内存总量（调用方持有_lock）"""
+        size = document.nbytes
+        cls._memory_total += size - document._accounted
+        document._accounted = size
+
+    @classmethod
+    def memory_bytes(cls) -> int:
+        with cls._lock:
+            return cls._memory_total
+
+    @classmethod
+    def enforce_limit(cls) -> None:
+        """超出内存上限时，从最久未使用的文档开始移除或换出
+
+        最近使用的文档始终保留，避免正在阅读的文档刚加载就被换出。
+        """
+        with cls._lock:
+            if cls._memory_total <= cls.MEMORY_BYTES:
+                return
+            for key in list(cls._documents)[:-1]:
+                if cls._memory_total <= cls.MEMORY_BYTES:
+                    break
+                document = cls._documents[key]
+                if document.refcount <= 0:
+                    cls._remove(document)
+                else:
+                    document.spill()
+                    cls._account(document)
+
+    @classmethod
+    def _remove(cls, document: Document) -> None:
+        """移出存储（调用方持有_lock）"""
+        del cls._documents[document.key]
+        cls._memory_total -= document._accounted
+        document._accounted = 0
+        cls._remove_pdf(document)
+
+    @staticmethod
+    def _remove_pdf(document: Document) -> None:
+        # 文本仍保留在磁盘缓存中，再次上传时无需重新解析；预览缓存按LRU自然淘汰
+        try:
+            os.unlink(document.path)
+        except OSError:
+            pass
+
+    @classmethod
+    def stats(cls) -> Dict[str, int]:
+        """存储概况，供界面展示"""
+        with cls._lock:
+            documents = list(cls._documents.values())
+        return {
+            "documents": len(documents),
+            "referenced": sum(1 for document in documents if document.refcount > 0),
+            "resident": sum(1 for document in documents if document._text is not None),
+            "memory_bytes": cls.memory_bytes(),
+        }
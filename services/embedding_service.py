@@ -0,0 +1,203 @@
+"""向量嵌入服务模块"""
+import os
+import re
+import threading
+import zlib
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from models.ModelFactory import get_http_session, get_scheduler
+from services.cache_service import CACHE_ROOT
+from services.retrieval_service import tokenize
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    """按行L2归一化，使点积即余弦相似度"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class HashingEmbedder:
+    """基于特征哈希的CPU嵌入器，无需模型，可作为离线后备"""
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """将一批文本映射为定长向量"""
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            if tokens:
+                buckets = [zlib.crc32(token.encode("utf-8")) % self.dim for token in tokens]
+                np.add.at(matrix[row], buckets, 1.0)
+        return matrix
+
+
+class OllamaEmbedder:
+    """调用本地Ollama嵌入接口的嵌入器"""
+
+    def __init__(self, model: str, api_url: str, timeout: float = 120):
+        self.model = model
+        self.api_url = api_url
+        self.timeout = timeout
+        self.name = f"ollama-{model}"
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """批量请求嵌入向量：与对话共用Ollama的连接池和请求调度（并发上限、重试、熔断）"""
+        session = get_http_session("Ollama", self.model, None)
+
+        def request() -> List[List[float]]:
+            response = session.post(
+                self.api_url,
+                json={"model": self.model, "input": texts},
+                timeout=self.timeout
+            )
+            response.raise_for_status()
+            return response.json()["embeddings"]
+
+        return np.asarray(get_scheduler('ollama').call(request), dtype=np.float32)
+
+
+class EmbeddingStore:
+    """按文档哈希存储嵌入矩阵的内存映射文件库
+
+    每份文档对应一个 .npy 文件，读取时以 mmap 方式打开，不占用常驻内存。
+    构建过程按批写入 .partial.npy 并记录进度，中断后从断点继续。
+    """
+
+    def __init__(self, directory: Optional[str] = None, dtype: str = "float16"):
+        self.directory = directory or os.path.join(CACHE_ROOT, "embeddings")
+        self.dtype = np.dtype(dtype)
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key: str, suffix: str = ".npy") -> str:
+        return os.path.join(self.directory, re.sub(r"[^\w.-]", "_", key) + suffix)
+
+    def _lock(self, key: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def load(self, key: str) -> Optional[np.ndarray]:
+        """以只读内存映射方式打开已存在的矩阵"""
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        return np.load(path, mmap_mode="r")
+
+    def get_or_build(self, key: str, chunks: List[str], embedder, batch_size: int = 32) -> np.ndarray:
+        """返回文档的嵌入矩阵，缺失部分按批计算"""
+        matrix = self.load(key)
+        if matrix is not None and matrix.shape[0] == len(chunks):
+            return matrix
+        if not chunks:
+            return np.zeros((0, 0), dtype=self.dtype)
+
+        with self._lock(key):
+            matrix = self.load(key)
+            if matrix is not None and matrix.shape[0] == len(chunks):
+                return matrix
+            self._build(key, chunks, embedder, batch_size)
+        return self.load(key)
+
+    def _build(self, key: str, chunks: List[str], embedder, batch_size: int) -> None:
+        partial_path = self._path(key, ".partial.npy")
+        progress_path = self._path(key, ".progress")
+
+        done = 0
+        partial = None
+        if os.path.exists(partial_path) and os.path.exists(progress_path):
+            partial = np.load(partial_path, mmap_mode="r+")
+            with open(progress_path, "r", encoding="utf-8") as f:
+                done = int(f.read().strip() or 0)
+            if partial.shape[0] != len(chunks):
+                partial, done = None, 0
+
+        for start in range(done, len(chunks), batch_size):
+            vectors = _normalize(embedder.embed(chunks[start:start + batch_size]))
+            if partial is None:
+                partial = np.lib.format.open_memmap(
+                    partial_path, mode="w+", dtype=self.dtype,
+                    shape=(len(chunks), vectors.shape[1])
+                )
+            partial[start:start + len(vectors)] = vectors
+            partial.flush()
+            with open(progress_path, "w", encoding="utf-8") as f:
+                f.write(str(start + len(vectors)))
+
+        del partial
+        os.replace(partial_path, self._path(key))
+        os.unlink(progress_path)
+
+    @staticmethod
+    def top_k(matrix: np.ndarray, queries: np.ndarray, k: int,
+              block_rows: int = 65536) -> List[List[Tuple[int, float]]]:
+        """一次批量矩阵乘计算所有查询的相似度，返回每个查询的前k项
+
+        超大矩阵按行分块相乘，使类型提升产生的临时内存保持有界。
+        """
+        queries = _normalize(np.atleast_2d(queries))
+        if matrix.shape[0] == 0:
+            return [[] for _ in range(len(queries))]
+        scores = np.concatenate([
+            queries @ np.asarray(matrix[start:start + block_rows], dtype=np.float32).T
+            for start in range(0, matrix.shape[0], block_rows)
+        ], axis=1)
+
+        k = min(k, scores.shape[1])
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for row, row_candidates in enumerate(candidates):
+            ranked = row_candidates[np.argsort(-scores[row, row_candidates], kind="stable")]
+            results.append([(int(i), float(scores[row, i])) for i in ranked])
+        return results
+
+
+class EmbeddingService:
+    """语义检索服务类"""
+
+    DEFAULT_BATCH_SIZE = 32
+
+    _embedder = None
+    _store: Optional[EmbeddingStore] = None
+
+    @classmethod
+    def get_settings(cls) -> Dict:
+        """读取config.yaml中的嵌入配置"""
+        from models.ModelFactory import ModelConfig
+        return ModelConfig.get_config().get('embedding', {})
+
+    @classmethod
+    def get_embedder(cls):
+        """按配置创建嵌入器（进程内复用）"""
+        if cls._embedder is None:
+            settings = cls.get_settings()
+            if settings.get('provider') == 'ollama':
+                cls._embedder = OllamaEmbedder(settings['model'], settings['api_url'])
+            else:
+                cls._embedder = HashingEmbedder(settings.get('dim', 512))
+        return cls._embedder
+
+    @classmethod
+    def set_embedder(cls, embedder) -> None:
+        """替换嵌入器，embedder需提供name属性和embed(texts)方法"""
+        cls._embedder = embedder
+
+    @classmethod
+    def get_store(cls) -> EmbeddingStore:
+        """获取进程级共享的向量库"""
+        if cls._store is None:
+            cls._store = EmbeddingStore(dtype=cls.get_settings().get('dtype', 'float16'))
+        return cls._store
+
+    @classmethod
+    def search(cls, doc_hash: str, chunks: List[str], query: str, top_k: int) -> List[Tuple[int, float]]:
+        """返回与问题语义最相近的(块序号, 相似度)"""
+        embedder = cls.get_embedder()
+        batch_size = cls.get_settings().get('batch_size', cls.DEFAULT_BATCH_SIZE)
+        matrix = cls.get_store().get_or_build(f"{doc_hash}-{embedder.name}", chunks, embedder, batch_size)
+        return EmbeddingStore.top_k(matrix, embedder.embed([query]), top_k)[0]
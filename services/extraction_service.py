@@ -0,0 +1,97 @@
+"""PDF并行提取引擎模块"""
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from tempfile import NamedTemporaryFile
+from threading import Lock
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from PyPDF2 import PdfReader
+
+# 子进程内缓存已打开的PDF，同一文件的后续页段无需重新解析交叉引用表
+_worker_reader: Tuple[Optional[str], Any] = (None, None)
+
+
+def _extract_page_range(pdf_path: str, start: int, stop: int) -> List[Tuple[int, str]]:
+    """在子进程中提取[start, stop)范围的页面文本，页码从1开始"""
+    global _worker_reader
+    path, reader = _worker_reader
+    if path != pdf_path or reader is None:
+        from PyPDF2 import PdfReader
+        reader = PdfReader(pdf_path)
+        _worker_reader = (pdf_path, reader)
+    return [(index + 1, reader.pages[index].extract_text() or "") for index in range(start, stop)]
+
+
+class PDFExtractionEngine:
+    """多进程分页提取引擎，按页序流式返回结果"""
+
+    # 页数低于该值时进程调度开销大于收益，直接串行提取
+    PARALLEL_MIN_PAGES = 64
+    PAGES_PER_TASK = 16
+    MAX_WORKERS = os.cpu_count() or 1
+
+    # 按进程数共享的进程池；通常只有默认大小的一个
+    _executors: Dict[int, ProcessPoolExecutor] = {}
+    _executor_lock = Lock()
+
+    @classmethod
+    def get_executor(cls, workers: Optional[int] = None) -> ProcessPoolExecutor:
+        """获取进程级共享的、含workers个进程的进程池"""
+        workers = workers or cls.MAX_WORKERS
+        with cls._executor_lock:
+            if workers not in cls._executors:
+                cls._executors[workers] = ProcessPoolExecutor(max_workers=workers)
+            return cls._executors[workers]
+
+    @classmethod
+    def shutdown(cls) -> None:
+        """关闭所有进程池"""
+        with cls._executor_lock:
+            for executor in cls._executors.values():
+                executor.shutdown(cancel_futures=True)
+            cls._executors.clear()
+
+    @staticmethod
+    def iter_pages_serial(reader: "PdfReader") -> Iterator[Tuple[int, str]]:
+        """单核逐页提取"""
+        for index, page in enumerate(reader.pages):
+            yield index + 1, page.extract_text() or ""
+
+    @classmethod
+    def page_ranges(cls, page_count: int, workers: int) -> List[Tuple[int, int]]:
+        """将页面划分为若干连续区间"""
+        size = max(1, min(cls.PAGES_PER_TASK, math.ceil(page_count / workers)))
+        return [(start, min(start + size, page_count)) for start in range(0, page_count, size)]
+
+    @classmethod
+    def iter_pages(cls, pdf_bytes: bytes, workers: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+        """并行提取页面，按页序逐页产出(page_no, text)"""
+        from PyPDF2 import PdfReader
+        workers = workers or cls.MAX_WORKERS
+        reader = PdfReader(BytesIO(pdf_bytes))
+        page_count = len(reader.pages)
+        if workers <= 1 or page_count < cls.PARALLEL_MIN_PAGES:
+            yield from cls.iter_pages_serial(reader)
+            return
+        del reader
+
+        # 子进程通过临时文件读取PDF，避免每个任务都序列化整份字节
+        with NamedTemporaryFile(delete=False, suffix=".pdf") as temp_file:
+            temp_file.write(pdf_bytes)
+            temp_path = temp_file.name
+
+        executor = cls.get_executor(workers)
+        futures = [
+            executor.submit(_extract_page_range, temp_path, start, stop)
+            for start, stop in cls.page_ranges(page_count, workers)
+        ]
+        try:
+            for future in futures:
+                yield from future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+            os.unlink(temp_path)
@@ -1,65 +1,136 @@
 """文件处理服务模块"""
-import os
-from tempfile import NamedTemporaryFile
-from typing import List, Optional, Tuple
-import easyocr
-from PyPDF2 import PdfReader
-import pdfkit
+import sys
+from typing import Callable, Iterator, List, Optional, Tuple
 import streamlit as st
+from services.cache_service import TieredCache, content_hash
+from services.extraction_service import PDFExtractionEngine
+from services.metrics_service import Metrics
+from services.ocr_service import OCREngine
+
+# 进度回调：(阶段, 已完成数, 总数)
+ProgressCallback = Callable[[str, int, int], None]
+# 提取结果：(全文, [(页码, 该页在全文中的起始偏移)])
+PdfPayload = Tuple[str, List[Tuple[int, int]]]
 
 class FileService:
     """文件处理服务类"""
     
-    SUPPORTED_LANGUAGES = ['en', 'ch_sim']
+    SUPPORTED_LANGUAGES = OCREngine.LANGUAGES
+    # 提取逻辑变化时需更新版本号，使旧缓存失效
+    PDF_EXTRACTOR_VERSION = "pypdf2-1"
+    PDF_CACHE_MEMORY_BYTES = 256 * 1024 * 1024
+    PDF_CACHE_DISK_BYTES = 2 * 1024 * 1024 * 1024
+
+    # 批处理与共享文档存储共用同一份磁盘缓存，键为 PDF内容哈希-提取器版本
+    _pdf_text_cache = TieredCache(
+        "pdf_text",
+        max_memory_bytes=PDF_CACHE_MEMORY_BYTES,
+        max_disk_bytes=PDF_CACHE_DISK_BYTES,
+        sizeof=lambda payload: sys.getsizeof(payload[0]) + 64 * len(payload[1])
+    )
+
+    @staticmethod
+    def read_bytes(file) -> bytes:
+        """读取上传文件的全部字节，不改变其读取位置"""
+        if isinstance(file, (bytes, bytearray, memoryview)):
+            return bytes(file)
+        if hasattr(file, "getvalue"):
+            return file.getvalue()
+        position = file.tell()
+        file.seek(0)
+        data = file.read()
+        file.seek(position)
+        return data
     
     @classmethod
     def extract_text_from_image(cls, image_file) -> str:
         """从图片中提取文本"""
+        results = cls.extract_text_from_images([image_file])
+        return results[0] if results else ""
+
+    @classmethod
+    @Metrics.timed("ocr")
+    def recognize_images(cls, image_files: List, progress: Optional[ProgressCallback] = None) -> List[str]:
+        """批量识别图片文本，异常直接抛出（供后台任务使用）"""
+        return OCREngine.recognize([cls.read_bytes(image_file) for image_file in image_files], progress)
+
+    @classmethod
+    def extract_text_from_images(cls, image_files: List) -> List[str]:
+        """批量从多张图片中提取文本，结果与输入顺序一致"""
         try:
-            reader = easyocr.Reader(cls.SUPPORTED_LANGUAGES)
-            image_bytes = image_file.read()
-            with NamedTemporaryFile(delete=False, suffix=".png") as temp_file:
-                temp_file.write(image_bytes)
-                temp_file_path = temp_file.name
-            results = reader.readtext(temp_file_path, detail=0)
-            os.unlink(temp_file_path)  # 清理临时文件
-            return "\n".join(results)
+            return cls.recognize_images(image_files)
         except Exception as e:
             st.error(f"Error extracting text from image: {str(e)}")
-            return ""
+            return [""] * len(image_files)
+
+    @classmethod
+    def _payload_key(cls, pdf_key: str) -> str:
+        return f"{pdf_key}-{cls.PDF_EXTRACTOR_VERSION}"
+
+    @classmethod
+    def load_pdf_payload(cls, pdf_key: str) -> Optional[PdfPayload]:
+        """只从磁盘读取已提取的结果，pdf_key为content_hash(PDF字节)；内存中的副本由调用方持有"""
+        disk = cls._pdf_text_cache.disk
+        return disk.get(cls._payload_key(pdf_key)) if disk is not None else None
+
+    @classmethod
+    def save_pdf_payload(cls, pdf_key: str, payload: PdfPayload) -> None:
+        """只写入磁盘缓存"""
+        disk = cls._pdf_text_cache.disk
+        if disk is not None:
+            try:
+                disk.put(cls._payload_key(pdf_key), payload)
+            except OSError:
+                pass
 
     @staticmethod
-    def extract_pdf_text(pdf_file) -> str:
-        """从PDF文件中提取文本"""
+    def extract_pdf_payload(pdf_bytes: bytes, progress: Optional[ProgressCallback] = None,
+                            page_count: int = 0) -> PdfPayload:
+        """逐页提取文本并记录每页的起始偏移，空白页不占位置；异常直接抛出"""
+        parts, offsets, position = [], [], 0
+        for page_no, page_text in PDFExtractionEngine.iter_pages(pdf_bytes):
+            if progress:
+                progress("extract", page_no, page_count)
+            if not page_text:
+                continue
+            if parts:
+                position += 1
+            offsets.append((page_no, position))
+            parts.append(page_text)
+            position += len(page_text)
+        return "\n".join(parts), offsets
+
+    @classmethod
+    @Metrics.timed("pdf_extract")
+    def extract_pdf_text(cls, pdf_file) -> str:
+        """从PDF文件中提取文本（按内容哈希缓存）"""
         try:
-            reader = PdfReader(pdf_file)
-            pdf_text = "\n".join(
-                page.extract_text()
-                for page in reader.pages
-                if page.extract_text()
+            pdf_bytes = cls.read_bytes(pdf_file)
+            payload = cls._pdf_text_cache.get_or_compute(
+                cls._payload_key(content_hash(pdf_bytes)), lambda: cls.extract_pdf_payload(pdf_bytes)
             )
-            return pdf_text
+            return payload[0]
         except Exception as e:
             st.error(f"Error extracting text from PDF: {str(e)}")
             return ""
 
+    @classmethod
+    def iter_pdf_pages(cls, pdf_file) -> Iterator[Tuple[int, str]]:
+        """按页序流式提取PDF文本，产出(page_no, text)"""
+        return PDFExtractionEngine.iter_pages(cls.read_bytes(pdf_file))
+
+    @staticmethod
+    def render_pdf(html_content: str) -> bytes:
+        """调用wkhtmltopdf生成PDF，异常直接抛出（供后台任务使用）"""
+        import pdfkit
+        config = pdfkit.configuration()
+        return pdfkit.from_string(html_content, False, configuration=config)
+
     @staticmethod
     def export_to_pdf(html_content: str) -> bytes:
         """将HTML内容转换为PDF"""
         try:
-            config = pdfkit.configuration()
-            return pdfkit.from_string(html_content, False, configuration=config)
+            return FileService.render_pdf(html_content)
         except Exception as e:
             st.error(f"Error converting to PDF: {str(e)}")
             return b""
-
-    @staticmethod
-    def save_temp_pdf(pdf_file) -> str:
-        """保存临时PDF文件，返回临时文件路径"""
-        try:
-            with NamedTemporaryFile(delete=False, suffix=".pdf") as temp_file:
-                temp_file.write(pdf_file.read())
-                return temp_file.name
-        except Exception as e:
-            st.error(f"Error saving temporary PDF: {str(e)}")
-            return ""
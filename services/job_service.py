@@ -0,0 +1,193 @@
+"""后台任务服务模块"""
+import itertools
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Set
+
+
+class JobCancelled(Exception):
+    """任务在运行中被取消"""
+
+
+class Job:
+    """一个后台任务及其进度
+
+    任务函数接收Job本身，通过 job.report(stage, done, total) 汇报进度
+    （与摘要服务的ProgressCallback签名一致）；任务被取消后report会抛出JobCancelled。
+    """
+
+    def __init__(self, job_id: str, kind: str, label: str = ""):
+        self.id = job_id
+        self.kind = kind
+        self.label = label or kind
+        self.status = "queued"
+        self.stage = ""
+        self.done = 0
+        self.total = 0
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created = time.time()
+        self.finished_at: Optional[float] = None
+        # 提交了同一任务、尚未取消的订阅
+        self.subscribers: Set[int] = set()
+        self.future: Optional[Future] = None
+        self._cancel = threading.Event()
+
+    @property
+    def progress(self) -> float:
+        if self.status == "done":
+            return 1.0
+        return min(self.done / self.total, 1.0) if self.total else 0.0
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed", "cancelled")
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def report(self, stage: str, done: int, total: int) -> None:
+        """汇报进度，同时是取消检查点"""
+        if self._cancel.is_set():
+            raise JobCancelled(self.id)
+        self.stage, self.done, self.total = stage, done, total
+
+    def snapshot(self) -> Dict[str, Any]:
+        """任务状态，供界面轮询"""
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "label": self.label,
+            "status": self.status,
+            "stage": self.stage,
+            "done": self.done,
+            "total": self.total,
+            "progress": self.progress,
+            "error": self.error,
+        }
+
+
+class JobSubscription:
+    """会话对一个任务的订阅
+
+    存放在session_state中。每个订阅只能取消一次，重复点击不会替其他会话取消任务；
+    会话结束、订阅被回收时自动退订。所有订阅都退订后任务才真正停止。
+    """
+
+    _tokens = itertools.count(1)
+
+    def __init__(self, job: Job):
+        self.job = job
+        token = next(self._tokens)
+        job.subscribers.add(token)
+        self._finalizer = weakref.finalize(self, JobQueue.unsubscribe, job, token)
+
+    @property
+    def cancelled(self) -> bool:
+        return not self._finalizer.alive
+
+    def cancel(self) -> bool:
+        """退订；任务因此停止时返回True"""
+        return bool(self._finalizer())
+
+
+class JobQueue:
+    """进程级共享的后台任务队列
+
+    PDF提取、OCR和导出等耗时操作提交到线程池执行，Streamlit脚本线程只负责轮询进度。
+    任务ID由任务类型和输入内容哈希组成：相同输入的重复提交直接复用进行中（或已完成）的任务。
+    """
+
+    MAX_WORKERS = 4
+    # 已结束任务的保留数量，超出后淘汰最早提交的
+    MAX_FINISHED = 64
+
+    _executor: Optional[ThreadPoolExecutor] = None
+    # 订阅被回收时的退订可能在持有锁的线程中触发，需可重入
+    _lock = threading.RLock()
+    _jobs: "OrderedDict[str, Job]" = OrderedDict()
+
+    @classmethod
+    def get_executor(cls) -> ThreadPoolExecutor:
+        if cls._executor is None:
+            cls._executor = ThreadPoolExecutor(max_workers=cls.MAX_WORKERS, thread_name_prefix="trans-job")
+        return cls._executor
+
+    @classmethod
+    def submit(cls, kind: str, key: str, func: Callable[[Job], Any], label: str = "") -> JobSubscription:
+        """提交任务并返回一个订阅；相同类型与输入哈希的任务未失败时订阅已有任务"""
+        job_id = f"{kind}:{key}"
+        with cls._lock:
+            job = cls._jobs.get(job_id)
+            if job is None or job.status in ("failed", "cancelled") or job.cancelled:
+                job = Job(job_id, kind, label)
+                cls._jobs[job_id] = job
+                job.future = cls.get_executor().submit(cls._run, job, func)
+            subscription = JobSubscription(job)
+            cls._jobs.move_to_end(job_id)
+            cls._prune()
+            return subscription
+
+    @classmethod
+    def _run(cls, job: Job, func: Callable[[Job], Any]) -> None:
+        if job.cancelled:
+            job.status = "cancelled"
+            return
+        job.status = "running"
+        try:
+            job.result = func(job)
+            job.status = "done"
+        except JobCancelled:
+            job.status = "cancelled"
+        except Exception as e:
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
+
+    @classmethod
+    def get(cls, job_id: str) -> Optional[Job]:
+        with cls._lock:
+            return cls._jobs.get(job_id)
+
+    @classmethod
+    def status(cls, job_id: str) -> Optional[Dict[str, Any]]:
+        job = cls.get(job_id)
+        return job.snapshot() if job is not None else None
+
+    @classmethod
+    def result(cls, job_id: str, timeout: Optional[float] = None) -> Any:
+        """等待任务结束并返回结果；失败或取消时抛出异常"""
+        job = cls.get(job_id)
+        if job is None:
+            raise KeyError(job_id)
+        if not job.future.cancelled():
+            job.future.result(timeout)
+        if job.status == "cancelled":
+            raise JobCancelled(job_id)
+        if job.status == "failed":
+            raise RuntimeError(job.error)
+        return job.result
+
+    @classmethod
+    def unsubscribe(cls, job: Job, token: int) -> bool:
+        """移除一个订阅（由JobSubscription调用）；最后一个订阅移除时停止未结束的任务"""
+        with cls._lock:
+            job.subscribers.discard(token)
+            if job.subscribers or job.finished:
+                return False
+            job._cancel.set()
+            if job.future.cancel():
+                job.status = "cancelled"
+                job.finished_at = time.time()
+            return True
+
+    @classmethod
+    def _prune(cls) -> None:
+        finished = [job_id for job_id, job in cls._jobs.items() if job.finished]
+        for job_id in finished[:max(len(finished) - cls.MAX_FINISHED, 0)]:
+            del cls._jobs[job_id]
@@ -0,0 +1,215 @@
+"""性能指标服务模块"""
+import atexit
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from typing import Callable, Deque, Dict, Iterator, List, Optional, Tuple
+from services.cache_service import CACHE_ROOT
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """最近邻法计算分位数"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+class Metrics:
+    """分阶段耗时与吞吐指标
+
+    通过环境变量 TRANS_METRICS=on 开启。关闭时 span / timed 直接返回，
+    不计时、不加锁也不写文件。开启时每条记录追加到滚动JSONL日志，
+    聚合结果定期写成Prometheus文本格式文件（可由node_exporter的textfile collector采集）。
+    锁内只更新内存中的聚合，日志和Prometheus文件由后台线程批量写出，记录不等待磁盘IO。
+    """
+
+    enabled = os.getenv("TRANS_METRICS", "off").lower() in ("1", "on", "true")
+    DIRECTORY = os.getenv("TRANS_METRICS_DIR", os.path.join(CACHE_ROOT, "metrics"))
+    # 每个序列保留的最近样本数，用于计算分位数
+    WINDOW = 1024
+    LOG_MAX_BYTES = 16 * 1024 * 1024
+    # Prometheus文件的最短重写间隔（秒）
+    EXPORT_INTERVAL = 10.0
+    # 后台线程写出日志的间隔（秒）
+    FLUSH_INTERVAL = 1.0
+
+    _NOOP = nullcontext()
+    _lock = threading.Lock()
+    # (指标, 阶段, 厂商) -> 最近样本
+    _samples: Dict[Tuple[str, str, str], Deque[float]] = {}
+    # (阶段, 厂商) -> 累计值（次数、耗时、token数）
+    _totals: Dict[Tuple[str, str], Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+    _last_export = 0.0
+    # 待写出的日志记录；deque的append / popleft线程安全，写出时不需要持有_lock
+    _pending: Deque[Dict] = deque()
+    _writer: Optional[threading.Thread] = None
+    # 串行化写文件（后台线程与退出时的flush）
+    _io_lock = threading.Lock()
+
+    @classmethod
+    def span(cls, stage: str, provider: str = ""):
+        """计时上下文：with Metrics.span("pdf_extract"): ..."""
+        if not cls.enabled:
+            return cls._NOOP
+        return cls._span(stage, provider)
+
+    @classmethod
+    @contextmanager
+    def _span(cls, stage: str, provider: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            cls.record(stage, time.perf_counter() - start, provider)
+
+    @classmethod
+    def timed(cls, stage: str) -> Callable:
+        """计时装饰器"""
+        def decorator(func: Callable) -> Callable:
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if not cls.enabled:
+                    return func(*args, **kwargs)
+                with cls._span(stage, ""):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    @classmethod
+    def record(cls, stage: str, seconds: float, provider: str = "", **fields) -> None:
+        """记录一次耗时；fields中的prompt_tokens / completion_tokens / ttft等一并记录"""
+        if not cls.enabled:
+            return
+        entry = {"ts": round(time.time(), 3), "stage": stage, "provider": provider,
+                 "seconds": round(seconds, 6), **fields}
+        with cls._lock:
+            cls._add_sample("seconds", stage, provider, seconds)
+            if fields.get("ttft") is not None:
+                cls._add_sample("ttft", stage, provider, fields["ttft"])
+            if fields.get("completion_tokens") and seconds > 0:
+                cls._add_sample("tokens_per_second", stage, provider, fields["completion_tokens"] / seconds)
+            totals = cls._totals[(stage, provider)]
+            totals["count"] += 1
+            totals["seconds"] += seconds
+            totals["prompt_tokens"] += fields.get("prompt_tokens", 0)
+            totals["completion_tokens"] += fields.get("completion_tokens", 0)
+            cls._pending.append(entry)
+            if cls._writer is None:
+                cls._writer = threading.Thread(target=cls._write_loop, name="trans-metrics", daemon=True)
+                cls._writer.start()
+                atexit.register(cls.flush)
+
+    @classmethod
+    def _write_loop(cls) -> None:
+        while True:
+            time.sleep(cls.FLUSH_INTERVAL)
+            cls.flush()
+
+    @classmethod
+    def flush(cls) -> None:
+        """写出待写的日志记录，距上次导出超过EXPORT_INTERVAL时重写Prometheus文件"""
+        with cls._io_lock:
+            entries = []
+            while cls._pending:
+                entries.append(cls._pending.popleft())
+            if entries:
+                try:
+                    cls._append_log(entries)
+                except OSError:
+                    pass
+            if entries and time.monotonic() - cls._last_export >= cls.EXPORT_INTERVAL:
+                cls._last_export = time.monotonic()
+                cls.export_prometheus()
+
+    @classmethod
+    def _add_sample(cls, metric: str, stage: str, provider: str, value: float) -> None:
+        key = (metric, stage, provider)
+        if key not in cls._samples:
+            cls._samples[key] = deque(maxlen=cls.WINDOW)
+        cls._samples[key].append(value)
+
+    @classmethod
+    def _append_log(cls, entries: List[Dict]) -> None:
+        """追加到JSONL日志，超过大小上限时轮转为.1"""
+        os.makedirs(cls.DIRECTORY, exist_ok=True)
+        path = os.path.join(cls.DIRECTORY, "metrics.jsonl")
+        if os.path.exists(path) and os.path.getsize(path) > cls.LOG_MAX_BYTES:
+            os.replace(path, path + ".1")
+        with open(path, "a", encoding="utf-8") as f:
+            f.writelines(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries)
+
+    @classmethod
+    def summary(cls) -> List[Dict]:
+        """各阶段/厂商的次数与p50/p95，供界面展示"""
+        with cls._lock:
+            samples = {key: list(values) for key, values in cls._samples.items()}
+            totals = {key: dict(values) for key, values in cls._totals.items()}
+        rows = []
+        for (stage, provider), total in sorted(totals.items()):
+            latency = samples.get(("seconds", stage, provider), [])
+            ttft = samples.get(("ttft", stage, provider), [])
+            speed = samples.get(("tokens_per_second", stage, provider), [])
+            rows.append({
+                "stage": stage,
+                "provider": provider,
+                "count": int(total["count"]),
+                "p50_ms": round(percentile(latency, 0.5) * 1000, 1),
+                "p95_ms": round(percentile(latency, 0.95) * 1000, 1),
+                "ttft_p50_ms": round(percentile(ttft, 0.5) * 1000, 1) if ttft else None,
+                "tokens_per_s_p50": round(percentile(speed, 0.5), 1) if speed else None,
+            })
+        return rows
+
+    @classmethod
+    def prometheus_text(cls) -> str:
+        """生成Prometheus文本格式的指标"""
+        with cls._lock:
+            samples = {key: list(values) for key, values in cls._samples.items()}
+            totals = {key: dict(values) for key, values in cls._totals.items()}
+
+        def labels(stage: str, provider: str, **extra: str) -> str:
+            pairs = {"stage": stage, "provider": provider, **extra}
+            return "{" + ",".join(f'{name}="{value}"' for name, value in pairs.items() if value) + "}"
+
+        lines = []
+        summaries = [
+            ("seconds", "trans_stage_seconds", "Stage latency in seconds"),
+            ("ttft", "trans_time_to_first_token_seconds", "Time to first streamed token"),
+            ("tokens_per_second", "trans_tokens_per_second", "Completion tokens per second"),
+        ]
+        for metric, name, description in summaries:
+            lines += [f"# HELP {name} {description}", f"# TYPE {name} summary"]
+            for (sample_metric, stage, provider), values in sorted(samples.items()):
+                if sample_metric != metric:
+                    continue
+                for q in (0.5, 0.95):
+                    lines.append(f"{name}{labels(stage, provider, quantile=str(q))} {percentile(values, q):.6f}")
+                if metric == "seconds":
+                    total = totals.get((stage, provider), {})
+                    lines.append(f"{name}_sum{labels(stage, provider)} {total.get('seconds', 0):.6f}")
+                    lines.append(f"{name}_count{labels(stage, provider)} {int(total.get('count', 0))}")
+        for field in ("prompt_tokens", "completion_tokens"):
+            name = f"trans_{field}_total"
+            lines += [f"# HELP {name} Total {field.replace('_', ' ')}", f"# TYPE {name} counter"]
+            for (stage, provider), total in sorted(totals.items()):
+                if total.get(field):
+                    lines.append(f"{name}{labels(stage, provider)} {int(total[field])}")
+        return "\n".join(lines) + "\n"
+
+    @classmethod
+    def export_prometheus(cls, path: Optional[str] = None) -> None:
+        """原子地写出Prometheus文本文件"""
+        path = path or os.path.join(cls.DIRECTORY, "trans.prom")
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                f.write(cls.prometheus_text())
+            os.replace(temp_path, path)
+        except OSError:
+            pass
@@ -0,0 +1,93 @@
+"""OCR识别服务模块"""
+import threading
+from collections import defaultdict
+from io import BytesIO
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
+import numpy as np
+from services.cache_service import TieredCache, content_hash
+
+if TYPE_CHECKING:
+    import easyocr
+
+
+class OCREngine:
+    """进程级共享的EasyOCR引擎
+
+    识别模型在首次使用时加载一次，之后所有会话共用；
+    结果按图片内容哈希缓存，同一张截图不会重复识别。
+    """
+
+    LANGUAGES = ['en', 'ch_sim']
+    BATCH_SIZE = 8
+    CACHE_MEMORY_BYTES = 32 * 1024 * 1024
+
+    _reader: Optional["easyocr.Reader"] = None
+    _reader_lock = threading.Lock()
+    # EasyOCR的Reader并非线程安全，识别调用需串行
+    _recognize_lock = threading.Lock()
+    _cache = TieredCache("ocr", max_memory_bytes=CACHE_MEMORY_BYTES)
+
+    @classmethod
+    def get_reader(cls) -> "easyocr.Reader":
+        """懒加载识别模型（easyocr及torch仅在此时导入）"""
+        if cls._reader is None:
+            with cls._reader_lock:
+                if cls._reader is None:
+                    import easyocr
+                    cls._reader = easyocr.Reader(cls.LANGUAGES)
+        return cls._reader
+
+    @staticmethod
+    def decode(image_bytes: bytes) -> np.ndarray:
+        """在内存中解码图片为BGR数组（与cv2.imread一致）"""
+        from PIL import Image
+        with Image.open(BytesIO(image_bytes)) as image:
+            rgb = np.asarray(image.convert("RGB"))
+        return np.ascontiguousarray(rgb[:, :, ::-1])
+
+    @classmethod
+    def _cache_key(cls, image_bytes: bytes) -> str:
+        return content_hash(image_bytes, "easyocr", *cls.LANGUAGES)
+
+    @classmethod
+    def recognize(cls, images: List[bytes],
+                  progress: Optional[Callable[[str, int, int], None]] = None) -> List[str]:
+        """批量识别多张图片，返回与输入顺序一致的文本列表；progress按已识别图片数汇报"""
+        results: List[Optional[str]] = [None] * len(images)
+        pending: Dict[str, List[int]] = {}
+        for position, image_bytes in enumerate(images):
+            key = cls._cache_key(image_bytes)
+            cached = cls._cache.get(key)
+            if cached is not None:
+                results[position] = cached
+            else:
+                pending.setdefault(key, []).append(position)
+
+        if pending:
+            # 同尺寸图片可以一次送入批量识别，其余逐张识别
+            arrays = {key: cls.decode(images[positions[0]]) for key, positions in pending.items()}
+            by_shape = defaultdict(list)
+            for key, array in arrays.items():
+                by_shape[array.shape].append(key)
+
+            recognized = len(images) - sum(len(positions) for positions in pending.values())
+            if progress:
+                progress("ocr", recognized, len(images))
+            reader = cls.get_reader()
+            with cls._recognize_lock:
+                for keys in by_shape.values():
+                    if len(keys) > 1:
+                        batches = reader.readtext_batched(
+                            [arrays[key] for key in keys], detail=0, batch_size=cls.BATCH_SIZE
+                        )
+                    else:
+                        batches = [reader.readtext(arrays[keys[0]], detail=0, batch_size=cls.BATCH_SIZE)]
+                    for key, lines in zip(keys, batches):
+                        text = "\n".join(lines)
+                        cls._cache.put(key, text)
+                        for position in pending[key]:
+                            results[position] = text
+                        recognized += len(pending[key])
+                    if progress:
+                        progress("ocr", recognized, len(images))
+        return results
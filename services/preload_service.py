@@ -0,0 +1,62 @@
+"""后台预加载服务模块"""
+import importlib
+import os
+import threading
+from typing import List
+
+
+class PreloadService:
+    """在首屏渲染后于后台线程导入重量级依赖
+
+    通过环境变量 TRANS_PRELOAD 控制：
+    off 关闭预加载；basic（默认）预加载PDF/模型客户端依赖；
+    all 额外加载OCR识别模型（torch，占用较多内存）。
+    """
+
+    BASIC_MODULES = [
+        "PyPDF2",
+        "langchain.text_splitter",
+        "httpx",
+        "openai",
+        "pdfkit",
+        "streamlit_pdf_viewer",
+    ]
+
+    _started = False
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_level(cls) -> str:
+        return os.getenv("TRANS_PRELOAD", "basic").lower()
+
+    @classmethod
+    def start(cls) -> None:
+        """启动预加载线程（每个进程只启动一次）"""
+        level = cls.get_level()
+        if level == "off":
+            return
+        with cls._lock:
+            if cls._started:
+                return
+            cls._started = True
+        threading.Thread(
+            target=cls._preload,
+            args=(cls.BASIC_MODULES, level == "all"),
+            name="trans-preload",
+            daemon=True
+        ).start()
+
+    @staticmethod
+    def _preload(modules: List[str], warm_ocr: bool) -> None:
+        for name in modules:
+            try:
+                importlib.import_module(name)
+            except Exception:
+                # 缺失的可选依赖留到真正使用时再报错
+                pass
+        if warm_ocr:
+            try:
+                from services.ocr_service import OCREngine
+                OCREngine.get_reader()
+            except Exception:
+                pass
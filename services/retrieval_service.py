@@ -0,0 +1,144 @@
+"""文档检索服务模块"""
+import re
+from typing import TYPE_CHECKING, List, Optional, Tuple
+import numpy as np
+import streamlit as st
+from services.cache_service import LRUCache, content_hash
+from services.metrics_service import Metrics
+from services.text_service import TextService
+
+if TYPE_CHECKING:
+    from services.document_service import Document
+
+# 英文/数字按词切分，中日韩文字按单字切分
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+|[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff]")
+
+
+def tokenize(text: str) -> List[str]:
+    """将文本切分为检索词"""
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25Index:
+    """基于NumPy倒排表的BM25索引
+
+    倒排表以CSC形式存储：第t个词的命中文档为
+    doc_ids[indptr[t]:indptr[t + 1]]，对应的BM25权重在建索引时预先算好，
+    查询时只需按词切片累加。
+    """
+
+    K1 = 1.5
+    B = 0.75
+
+    def __init__(self, chunks: List[str]):
+        self.chunks = chunks
+        self.vocab = {}
+        term_ids: List[int] = []
+        lengths: List[int] = []
+        for chunk in chunks:
+            tokens = tokenize(chunk)
+            term_ids.extend(self.vocab.setdefault(token, len(self.vocab)) for token in tokens)
+            lengths.append(len(tokens))
+
+        doc_count = len(chunks)
+        doc_lengths = np.asarray(lengths, dtype=np.float32)
+        doc_ids = np.repeat(np.arange(doc_count, dtype=np.int64), lengths)
+        terms = np.asarray(term_ids, dtype=np.int64)
+
+        # 以 term * N + doc 作为联合键去重计数，结果天然按(词, 文档)排序
+        keys, term_freq = np.unique(terms * max(doc_count, 1) + doc_ids, return_counts=True)
+        posting_terms = keys // max(doc_count, 1)
+        posting_docs = keys % max(doc_count, 1)
+
+        doc_freq = np.bincount(posting_terms, minlength=len(self.vocab))
+        idf = np.log1p((doc_count - doc_freq + 0.5) / (doc_freq + 0.5))
+        avg_length = float(doc_lengths.mean()) if doc_count and doc_lengths.mean() > 0 else 1.0
+        norm = self.K1 * (1 - self.B + self.B * doc_lengths[posting_docs] / avg_length)
+
+        self._doc_ids = posting_docs.astype(np.int32)
+        self._weights = (idf[posting_terms] * term_freq * (self.K1 + 1) / (term_freq + norm)).astype(np.float32)
+        self._indptr = np.concatenate(([0], np.cumsum(doc_freq)))
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    @property
+    def nbytes(self) -> int:
+        """索引占用内存的估计值"""
+        text_bytes = sum(len(chunk) for chunk in self.chunks) * 2
+        return text_bytes + self._doc_ids.nbytes + self._weights.nbytes + self._indptr.nbytes
+
+    def scores(self, query: str) -> np.ndarray:
+        """计算查询对每个文本块的BM25得分"""
+        scores = np.zeros(len(self.chunks), dtype=np.float32)
+        for token in set(tokenize(query)):
+            term_id = self.vocab.get(token)
+            if term_id is None:
+                continue
+            start, stop = self._indptr[term_id], self._indptr[term_id + 1]
+            # 同一个词的倒排表内文档不重复，可直接花式索引累加
+            scores[self._doc_ids[start:stop]] += self._weights[start:stop]
+        return scores
+
+    def search(self, query: str, top_k: int) -> List[Tuple[int, float]]:
+        """返回得分最高的(块序号, 得分)，按得分降序"""
+        if not self.chunks or top_k <= 0:
+            return []
+        scores = self.scores(query)
+        top_k = min(top_k, len(scores))
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        ranked = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(int(i), float(scores[i])) for i in ranked if scores[i] > 0]
+
+
+class RetrievalService:
+    """检索服务类，为每份文档维护一个BM25索引"""
+
+    DEFAULT_TOP_K = 5
+    INDEX_CACHE_BYTES = 512 * 1024 * 1024
+
+    _indexes = LRUCache(INDEX_CACHE_BYTES, sizeof=lambda index: index.nbytes)
+
+    @classmethod
+    def get_index(cls, text: str, document: Optional["Document"] = None) -> BM25Index:
+        """获取（必要时构建）文档的BM25索引，text为document的全文时传入document"""
+        if document is not None:
+            # 共享存储中的文档：索引挂在文档条目上，随文档一起计入内存上限和淘汰
+            return document.derived("bm25", lambda full_text: BM25Index(TextService.split_into_chunks(full_text)))
+        key = content_hash(text.encode("utf-8"))
+        index = cls._indexes.get(key)
+        if index is None:
+            index = BM25Index(TextService.split_into_chunks(text))
+            cls._indexes.put(key, index)
+        return index
+
+    @classmethod
+    @Metrics.timed("retrieval")
+    def retrieve(cls, text: str, query: str, top_k: int = DEFAULT_TOP_K,
+                 semantic: bool = False, document_order: bool = True,
+                 document: Optional["Document"] = None) -> List[str]:
+        """返回与问题最相关的文本块
+
+        semantic为True时使用向量检索（嵌入后端不可用时退回BM25），否则使用BM25；
+        document_order为True时按原文顺序排列，否则按相关度降序。
+        """
+        if not text:
+            return []
+        index = cls.get_index(text, document)
+        hits = None
+        if semantic:
+            try:
+                from services.embedding_service import EmbeddingService
+                doc_hash = document.key if document is not None else content_hash(text.encode("utf-8"))
+                hits = EmbeddingService.search(doc_hash, index.chunks, query, top_k)
+            except Exception as e:
+                st.warning(f"Semantic search unavailable, using keyword search: {str(e)}")
+        if hits is None:
+            hits = index.search(query, top_k)
+        if not hits:
+            # 问题与文档无词汇重叠时，退回到文档开头部分
+            return index.chunks[:top_k]
+        positions = [i for i, _ in hits]
+        if document_order:
+            positions.sort()
+        return [index.chunks[i] for i in positions]
@@ -0,0 +1,159 @@
+"""分层摘要服务模块"""
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional
+from models.CausalPromptFactory import AcademicReadingAssistant
+from models.ModelFactory import ModelFactory, create_async_http_client
+from models.TokenBudget import TokenBudget
+from services.cache_service import TieredCache, content_hash
+from services.text_service import TextService
+
+ProgressCallback = Callable[[str, int, int], None]
+
+
+class SummaryService:
+    """map-reduce 分层摘要服务
+
+    文档超出模型上下文时，先分块并发摘要（map），再把部分摘要逐层合并，
+    直到能放进一次调用（reduce）。每个分块和每次合并的结果按内容哈希缓存，
+    失败后重新运行只会补做缺失的部分。
+    """
+
+    PROMPT_VERSION = "summary-v1"
+    DEFAULT_CONCURRENCY = 4
+    CHUNK_OVERLAP = 200
+    # 单次调用的内容只占用可用预算的这一比例，为模板留出余量
+    CONTENT_BUDGET_RATIO = 0.6
+    CACHE_MEMORY_BYTES = 16 * 1024 * 1024
+
+    _cache = TieredCache("summaries", max_memory_bytes=CACHE_MEMORY_BYTES)
+
+    @classmethod
+    def summarize(cls, text: str, model_choice: Dict[str, str], language: str = "中文",
+                  concurrency: int = DEFAULT_CONCURRENCY,
+                  progress: Optional[ProgressCallback] = None) -> str:
+        """同步入口"""
+        return asyncio.run(cls.asummarize(text, model_choice, language, concurrency, progress))
+
+    @classmethod
+    async def asummarize(cls, text: str, model_choice: Dict[str, str], language: str = "中文",
+                         concurrency: int = DEFAULT_CONCURRENCY,
+                         progress: Optional[ProgressCallback] = None,
+                         http_client=None, semaphore: Optional[asyncio.Semaphore] = None,
+                         use_cache: bool = True) -> str:
+        """生成整篇文档的摘要，progress(stage, done, total)报告进度
+
+        semaphore由调用方传入时，模型调用与调用方的其他请求共享同一并发上限（此时忽略concurrency）；
+        use_cache为False时不读写回复缓存和分块摘要缓存。
+        """
+        semaphore = semaphore or asyncio.Semaphore(concurrency)
+        if http_client is None:
+            async with create_async_http_client() as client:
+                return await cls._summarize(text, model_choice, language, semaphore, use_cache, progress, client)
+        return await cls._summarize(text, model_choice, language, semaphore, use_cache, progress, http_client)
+
+    @classmethod
+    def content_limit(cls, model_choice: Dict[str, str]) -> int:
+        """单次调用可放入的内容token数"""
+        return int(TokenBudget.for_model(model_choice).remaining * cls.CONTENT_BUDGET_RATIO)
+
+    @staticmethod
+    def chunk_chars(text: str, token_limit: int, budget: TokenBudget) -> int:
+        """按文本实际的字符/token比例，把token上限换算为分块字符数"""
+        sample = text[:20000]
+        chars_per_token = len(sample) / max(budget.counter.count(sample), 1)
+        return max(500, int(token_limit * chars_per_token))
+
+    @staticmethod
+    def group_summaries(summaries: List[str], token_limit: int, budget: TokenBudget) -> List[List[str]]:
+        """按顺序把部分摘要贪心地分组，每组总长不超过token_limit"""
+        groups: List[List[str]] = []
+        current: List[str] = []
+        used = 0
+        for summary in summaries:
+            cost = budget.counter.count(summary)
+            if current and used + cost > token_limit:
+                groups.append(current)
+                current, used = [], 0
+            current.append(summary)
+            used += cost
+        if current:
+            groups.append(current)
+        if len(summaries) > 1 and len(groups) == len(summaries):
+            # 单个摘要都已接近上限时两两合并（超出部分由预算截断），保证每层都在收敛
+            groups = [summaries[i:i + 2] for i in range(0, len(summaries), 2)]
+        return groups
+
+    @classmethod
+    async def _summarize(cls, text: str, model_choice: Dict[str, str], language: str,
+                         semaphore: asyncio.Semaphore, use_cache: bool,
+                         progress: Optional[ProgressCallback], http_client) -> str:
+        model = ModelFactory.get_model(model_choice)
+        probe = TokenBudget.for_model(model_choice)
+        token_limit = cls.content_limit(model_choice)
+
+        async def call(stage: str, material: str, prompt: str) -> str:
+            key = content_hash(material.encode("utf-8"), cls.PROMPT_VERSION, stage,
+                               model.provider, model.model_name, language)
+            cached = cls._cache.get(key) if use_cache else None
+            if cached is not None:
+                return cached
+            async with semaphore:
+                response = await model.agenerate_response(prompt, http_client, use_cache)
+            if not response or response == model.config.get('error_message'):
+                raise RuntimeError(response or "empty response")
+            if use_cache:
+                cls._cache.put(key, response)
+            return response
+
+        # 文档本身放得下时直接做一次整体分析
+        if probe.counter.count(text) <= token_limit:
+            prompt = AcademicReadingAssistant.build_context_prompt(
+                text, language, budget=TokenBudget.for_model(model_choice))
+            return (await cls._gather([call("context", text, prompt)], "context", progress))[0]
+
+        # map：分块并发摘要
+        chunks = TextService.split_into_chunks(
+            text, chunk_size=cls.chunk_chars(text, token_limit, probe), chunk_overlap=cls.CHUNK_OVERLAP)
+        summaries = await cls._gather([
+            call("map", chunk, AcademicReadingAssistant.build_summary_map_prompt(
+                chunk, index + 1, len(chunks), language, budget=TokenBudget.for_model(model_choice)))
+            for index, chunk in enumerate(chunks)
+        ], "map", progress)
+
+        # reduce：逐层合并，直到只剩一份
+        level = 0
+        while len(summaries) > 1:
+            level += 1
+            groups = cls.group_summaries(summaries, token_limit, probe)
+            summaries = await cls._gather([
+                call("reduce", "\0".join(group), AcademicReadingAssistant.build_summary_reduce_prompt(
+                    group, language, budget=TokenBudget.for_model(model_choice)))
+                if len(group) > 1 else cls._passthrough(group[0])
+                for group in groups
+            ], f"reduce {level}", progress)
+        return summaries[0] if summaries else ""
+
+    @staticmethod
+    async def _passthrough(summary: str) -> str:
+        return summary
+
+    @staticmethod
+    async def _gather(calls: List[Awaitable[str]], stage: str,
+                      progress: Optional[ProgressCallback]) -> List[str]:
+        """并发执行一层调用并报告进度；有失败时在整层完成后统一报错"""
+        tasks = [asyncio.ensure_future(item) for item in calls]
+        done = 0
+        for next_done in asyncio.as_completed(tasks):
+            try:
+                await next_done
+            except Exception:
+                pass
+            done += 1
+            if progress is not None:
+                progress(stage, done, len(tasks))
+        failed = [task.exception() for task in tasks if task.exception() is not None]
+        if failed:
+            raise RuntimeError(
+                f"{len(failed)}/{len(tasks)} {stage} calls failed, rerun to resume: {failed[0]}"
+            )
+        return [task.result() for task in tasks]
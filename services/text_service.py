@@ -1,6 +1,5 @@
 """文本处理服务模块"""
 from typing import List
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 import streamlit as st
 
 class TextService:
@@ -14,6 +13,7 @@ class TextService:
                          chunk_overlap: int = DEFAULT_CHUNK_OVERLAP) -> List[str]:
         """将文本分割成小块"""
         try:
+            from langchain.text_splitter import RecursiveCharacterTextSplitter
             splitter = RecursiveCharacterTextSplitter(
                 chunk_size=chunk_size,
                 chunk_overlap=chunk_overlap,
@@ -0,0 +1,247 @@
+"""文档翻译服务模块"""
+import asyncio
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+from models.CausalPromptFactory import AcademicReadingAssistant
+from models.ModelFactory import ModelFactory, create_async_http_client
+from models.TokenBudget import TokenBudget
+from models.TranslationMemory import TranslationMemory, normalize_segment, segment_key
+from services.file_service import ProgressCallback
+from services.job_service import JobCancelled
+
+# 句末标点（中英文），其后断句
+_SENTENCE_END = re.compile(r"(?<=[.!?;。！？；])\s+(?=\S)|(?<=[。！？；])(?=\S)")
+_TERMINAL = ("。", "！", "？", ".", "!", "?", ":", "：")
+_BATCH_MARKER = re.compile(r"^\s*\[(\d+)\]\s?", re.MULTILINE)
+_LETTERS = re.compile(r"[^\W\d_]")
+
+
+class TranslationService:
+    """分段翻译服务
+
+    文档先切成段落和句子；每个片段先查翻译记忆，精确命中的直接复用，
+    其余片段发给模型：按token预算打包成少量批次并发请求，模糊命中的相近译文作为参考一并附上，
+    译文写回记忆后按原文顺序重新拼装。页眉、图注、参考文献等重复出现的片段
+    因此只会翻译一次。
+    """
+
+    TARGETS = ["中文", "English"]
+    DEFAULT_CONCURRENCY = 4
+    # 每批原文的token上限与片段数上限；译文长度与原文相近，需为输出留出余量
+    BATCH_TOKENS = 1500
+    BATCH_SEGMENTS = 40
+    # 短于该字符数的行（标题、页眉、参考文献编号等）单独成段
+    SHORT_LINE = 40
+    # 没有句末标点的长文本块（表格、公式）超过该字符数时强制分段
+    MAX_PARAGRAPH_CHARS = 2000
+    # 单条重译仍失败的片段保留原文，并加上该标记，便于在结果中查找
+    UNTRANSLATED_MARK = "[untranslated] "
+
+    _memory: Optional[TranslationMemory] = None
+    _memory_lock = threading.Lock()
+
+    @classmethod
+    def get_memory(cls) -> TranslationMemory:
+        """进程级共享的翻译记忆"""
+        with cls._memory_lock:
+            if cls._memory is None:
+                cls._memory = TranslationMemory.from_config()
+            return cls._memory
+
+    @classmethod
+    def segment(cls, text: str) -> List[List[str]]:
+        """切分为段落，每个段落是若干句子
+
+        PDF提取的文本在行尾断行：空行、以句末标点结尾的行和短行视为段落边界，
+        其余断行合并为空格。
+        """
+        paragraphs: List[List[str]] = []
+        current: List[str] = []
+
+        def flush() -> None:
+            if current:
+                paragraph = current[0]
+                for line in current[1:]:
+                    # 行尾连字符多为复合词（self-\nattention），保留连字符、不加空格
+                    paragraph += line if paragraph.endswith("-") else " " + line
+                paragraphs.append([sentence for sentence in _SENTENCE_END.split(paragraph) if sentence.strip()])
+                current.clear()
+
+        size = 0
+        for line in text.splitlines():
+            line = line.strip()
+            if not line:
+                flush()
+                continue
+            current.append(line)
+            size = len(line) + (size if len(current) > 1 else 0)
+            short = len(line) < cls.SHORT_LINE and not line.endswith("-")
+            if line.endswith(_TERMINAL) or short or size > cls.MAX_PARAGRAPH_CHARS:
+                flush()
+        flush()
+        return paragraphs
+
+    @classmethod
+    def count_untranslated(cls, translation: str) -> int:
+        """译文中保留原文的片段数"""
+        return translation.count(cls.UNTRANSLATED_MARK)
+
+    @staticmethod
+    def needs_translation(segment: str) -> bool:
+        """纯数字、符号的片段原样保留"""
+        return bool(_LETTERS.search(segment))
+
+    @staticmethod
+    def batches(segments: List[str], budget: TokenBudget, max_tokens: int, max_segments: int) -> List[List[str]]:
+        """按顺序把片段贪心地打包，每批不超过token和片段数上限"""
+        groups: List[List[str]] = []
+        current: List[str] = []
+        used = 0
+        for segment in segments:
+            cost = budget.counter.count(segment)
+            if current and (used + cost > max_tokens or len(current) >= max_segments):
+                groups.append(current)
+                current, used = [], 0
+            current.append(segment)
+            used += cost
+        if current:
+            groups.append(current)
+        return groups
+
+    @staticmethod
+    def parse_batch(response: str, count: int) -> List[Optional[str]]:
+        """按[编号]拆分批量译文；缺失或重复的编号返回None"""
+        results: List[Optional[str]] = [None] * count
+        parts = _BATCH_MARKER.split(response)
+        if count == 1 and len(parts) == 1:
+            # 单条翻译时模型可能省略编号
+            return [response.strip() or None]
+        seen = set()
+        for number, content in zip(parts[1::2], parts[2::2]):
+            position = int(number) - 1
+            if 0 <= position < count and position not in seen:
+                seen.add(position)
+                results[position] = content.strip() or None
+        return results
+
+    @classmethod
+    def translate(cls, text: str, model_choice: Dict[str, str], target: str = "中文",
+                  concurrency: int = DEFAULT_CONCURRENCY,
+                  progress: Optional[ProgressCallback] = None) -> str:
+        """同步入口"""
+        return asyncio.run(cls.atranslate(text, model_choice, target, concurrency, progress))
+
+    @classmethod
+    async def atranslate(cls, text: str, model_choice: Dict[str, str], target: str = "中文",
+                         concurrency: int = DEFAULT_CONCURRENCY,
+                         progress: Optional[ProgressCallback] = None,
+                         http_client=None, semaphore: Optional[asyncio.Semaphore] = None,
+                         use_cache: bool = True) -> str:
+        """翻译整篇文档，progress(stage, done, total)报告进度
+
+        semaphore由调用方传入时，模型调用与调用方的其他请求共享同一并发上限（此时忽略concurrency）；
+        use_cache为False时不读写回复缓存（翻译记忆照常使用）。
+        """
+        semaphore = semaphore or asyncio.Semaphore(concurrency)
+        if http_client is None:
+            async with create_async_http_client() as client:
+                return await cls._translate(text, model_choice, target, semaphore, use_cache, progress, client)
+        return await cls._translate(text, model_choice, target, semaphore, use_cache, progress, http_client)
+
+    @classmethod
+    async def _translate(cls, text: str, model_choice: Dict[str, str], target: str,
+                         semaphore: asyncio.Semaphore, use_cache: bool,
+                         progress: Optional[ProgressCallback], http_client) -> str:
+        memory = cls.get_memory()
+        paragraphs = cls.segment(text)
+        segments = [segment for paragraph in paragraphs for segment in paragraph]
+
+        # 文档内重复的片段只查询、翻译一次
+        unique: Dict[str, str] = {}
+        for segment in segments:
+            if cls.needs_translation(segment):
+                unique.setdefault(segment_key(segment, target), normalize_segment(segment))
+        sources = list(unique.values())
+        matches = await asyncio.to_thread(memory.lookup, sources, target)
+        translations: Dict[str, str] = {}
+        # 模糊命中：待译原文 -> (记忆中的原文, 译文)，只作为参考
+        references: Dict[str, Tuple[str, str]] = {}
+        for (key, source), match in zip(unique.items(), matches):
+            if match is None:
+                continue
+            translation, score, matched_source = match
+            if score >= 1.0:
+                translations[key] = translation
+            else:
+                references[source] = (matched_source, translation)
+        if progress is not None:
+            progress("memory", len(translations), len(sources))
+
+        missing = [source for key, source in unique.items() if key not in translations]
+        if missing:
+            translations.update(await cls._translate_missing(missing, model_choice, target, references,
+                                                             semaphore, use_cache, progress, http_client))
+
+        def render(segment: str) -> str:
+            if not cls.needs_translation(segment):
+                return segment
+            translation = translations.get(segment_key(segment, target))
+            return translation if translation is not None else cls.UNTRANSLATED_MARK + segment
+
+        separator = "" if target == "中文" else " "
+        return "\n".join(separator.join(render(segment) for segment in paragraph) for paragraph in paragraphs)
+
+    @classmethod
+    async def _translate_missing(cls, missing: List[str], model_choice: Dict[str, str], target: str,
+                                 references: Dict[str, Tuple[str, str]],
+                                 semaphore: asyncio.Semaphore, use_cache: bool,
+                                 progress: Optional[ProgressCallback], http_client) -> Dict[str, str]:
+        """把未命中的片段分批并发发给模型，成功的批次立即写入翻译记忆"""
+        model = ModelFactory.get_model(model_choice)
+        memory = cls.get_memory()
+        budget = TokenBudget.for_model(model_choice)
+        max_tokens = min(cls.BATCH_TOKENS, budget.remaining // 3)
+        groups = cls.batches(missing, budget, max_tokens, cls.BATCH_SEGMENTS)
+        translations: Dict[str, str] = {}
+        done = 0
+
+        async def call(group: List[str]) -> List[Optional[str]]:
+            prompt = AcademicReadingAssistant.build_translation_prompt(
+                group, target, [references[source] for source in group if source in references]
+            )
+            async with semaphore:
+                # 进度回调同时是取消检查点：任务取消后不再发出新的请求
+                if progress is not None:
+                    progress("translate", done, len(groups))
+                response = await model.agenerate_response(prompt, http_client, use_cache)
+            if not response or response == model.config.get('error_message'):
+                raise RuntimeError(response or "empty response")
+            return cls.parse_batch(response, len(group))
+
+        async def run(group: List[str]) -> None:
+            nonlocal done
+            results = await call(group)
+            # 编号错乱的条目逐条重译，仍失败的不写入记忆，在输出中标记为未翻译
+            for position, result in enumerate(results):
+                if result is None:
+                    results[position] = (await call([group[position]]))[0]
+            pairs: List[Tuple[str, str]] = [
+                (source, result) for source, result in zip(group, results) if result is not None
+            ]
+            await asyncio.to_thread(memory.put, pairs, target, model.provider, model.model_name)
+            translations.update((segment_key(source, target), result) for source, result in pairs)
+            done += 1
+            if progress is not None:
+                progress("translate", done, len(groups))
+
+        outcomes = await asyncio.gather(*(run(group) for group in groups), return_exceptions=True)
+        for outcome in outcomes:
+            if isinstance(outcome, JobCancelled):
+                raise outcome
+        failed = [outcome for outcome in outcomes if isinstance(outcome, Exception)]
+        if failed:
+            raise RuntimeError(
+                f"{len(failed)}/{len(groups)} translation batches failed, rerun to resume: {failed[0]}"
+            )
+        return translations
@@ -0,0 +1,7 @@
+import os
+import sys
+import tempfile
+
+# 缓存目录在导入服务模块时确定，测试使用独立的临时目录，不读写真实缓存
+os.environ.setdefault("TRANS_CACHE_DIR", tempfile.mkdtemp(prefix="trans-test-"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
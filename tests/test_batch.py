@@ -0,0 +1,52 @@
+import argparse
+import asyncio
+import json
+
+import pytest
+
+import batch
+
+
+@pytest.fixture
+def args():
+    return argparse.Namespace(question=None, prompt_type=None, model_frame="OpenAI", model_name="gpt-4-turbo")
+
+
+def write_manifest(path, lines):
+    path.write_text("\n".join(line if isinstance(line, str) else json.dumps(line) for line in lines) + "\n",
+                    encoding="utf-8")
+    return str(path)
+
+
+def test_invalid_lines_become_failed_jobs(tmp_path, args):
+    manifest = write_manifest(tmp_path / "jobs.jsonl", [
+        {"pdf": "a.pdf", "question": "What is new?"},
+        {"question": "no pdf"},
+        "{not json",
+        {"pdf": "b.pdf", "prompt_type": "poem"},
+        ["a.pdf"],
+        {"pdf": "c.pdf", "question": 3},
+        "",
+        {"pdf": "d.pdf"},
+    ])
+    jobs = batch.load_jobs(manifest, args)
+    assert [job.get("error") is None for job in jobs] == [True, False, False, False, False, False, True]
+    assert jobs[0]["pdf"] == str(tmp_path / "a.pdf") and jobs[0]["prompt_type"] == "query"
+    assert jobs[1]["error"] == 'missing "pdf"' and jobs[1]["source"].endswith("jobs.jsonl:2")
+    assert "Unknown prompt_type" in jobs[3]["error"] and jobs[3]["pdf"] == "b.pdf"
+    assert jobs[5]["error"] == '"question" must be a string'
+    assert jobs[6]["prompt_type"] == "context"
+    assert len({job["id"] for job in jobs}) == len(jobs)
+
+
+def test_runner_records_invalid_jobs_without_running_them(tmp_path, args):
+    manifest = write_manifest(tmp_path / "jobs.jsonl", [{"question": "no pdf"}, "{not json"])
+    output = tmp_path / "results.jsonl"
+    runner = batch.BatchRunner(str(output), extract_workers=1, concurrency=1)
+    asyncio.run(runner.run(batch.load_jobs(manifest, args)))
+    records = [json.loads(line) for line in output.read_text(encoding="utf-8").splitlines()]
+    assert runner.failed == 2 and runner.completed == 0
+    assert [record["source"].rsplit(":", 1)[1] for record in records] == ["1", "2"]
+    assert all(record["error"] for record in records)
+    # 失败的记录不算断点，修正清单后重新运行
+    assert batch.load_checkpoint(str(output)) == set()
@@ -0,0 +1,124 @@
+import os
+
+import pytest
+
+from benchmarks.synthetic_pdf import make_pdf
+from services.cache_service import DiskCache, LRUCache, TieredCache, content_hash
+from services.file_service import FileService
+
+
+def test_content_hash_salt():
+    data = b"%PDF-1.4 same bytes"
+    assert content_hash(data) == content_hash(data)
+    assert content_hash(data, "pypdf2-1") != content_hash(data, "pypdf2-2")
+    assert content_hash(data, "pypdf2-1") != content_hash(data)
+
+
+def test_lru_evicts_least_recently_used_at_byte_cap():
+    cache = LRUCache(max_bytes=30, sizeof=len)
+    cache.put("a", "x" * 10)
+    cache.put("b", "y" * 10)
+    cache.put("c", "z" * 10)
+    assert cache.get("a") == "x" * 10
+    cache.put("d", "w" * 10)
+    assert "b" not in cache
+    assert list(cache._items) == ["c", "a", "d"]
+    assert cache.current_bytes == 30
+
+
+def test_lru_skips_values_over_the_cap_and_replaces_in_place():
+    cache = LRUCache(max_bytes=30, sizeof=len)
+    cache.put("big", "x" * 31)
+    assert "big" not in cache and cache.current_bytes == 0
+    cache.put("a", "x" * 10)
+    cache.put("a", "x" * 20)
+    assert len(cache) == 1 and cache.current_bytes == 20
+
+
+def test_disk_cache_survives_new_instance(tmp_path):
+    DiskCache(str(tmp_path)).put("key", ("text", [(1, 0)]))
+    assert DiskCache(str(tmp_path)).get("key") == ("text", [(1, 0)])
+
+
+def test_disk_cache_corrupt_file_is_a_miss(tmp_path):
+    cache = DiskCache(str(tmp_path))
+    (tmp_path / "key.pkl").write_bytes(b"not a pickle")
+    assert cache.get("key", "missing") == "missing"
+    assert "key" not in cache
+
+
+def test_disk_cache_prunes_oldest_over_cap(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=2500)
+    for index in range(4):
+        cache.put(f"k{index}", b"x" * 1000)
+        path = tmp_path / f"k{index}.pkl"
+        # 用显式的访问时间排序，避免依赖文件系统时间精度
+        os.utime(path, (index, index))
+    cache.put("k4", b"x" * 1000)
+    remaining = sorted(path.name for path in tmp_path.glob("*.pkl"))
+    assert remaining == ["k3.pkl", "k4.pkl"]
+
+
+def test_tiered_cache_reloads_from_disk(tmp_path):
+    TieredCache("ns", max_memory_bytes=1024, directory=str(tmp_path)).put("key", "value")
+    reloaded = TieredCache("ns", max_memory_bytes=1024, directory=str(tmp_path))
+    assert "key" not in reloaded.memory
+    assert reloaded.get("key") == "value"
+    # 磁盘命中回填内存
+    assert reloaded.memory.get("key") == "value"
+
+
+def test_tiered_cache_get_or_compute_does_not_store_none(tmp_path):
+    cache = TieredCache("ns", max_memory_bytes=1024, directory=str(tmp_path))
+    calls = []
+    assert cache.get_or_compute("key", lambda: calls.append(1)) is None
+    assert cache.get_or_compute("key", lambda: calls.append(1) or "value") == "value"
+    assert cache.get_or_compute("key", lambda: calls.append(1) or "other") == "value"
+    assert len(calls) == 2
+
+
+@pytest.fixture
+def pdf_cache(tmp_path, monkeypatch):
+    """FileService使用独立的缓存目录，并统计实际提取次数"""
+    cache = TieredCache("pdf_text", max_memory_bytes=1024 * 1024, directory=str(tmp_path))
+    monkeypatch.setattr(FileService, "_pdf_text_cache", cache)
+    calls = []
+    extract = FileService.extract_pdf_payload
+
+    def counting(pdf_bytes, progress=None, page_count=0):
+        calls.append(content_hash(pdf_bytes))
+        return extract(pdf_bytes, progress, page_count)
+
+    monkeypatch.setattr(FileService, "extract_pdf_payload", staticmethod(counting))
+    return cache, calls
+
+
+def test_extract_pdf_text_hits_cache(pdf_cache):
+    _, calls = pdf_cache
+    pdf_bytes = make_pdf(3, lines_per_page=2)
+    text = FileService.extract_pdf_text(pdf_bytes)
+    assert "1.0 " in text and "3.1 " in text
+    assert FileService.extract_pdf_text(pdf_bytes) == text
+    assert len(calls) == 1
+
+
+def test_extract_pdf_text_reloads_from_disk(pdf_cache, tmp_path, monkeypatch):
+    _, calls = pdf_cache
+    pdf_bytes = make_pdf(2, lines_per_page=2)
+    text = FileService.extract_pdf_text(pdf_bytes)
+    # 模拟进程重启：新的缓存实例指向同一目录
+    monkeypatch.setattr(FileService, "_pdf_text_cache",
+                        TieredCache("pdf_text", max_memory_bytes=1024 * 1024, directory=str(tmp_path)))
+    assert FileService.extract_pdf_text(pdf_bytes) == text
+    assert len(calls) == 1
+
+
+def test_extractor_version_bump_misses(pdf_cache, monkeypatch):
+    _, calls = pdf_cache
+    pdf_bytes = make_pdf(2, lines_per_page=2)
+    FileService.extract_pdf_text(pdf_bytes)
+    monkeypatch.setattr(FileService, "PDF_EXTRACTOR_VERSION", "pypdf2-test")
+    FileService.extract_pdf_text(pdf_bytes)
+    assert len(calls) == 2
+    FileService.extract_pdf_text(pdf_bytes)
+    assert len(calls) == 2
@@ -0,0 +1,30 @@
+import pytest
+
+from services.document_service import parse_scope
+
+
+@pytest.mark.parametrize("question, expected", [
+    ("Summarize pages 40-55", ("pages", (40, 55))),
+    ("what happens on pp. 12 to 10?", ("pages", (10, 12))),
+    ("explain page 7", ("pages", (7, 7))),
+    ("summarize the first 10 pages", ("pages", (1, 10))),
+    ("总结第3页", ("pages", (3, 3))),
+    ("第40-55页讲了什么", ("pages", (40, 55))),
+    ("第40页到第55页", ("pages", (40, 55))),
+    ("总结前10页", ("pages", (1, 10))),
+    ("What does section 3.2 say?", ("section", "3.2")),
+    ("§4 in short", ("section", "4")),
+    ("第3章讲了什么", ("section", "3")),
+    ("这本书共300页，第3章讲了什么", ("section", "3")),
+])
+def test_parse_scope(question, expected):
+    assert parse_scope(question) == expected
+
+
+@pytest.mark.parametrize("question", [
+    "What is the main contribution?",
+    "10页左右能讲完吗",
+    "list 3 pages of references",
+])
+def test_parse_scope_without_scope(question):
+    assert parse_scope(question) is None
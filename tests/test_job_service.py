@@ -0,0 +1,93 @@
+import gc
+import threading
+import uuid
+
+import pytest
+
+from services.job_service import JobCancelled, JobQueue
+
+
+def blocking_task(release: threading.Event):
+    """等待release后返回；期间每隔一段时间汇报进度，作为取消检查点"""
+    def task(job):
+        step = 0
+        while not release.wait(0.01):
+            step += 1
+            job.report("work", step, 0)
+        job.report("work", step, step)
+        return step
+    return task
+
+
+@pytest.fixture
+def key():
+    return uuid.uuid4().hex
+
+
+def test_submit_dedups_running_job(key):
+    release = threading.Event()
+    first = JobQueue.submit("test", key, blocking_task(release))
+    second = JobQueue.submit("test", key, blocking_task(release))
+    assert first.job is second.job
+    release.set()
+    assert JobQueue.result(first.job.id, timeout=5) >= 0
+    assert JobQueue.status(first.job.id)["status"] == "done"
+
+
+def test_finished_job_is_reused(key):
+    first = JobQueue.submit("test", key, lambda job: "result")
+    assert JobQueue.result(first.job.id, timeout=5) == "result"
+    second = JobQueue.submit("test", key, lambda job: "other")
+    assert second.job is first.job
+
+
+def test_failed_job_is_resubmitted(key):
+    def fail(job):
+        raise ValueError("boom")
+
+    first = JobQueue.submit("test", key, fail)
+    with pytest.raises(RuntimeError, match="boom"):
+        JobQueue.result(first.job.id, timeout=5)
+    second = JobQueue.submit("test", key, lambda job: "ok")
+    assert second.job is not first.job
+    assert JobQueue.result(second.job.id, timeout=5) == "ok"
+
+
+def test_cancel_waits_for_every_subscriber(key):
+    release = threading.Event()
+    first = JobQueue.submit("test", key, blocking_task(release))
+    second = JobQueue.submit("test", key, blocking_task(release))
+
+    assert first.cancel() is False
+    # 同一订阅重复取消不会替另一个会话停止任务
+    assert first.cancel() is False
+    assert first.cancelled and not second.cancelled
+    assert not first.job.cancelled
+
+    assert second.cancel() is True
+    with pytest.raises(JobCancelled):
+        JobQueue.result(second.job.id, timeout=5)
+    assert JobQueue.status(second.job.id)["status"] == "cancelled"
+    release.set()
+
+
+def test_cancelled_job_is_resubmitted(key):
+    release = threading.Event()
+    subscription = JobQueue.submit("test", key, blocking_task(release))
+    subscription.cancel()
+    again = JobQueue.submit("test", key, lambda job: "fresh")
+    assert again.job is not subscription.job
+    assert JobQueue.result(again.job.id, timeout=5) == "fresh"
+    release.set()
+
+
+def test_collected_subscription_unsubscribes(key):
+    release = threading.Event()
+    subscription = JobQueue.submit("test", key, blocking_task(release))
+    job = subscription.job
+    del subscription
+    gc.collect()
+    assert job.cancelled
+    with pytest.raises(JobCancelled):
+        JobQueue.result(job.id, timeout=5)
+    release.set()
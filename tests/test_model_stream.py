@@ -0,0 +1,34 @@
+import pytest
+
+from benchmarks.bench_e2e import configure
+from benchmarks.mock_server import MockLLMServer
+from models.ModelFactory import DeepSeekModel, IncompleteStreamError, OllamaModel, get_response_cache
+
+
+@pytest.fixture
+def dropping_server():
+    with MockLLMServer(latency=0, token_delay=0, tokens=16, drop_after=3) as server:
+        configure(server.url)
+        yield server
+
+
+@pytest.mark.parametrize("model_class", [OllamaModel, DeepSeekModel])
+def test_truncated_stream_is_not_cached(dropping_server, model_class):
+    model = model_class(f"mock-{model_class.provider.lower()}")
+    prompt = f"truncated stream test for {model_class.provider}"
+    received = []
+    with pytest.raises(IncompleteStreamError):
+        for delta in model.generate_stream(prompt):
+            received.append(delta)
+    assert len(received) == 3
+    assert get_response_cache().get(model._cache_key(prompt)) is None
+
+
+def test_complete_stream_is_cached():
+    with MockLLMServer(latency=0, token_delay=0, tokens=16) as server:
+        configure(server.url)
+        model = OllamaModel("mock-ollama")
+        prompt = "complete stream test"
+        response = "".join(model.generate_stream(prompt))
+        assert response == "".join(server.reply_tokens())
+        assert get_response_cache().get(model._cache_key(prompt)) == response
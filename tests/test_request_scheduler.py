@@ -0,0 +1,118 @@
+import pytest
+
+from models import RequestScheduler as scheduler_module
+from models.RequestScheduler import CircuitBreaker, CircuitOpenError, RequestScheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(scheduler_module.time, "monotonic", fake)
+    return fake
+
+
+def open_breaker(breaker: CircuitBreaker) -> None:
+    for _ in range(breaker.failure_threshold):
+        breaker.allow()
+        breaker.record_failure()
+
+
+def test_opens_after_threshold(clock):
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=10)
+    for _ in range(2):
+        breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+
+
+def test_success_resets_failure_count(clock):
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=10)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+
+def test_half_open_allows_single_probe(clock):
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=10)
+    open_breaker(breaker)
+    clock.now += 9.9
+    assert breaker.state == "open"
+    clock.now += 0.1
+    assert breaker.state == "half_open"
+    breaker.allow()
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+
+
+def test_probe_success_closes(clock):
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=10)
+    open_breaker(breaker)
+    clock.now += 10
+    breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    breaker.allow()
+    breaker.allow()
+
+
+def test_probe_failure_reopens(clock):
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=10)
+    open_breaker(breaker)
+    clock.now += 10
+    breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+    clock.now += 10
+    breaker.allow()
+
+
+class HTTPError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def test_rejected_probe_keeps_breaker_open(clock):
+    scheduler = RequestScheduler("test", {"failure_threshold": 2, "reset_timeout": 10, "max_attempts": 1})
+    open_breaker(scheduler.breaker)
+    clock.now += 10
+
+    def unauthorized():
+        raise HTTPError(401)
+
+    with pytest.raises(HTTPError):
+        scheduler.call(unauthorized)
+    assert scheduler.breaker.state == "half_open"
+    # 探测名额已归还，下一个请求可以继续探测
+    assert scheduler.call(lambda: "ok") == "ok"
+    assert scheduler.breaker.state == "closed"
+
+
+def test_rejected_request_does_not_reset_failures(clock):
+    scheduler = RequestScheduler("test", {"failure_threshold": 2, "reset_timeout": 10, "max_attempts": 1})
+
+    def fail(status):
+        def request():
+            raise HTTPError(status)
+        return request
+
+    for status in (503, 400, 503):
+        with pytest.raises(HTTPError):
+            scheduler.call(fail(status))
+    assert scheduler.breaker.state == "open"
@@ -0,0 +1,67 @@
+import asyncio
+
+from models.TranslationMemory import segment_key
+from services.translation_service import TranslationService
+
+
+def test_parse_batch_in_order():
+    response = "[1] 第一句\n[2] 第二句\n[3] 第三句"
+    assert TranslationService.parse_batch(response, 3) == ["第一句", "第二句", "第三句"]
+
+
+def test_parse_batch_missing_duplicate_and_out_of_range():
+    response = "[2] 第二句\n[2] 重复\n[5] 越界\n[1] "
+    assert TranslationService.parse_batch(response, 3) == [None, "第二句", None]
+
+
+def test_parse_batch_single_without_marker():
+    assert TranslationService.parse_batch("  只有一句  ", 1) == ["只有一句"]
+    assert TranslationService.parse_batch("   ", 1) == [None]
+
+
+def test_segment_joins_wrapped_lines():
+    text = (
+        "The encoder maps the input sequence to a sequence of continuous\n"
+        "representations. The decoder then generates the output.\n"
+        "\n"
+        "Self-\n"
+        "attention relates different positions of a single sequence in order to compute\n"
+        "a representation of the sequence."
+    )
+    assert TranslationService.segment(text) == [
+        [
+            "The encoder maps the input sequence to a sequence of continuous representations.",
+            "The decoder then generates the output.",
+        ],
+        [
+            "Self-attention relates different positions of a single sequence in order to compute "
+            "a representation of the sequence.",
+        ],
+    ]
+
+
+def test_segment_short_lines_are_paragraphs():
+    assert TranslationService.segment("1 Introduction\nAbstract\n\n\n") == [["1 Introduction"], ["Abstract"]]
+
+
+def test_segment_chinese_sentences():
+    assert TranslationService.segment("第一句。第二句！") == [["第一句。", "第二句！"]]
+
+
+class FakeMemory:
+    def lookup(self, sources, target):
+        return [None] * len(sources)
+
+
+def test_untranslated_segments_are_marked(monkeypatch):
+    async def translate_missing(missing, *args):
+        # 第一段翻译成功，第二段单条重译后仍失败
+        return {segment_key(missing[0], "中文"): "第一句。"}
+
+    monkeypatch.setattr(TranslationService, "get_memory", classmethod(lambda cls: FakeMemory()))
+    monkeypatch.setattr(TranslationService, "_translate_missing", translate_missing)
+    result = asyncio.run(TranslationService._translate(
+        "First sentence. Second sentence.\n\n42", {}, "中文", asyncio.Semaphore(1), True, None, None
+    ))
+    assert result == "第一句。[untranslated] Second sentence.\n42"
+    assert TranslationService.count_untranslated(result) == 1
@@ -1,19 +1,32 @@
 """Streamlit UI组件模块"""
-import os
+import asyncio
+import time
 import streamlit as st
-from streamlit_pdf_viewer import pdf_viewer
 import webbrowser
 from pathlib import Path
-from typing import List, Dict, Tuple, Optional
+from typing import Any, AsyncIterator, Callable, Iterator, List, Dict, Tuple, Optional
+from services.document_service import Document, DocumentStore
+from services.cache_service import content_hash
 from services.file_service import FileService
+from services.job_service import Job, JobQueue, JobSubscription
+from services.metrics_service import Metrics
 from views.html_templates import ChatTemplates
 from models.ModelFactory import get_available_models, get_api_key, list_ollama_models
 
 class StreamlitUI:
     """Streamlit UI管理类"""
     
+    # 流式输出时两次重绘之间的最小间隔（秒）
+    STREAM_REFRESH_INTERVAL = 0.05
+    # 聊天窗口每页显示的消息数，更早的消息按需展开
+    CHAT_PAGE_SIZE = 50
+    # PDF预览每次渲染的页数
+    PDF_VIEW_PAGES = 20
+    # 有后台任务进行时自动刷新进度的间隔（秒）
+    JOB_POLL_INTERVAL = 0.5
+    
     @staticmethod
-    def setup_sidebar() -> Tuple[Dict[str, str], List, str, object]:
+    def setup_sidebar() -> Tuple[Dict[str, str], List, str, List]:
         """设置侧边栏"""
         # 模型选择
         model_choice = StreamlitUI.model_selection()
@@ -25,26 +38,66 @@ class StreamlitUI:
             "Select a file to view",
             [file.name for file in uploaded_files] if uploaded_files else []
         )
-
-        # 导出部分
-        st.sidebar.subheader("Export Conversation")
-        messages_html = "".join(
-            ChatTemplates.message(msg["role"], msg["content"])
-            for msg in st.session_state.get("chat_history", [])
+        st.sidebar.checkbox(
+            "Semantic search (embeddings)",
+            key="semantic_search",
+            help="使用向量检索代替关键词检索，首次使用时会为文档计算嵌入"
         )
-        export_html = ChatTemplates.export_page(messages_html)
-        st.sidebar.download_button(
-            label="Download Conversation as HTML",
-            data=export_html,
-            file_name="conversation.html",
-            mime="text/html"
+        st.sidebar.checkbox(
+            "Bypass response cache",
+            key="bypass_cache",
+            help="忽略已缓存的回复，重新向模型请求"
         )
 
+        # 导出部分：点击后才生成导出页面，对话更新后需重新生成
+        st.sidebar.subheader("Export Conversation")
+        chat_history = st.session_state.get("chat_history", [])
+        if st.sidebar.button("Prepare HTML export", disabled=not chat_history):
+            st.session_state["export_html"] = (
+                len(chat_history),
+                ChatTemplates.export_page(StreamlitUI.messages_html(chat_history))
+            )
+        export = st.session_state.get("export_html")
+        if export and export[0] == len(chat_history):
+            st.sidebar.download_button(
+                label="Download Conversation as HTML",
+                data=export[1],
+                file_name="conversation.html",
+                mime="text/html"
+            )
+        # PDF导出调用wkhtmltopdf，较慢，放到后台任务中生成
+        if st.sidebar.button("Prepare PDF export", disabled=not chat_history):
+            export_page = ChatTemplates.export_page(StreamlitUI.messages_html(chat_history))
+            st.session_state["export_pdf"] = len(chat_history)
+            StreamlitUI.track_job(
+                "export_pdf", "export_pdf", content_hash(export_page.encode("utf-8")),
+                lambda job: FileService.render_pdf(export_page),
+                "Exporting PDF"
+            )
+        export_job = StreamlitUI.tracked_job("export_pdf")
+        if export_job is not None and st.session_state.get("export_pdf") == len(chat_history):
+            if export_job.status == "done":
+                st.sidebar.download_button(
+                    label="Download Conversation as PDF",
+                    data=export_job.result,
+                    file_name="conversation.pdf",
+                    mime="application/pdf"
+                )
+            else:
+                with st.sidebar:
+                    StreamlitUI.render_job(export_job)
+
+        # 性能指标
+        if Metrics.enabled:
+            with st.sidebar.expander("📊 Performance", expanded=False):
+                StreamlitUI.render_metrics_panel()
+
         # 图片上传
         st.sidebar.subheader("📷 Image Upload")
         image_files = st.sidebar.file_uploader(
             "Upload Image (PNG, JPG, JPEG)", 
-            type=["png", "jpg", "jpeg"]
+            type=["png", "jpg", "jpeg"],
+            accept_multiple_files=True
         )
         
         # 快速链接
@@ -84,6 +137,19 @@ class StreamlitUI:
                 )
             model_info["api_key"] = api_key
         
+        # 对比模式：额外选择的模型与当前模型并发回答同一问题
+        compare_options = [
+            f"{frame} / {name}"
+            for frame in ["Ollama", "OpenAI", "DeepSeek"]
+            for name in get_available_models(frame)
+        ]
+        st.sidebar.multiselect(
+            "Compare with (optional)",
+            compare_options,
+            key="compare_models",
+            help="选择后，每个问题会同时发送给这些模型，先完成的先显示"
+        )
+        
         return model_info
 
     @staticmethod
@@ -147,41 +213,192 @@ class StreamlitUI:
                 st.error(f"Error rendering LaTeX: {str(e)}")
 
     @staticmethod
-    def render_pdf_view(uploaded_files: List, selected_file: str, image_file: Optional[object]):
-        """渲染PDF预览"""
-        if selected_file:
-            for file in uploaded_files:
-                if file.name == selected_file:
-                    temp_path = FileService.save_temp_pdf(file)
-                    if temp_path:
-                        pdf_viewer(temp_path, height=1064)
-                        os.unlink(temp_path)  # 清理临时文件
-                        break
+    def render_pdf_view(document: Optional[Document], image_files: Optional[List]):
+        """渲染PDF预览
 
-        if image_file:
+        页数较多时按页段预览，只把当前页段发送给浏览器；
+        PDF字节取自共享存储的内存缓存，重绘时不再读写临时文件。
+        """
+        from streamlit_pdf_viewer import pdf_viewer
+        if document is not None:
+            page_count = document.page_count
+            first, last = 1, page_count
+            window = StreamlitUI.PDF_VIEW_PAGES
+            if page_count > window:
+                first = st.selectbox(
+                    "Pages",
+                    list(range(1, page_count + 1, window)),
+                    format_func=lambda start: f"{start}–{min(start + window - 1, page_count)} / {page_count}",
+                    key=f"pdf_pages_{document.key}"
+                )
+                last = min(first + window - 1, page_count)
+            pdf_viewer(DocumentStore.view_bytes(document, first, last), height=1064)
+
+        if image_files:
             with st.expander("📷 Extracted Text from Image", expanded=False):
-                image_text = FileService.extract_text_from_image(image_file)
-                st.text_area("", value=image_text, height=150)
+                # OCR在后台执行，识别期间界面保持可用
+                images = [FileService.read_bytes(image_file) for image_file in image_files]
+                images_key = content_hash("".join(content_hash(image) for image in images).encode("utf-8"))
+                job = StreamlitUI.track_job(
+                    "ocr", "ocr", images_key,
+                    lambda job: FileService.recognize_images(images, job.report),
+                    "Recognizing images"
+                )
+                if job.status == "done":
+                    for image_file, image_text in zip(image_files, job.result):
+                        st.text_area(image_file.name, value=image_text, height=150)
+                else:
+                    StreamlitUI.render_job(job)
 
     @staticmethod
-    def render_chat(chat_history: List[Dict]):
-        """渲染聊天界面"""
-        if chat_history:
-            messages_html = "".join(
-                ChatTemplates.message(msg["role"], msg["content"])
-                for msg in chat_history
+    def messages_html(messages: List[Dict]) -> str:
+        """拼接消息HTML，优先使用追加时缓存的渲染结果"""
+        return "".join(
+            msg.get("html") or ChatTemplates.message(msg["role"], msg["content"])
+            for msg in messages
+        )
+
+    @staticmethod
+    def render_chat(chat_history: List[Dict], stream: Optional[Iterator[str]] = None):
+        """渲染聊天界面，stream不为空时逐段追加助手回复
+
+        只渲染最近的若干页消息，重绘开销与对话总长度无关。
+        """
+        pages = st.session_state.get("chat_pages", 1)
+        visible = pages * StreamlitUI.CHAT_PAGE_SIZE
+        hidden = max(len(chat_history) - visible, 0)
+        if hidden:
+            st.button(
+                f"⬆ Show earlier messages ({hidden} hidden)",
+                on_click=lambda: st.session_state.update(chat_pages=pages + 1)
             )
-            container_html = ChatTemplates.chat_container(messages_html)
-        else:
-            container_html = ChatTemplates.chat_container()
-        
-        st.markdown(container_html, unsafe_allow_html=True)
+        messages_html = StreamlitUI.messages_html(chat_history[hidden:])
+        placeholder = st.empty()
+        placeholder.markdown(ChatTemplates.chat_container(messages_html), unsafe_allow_html=True)
+        if stream is None:
+            return
+
+        partial = ""
+        last_refresh = 0.0
+        for token in stream:
+            partial += token
+            now = time.monotonic()
+            if now - last_refresh >= StreamlitUI.STREAM_REFRESH_INTERVAL:
+                placeholder.markdown(
+                    ChatTemplates.chat_container(messages_html + ChatTemplates.message("assistant", partial)),
+                    unsafe_allow_html=True
+                )
+                last_refresh = now
+        placeholder.markdown(
+            ChatTemplates.chat_container(messages_html + ChatTemplates.message("assistant", partial)),
+            unsafe_allow_html=True
+        )
+
+    @staticmethod
+    def render_comparison(labels: List[str], results: AsyncIterator[Tuple[str, str, float]]):
+        """对比模式：并排显示各模型回答，哪个先完成先显示哪个"""
+        placeholders = {}
+        for column, label in zip(st.columns(len(labels)), labels):
+            placeholders[label] = column.empty()
+            placeholders[label].markdown(
+                ChatTemplates.message("assistant", f"[{label}] ⏳"), unsafe_allow_html=True
+            )
+
+        async def consume():
+            async for label, response, elapsed in results:
+                placeholders[label].markdown(
+                    ChatTemplates.message("assistant", f"[{label}] ({elapsed:.1f}s)\n{response}"),
+                    unsafe_allow_html=True
+                )
+
+        asyncio.run(consume())
+
+    @staticmethod
+    def track_job(slot: str, kind: str, key: str, func: Callable[[Job], Any], label: str) -> Job:
+        """为当前会话提交（或复用）某个位置上的后台任务
+
+        同一位置的输入未变时直接返回已跟踪的任务（包括失败或已取消的任务，需用户手动重试）；
+        输入变化时取消旧任务的订阅并提交新任务。session_state["jobs"]保存 位置 -> JobSubscription。
+        """
+        jobs: Dict[str, JobSubscription] = st.session_state.setdefault("jobs", {})
+        subscription = jobs.get(slot)
+        if subscription is not None and subscription.job.id == f"{kind}:{key}":
+            return subscription.job
+        if subscription is not None:
+            subscription.cancel()
+        subscription = jobs[slot] = JobQueue.submit(kind, key, func, label)
+        return subscription.job
+
+    @staticmethod
+    def tracked_job(slot: str) -> Optional[Job]:
+        """当前会话在某个位置上跟踪的任务"""
+        subscription = st.session_state.get("jobs", {}).get(slot)
+        return subscription.job if subscription is not None else None
+
+    @staticmethod
+    def render_job(job: Job) -> None:
+        """显示后台任务的进度条、取消按钮或失败信息
+
+        取消只退订本会话：其他会话仍在等待时任务继续运行，本会话显示为已取消。
+        """
+        jobs: Dict[str, JobSubscription] = st.session_state.get("jobs", {})
+        subscriptions = [subscription for subscription in jobs.values() if subscription.job is job]
+        cancelled = job.status == "cancelled" or \
+            bool(subscriptions) and all(subscription.cancelled for subscription in subscriptions)
+        if job.status in ("queued", "running") and not cancelled:
+            progress_col, cancel_col = st.columns([4, 1])
+            text = f"{job.label}: {job.done}/{job.total}" if job.total else f"{job.label}..."
+            progress_col.progress(job.progress, text=text)
+            if cancel_col.button("Cancel", key=f"cancel_{job.id}"):
+                for subscription in subscriptions:
+                    subscription.cancel()
+                st.rerun()
+        elif job.status == "failed" or cancelled:
+            if job.status == "failed":
+                st.error(f"{job.label} failed: {job.error}")
+            else:
+                st.info(f"{job.label} cancelled.")
+            if st.button("Retry", key=f"retry_{job.id}"):
+                for name in [name for name, subscription in jobs.items() if subscription.job is job]:
+                    jobs.pop(name).cancel()
+                st.rerun()
+
+    @staticmethod
+    def poll_jobs() -> None:
+        """本会话有未完成的后台任务时，稍后自动重绘以刷新进度"""
+        subscriptions = st.session_state.get("jobs", {}).values()
+        if any(not subscription.cancelled and not subscription.job.finished for subscription in subscriptions):
+            time.sleep(StreamlitUI.JOB_POLL_INTERVAL)
+            st.rerun()
+
+    @staticmethod
+    def render_prompt_usage(usage: Optional[Dict[str, int]]):
+        """显示上一次提示词各部分的token用量"""
+        if not usage:
+            return
+        sections = " · ".join(
+            f"{name} {tokens}" for name, tokens in usage.items()
+            if name not in ("total", "limit")
+        )
+        st.caption(f"Prompt tokens: {usage['total']} / {usage['limit']} ({sections})")
+
+    @staticmethod
+    def render_metrics_panel():
+        """显示各阶段、各厂商的耗时分位数"""
+        rows = Metrics.summary()
+        if not rows:
+            st.caption("No samples yet.")
+            return
+        st.dataframe(rows, hide_index=True)
 
     @staticmethod
     def clear_chat_history():
         """清空聊天历史和输入"""
         if "chat_history" in st.session_state:
             st.session_state.chat_history = []
+        st.session_state.pop("chat_pages", None)
+        st.session_state.pop("export_html", None)
+        st.session_state.pop("export_pdf", None)
         if "user_input" in st.session_state:
             st.session_state.user_input = ""
         if "latex_text" in st.session_state: